@@ -1,14 +1,17 @@
 from functools import cache
 import logging
-from multiprocessing.pool import ThreadPool
+import traceback
 from typing import Set
-from beartype.typing import Dict, Optional
+from beartype.typing import Any, Callable, Dict, Optional, Tuple
 
 from beartype import beartype
 
 from .sync_handler import TimeQuery
 
 from camera_driver.driver.interface  import Buffer, Camera, CameraProperties
+from camera_driver.driver.clock_offset import ClockOffset
+from camera_driver.concurrent.parallel import parallel_map
+from camera_driver.concurrent.work_queue import OverflowPolicy, QueuePolicy, WorkQueue
 from pydispatch import Dispatcher
 
 
@@ -18,24 +21,64 @@ class CameraSet(Dispatcher):
   def __init__(self, 
                cameras:Dict[str, Camera], 
                logger:logging.Logger,
-               master:Optional[str] = None):
+               master:Optional[str] = None,
+               ingest_size:int = 4,
+               ingest_policy:Optional[QueuePolicy] = None):
 
     self.is_started = False
+    self.is_paused = False
     self.cameras = cameras
 
     self.logger = logger
     self.master = master
 
+    # buffers are handed off from the SDK callback to a bounded queue per camera (dropping 
+    # the oldest by default), and emitted from its own thread. ingest_size 0 emits on the SDK thread.
+    self.ingest_size = ingest_size
+    self.ingest_policy = ingest_policy or QueuePolicy(overflow=OverflowPolicy.drop_oldest)
+    self.ingest:Dict[str, WorkQueue] = {}
+
 
   @beartype
-  def compute_clock_offsets(self, get_timestamp:TimeQuery):
-    return {name:camera.compute_clock_offset(get_timestamp) 
-                  for name, camera in self.cameras.items()}
+  def compute_clock_offsets(self, get_timestamp:TimeQuery, 
+                            tolerance_sec:float=1e-5, max_samples:int=50) -> Dict[str, ClockOffset]:
+    """ Latch all cameras concurrently, each until its estimate is within tolerance (or max_samples) """
+    def latch(camera:Camera) -> ClockOffset:
+      return camera.compute_clock_offset(get_timestamp, tolerance_sec=tolerance_sec, max_samples=max_samples)
+
+    offsets = self.map_cameras("latch clock", latch)
+
+    for name, offset in offsets.items():
+      self.logger.info(f"{name}: clock offset spread {offset.spread_sec * 1e6:.1f}us, "
+                       f"error {offset.error_sec * 1e6:.1f}us ({offset.samples} samples)")
+    
+    spread = max(offset.spread_sec for offset in offsets.values())
+    self.logger.info(f"Latched {len(offsets)} cameras, max spread {spread * 1e6:.1f}us")
+    return offsets
+
+  def map_cameras(self, label:str, f:Callable[[Camera], Any]) -> Dict[str, Any]:
+    """ Run f on every camera concurrently, raises ParallelError (naming the cameras) if any fail """
+    return parallel_map(label, f, self.cameras, self.logger)
+
+  def setup(self, modes:Dict[str, str], properties:CameraProperties):
+    """ Load each camera's mode (e.g. master or slave) and apply properties, concurrently """
+    def setup_camera(camera_mode:Tuple[Camera, str]):
+      camera, mode = camera_mode
+      camera.setup_mode(mode)
+      camera.update_properties(properties)
+
+    parallel_map("setup", setup_camera, 
+                 {k:(camera, modes[k]) for k, camera in self.cameras.items()}, self.logger)
   
 
   def camera_info(self):
     return {name:camera.camera_info() for name, camera in self.cameras.items()}
 
+  def reserve_buffers(self, count:int):
+    """ Each camera allocates at least count buffers when started (see Camera.reserve_buffers) """
+    for camera in self.cameras.values():
+      camera.reserve_buffers(count)
+
   def __repr__(self):
     cameras = ", ".join([f"{name}:{camera.serial}" for name, camera in self.cameras.items()])
     return f"CameraSet({cameras})"
@@ -46,39 +89,85 @@ class CameraSet(Dispatcher):
   
 
   def on_buffer(self, buffer:Buffer):
-    self.emit("on_buffer", buffer)
+    """ Called on the SDK's delivery thread, must not block """
+    if self.ingest_size == 0:
+      self.emit("on_buffer", buffer)
+      return
+
+    ingest = self.ingest.get(buffer.camera_name)
+    if ingest is not None:
+      ingest.enqueue(buffer)
+    else:
+      buffer.release()  # stopping
+
+  def _emit_buffer(self, buffer:Buffer):
+    # an error is logged per buffer, the ingest thread keeps running.
+    # The buffer belongs to the on_buffer listener (which may have queued it already), so isn't released here
+    try:
+      self.emit("on_buffer", buffer)
+    except Exception:
+      self.logger.error(f"{buffer.camera_name}: error handling buffer: {traceback.format_exc()}")
+
+  def _start_ingest(self):
+    if self.ingest_size == 0:
+      return
+    
+    self.ingest = {k:WorkQueue(f"{k}_ingest", self._emit_buffer, self.logger, 
+                               num_workers=1, max_size=self.ingest_size, policy=self.ingest_policy, 
+                               on_drop=lambda buffer: buffer.release())
+                   for k in self.cameras.keys()}
+    
+    for queue in self.ingest.values():
+      queue.start()
+
+  def _stop_ingest(self):
+    """ Stop the ingest queues, after emitting the buffers already queued """
+    ingest, self.ingest = self.ingest, {}
+    for queue in ingest.values():
+      queue.stop()
 
 
   def start(self):
     assert not self.is_started, "CameraSet already started"
+    self._start_ingest()
 
     for k, camera in self.cameras.items():
       camera.bind(on_buffer = self.on_buffer)
 
-    with ThreadPool(len(self.cameras)) as pool:
-         pool.map(lambda camera: camera.start(), self.cameras.values(), chunksize=1)
-
-    # for k, camera in self.cameras.items():
-    #   camera.bind(on_buffer = self.on_buffer)
-    #   camera.start()
-
+    self.map_cameras("start", lambda camera: camera.start())
     self.is_started = True
 
   def unbind_cameras(self):
     for k, camera in self.cameras.items():
       camera.unbind(self.on_buffer)
 
+    self._stop_ingest()
 
-  def stop(self):
+
+  def pause(self):
+    """ Stop acquisition on all cameras, keeping streams and buffers allocated """
     assert self.is_started, "CameraSet not started"
 
-    for k, camera in self.cameras.items():
-      camera.unbind(self.on_buffer)
+    self.map_cameras("pause", lambda camera: camera.pause())
 
-    with ThreadPool(len(self.cameras)) as pool:
-         pool.map(lambda camera: camera.stop(), self.cameras.values(), chunksize=1)
+    self.is_paused = True
+
+  def resume(self):
+    assert self.is_started, "CameraSet not started"
+
+    self.map_cameras("resume", lambda camera: camera.resume())
+
+    self.is_paused = False
+
+
+  def stop(self):
+    assert self.is_started, "CameraSet not started"
+
+    self.unbind_cameras()
+    self.map_cameras("stop", lambda camera: camera.stop())
 
     self.is_started = False
+    self.is_paused = False
 
 
   def release(self):
@@ -94,5 +183,4 @@ class CameraSet(Dispatcher):
 
 
   def update_properties(self, settings:CameraProperties):
-    for camera in self.cameras.values():
-      camera.update_properties(settings) 
+    self.map_cameras("update_properties", lambda camera: camera.update_properties(settings)) 
@@ -0,0 +1,162 @@
+import abc
+from collections import deque
+from enum import Enum
+from beartype.typing import Dict, Optional
+
+
+class LinearFit:
+  """ Least squares line y = a + b * t over a sliding window of samples.
+      Running sums are kept relative to a reference sample, which is moved forward
+      (and the sums recomputed) each time the window turns over to keep precision. """
+
+  def __init__(self, window:int, min_samples:int=10):
+    self.samples = deque(maxlen=window)
+    self.min_samples = min_samples
+
+    self.t0, self.y0 = 0.0, 0.0
+    self.sums = (0.0, 0.0, 0.0, 0.0)   # t, y, t*t, t*y
+    self.added = 0
+
+  def __len__(self) -> int:
+    return len(self.samples)
+
+  def _recenter(self):
+    self.t0, self.y0 = self.samples[0]
+    self.sums = (0.0, 0.0, 0.0, 0.0)
+    self.added = 0
+
+    for t, y in self.samples:
+      self._accumulate(t, y, 1.0)
+
+  def _accumulate(self, t:float, y:float, sign:float):
+    t, y = t - self.t0, y - self.y0
+    st, sy, stt, sty = self.sums
+    self.sums = (st + sign * t, sy + sign * y, stt + sign * t * t, sty + sign * t * y)
+
+  def add(self, t:float, y:float):
+    if len(self.samples) == 0:
+      self.t0, self.y0 = t, y
+
+    if len(self.samples) == self.samples.maxlen:
+      self._accumulate(*self.samples[0], -1.0)
+
+    self.samples.append((t, y))
+    self._accumulate(t, y, 1.0)
+
+    self.added += 1
+    if self.added >= self.samples.maxlen:
+      self._recenter()
+
+  @property
+  def slope(self) -> float:
+    n = len(self.samples)
+    if n < self.min_samples:
+      return 0.0
+
+    st, sy, stt, sty = self.sums
+    mean_t, mean_y = st / n, sy / n
+
+    var = stt / n - mean_t * mean_t
+    return 0.0 if var <= 1e-12 else (sty / n - mean_t * mean_y) / var
+
+  def predict(self, t:float, default:float) -> float:
+    n = len(self.samples)
+    if n == 0:
+      return default
+
+    st, sy, _, _ = self.sums
+    mean_t, mean_y = st / n, sy / n
+    return self.y0 + mean_y + self.slope * (t - self.t0 - mean_t)
+
+
+
+class ClockModel(metaclass=abc.ABCMeta):
+  """ Estimates per camera clock offsets (host - camera time) from completed frame groups """
+
+  @abc.abstractmethod
+  def offset(self, camera:str, timestamp_sec:float) -> float:
+    """ Offset to apply to a (camera clock) timestamp """
+    raise NotImplementedError()
+
+  @abc.abstractmethod
+  def update(self, offsets:Dict[str, float], timestamps:Dict[str, float], deviations:Dict[str, float]):
+    """ Update from a group: the offsets applied, the camera timestamps and their deviation from the group mean """
+    raise NotImplementedError()
+
+  @property
+  @abc.abstractmethod
+  def time_offsets(self) -> Dict[str, float]:
+    """ Current offset estimates """
+    raise NotImplementedError()
+
+  def skew(self, camera:str) -> float:
+    """ Estimated drift of the camera clock relative to the others (seconds per second) """
+    return 0.0
+
+  @abc.abstractmethod
+  def reset(self, time_offsets:Dict[str, float]):
+    raise NotImplementedError()
+
+
+class EmaClock(ClockModel):
+  """ Constant offsets, nudged towards the group mean by a fraction of each deviation """
+  def __init__(self, time_offsets:Dict[str, float], ema:float=0.1):
+    self.offsets = dict(time_offsets)
+    self.ema = ema
+
+  def offset(self, camera:str, timestamp_sec:float) -> float:
+    return self.offsets[camera]
+
+  def update(self, offsets:Dict[str, float], timestamps:Dict[str, float], deviations:Dict[str, float]):
+    for name, deviation in deviations.items():
+      self.offsets[name] -= deviation * self.ema
+
+  @property
+  def time_offsets(self) -> Dict[str, float]:
+    return dict(self.offsets)
+
+  def reset(self, time_offsets:Dict[str, float]):
+    self.offsets = dict(time_offsets)
+
+
+class RegressionClock(ClockModel):
+  """ Offset and skew per camera, from a windowed linear regression of the
+      offsets which would have aligned each frame with its group mean """
+
+  def __init__(self, time_offsets:Dict[str, float], window:int=200):
+    self.window = window
+    self.reset(time_offsets)
+
+  def offset(self, camera:str, timestamp_sec:float) -> float:
+    return self.fits[camera].predict(timestamp_sec, default=self.initial[camera])
+
+  def skew(self, camera:str) -> float:
+    """ Estimated drift of the camera clock relative to the others (seconds per second) """
+    return self.fits[camera].slope
+
+  def update(self, offsets:Dict[str, float], timestamps:Dict[str, float], deviations:Dict[str, float]):
+    for name, deviation in deviations.items():
+      self.fits[name].add(timestamps[name], offsets[name] - deviation)
+      self.latest[name] = timestamps[name]
+
+  @property
+  def time_offsets(self) -> Dict[str, float]:
+    return {k:self.initial[k] if t is None else self.offset(k, t)
+            for k, t in self.latest.items()}
+
+  def reset(self, time_offsets:Dict[str, float]):
+    self.initial = dict(time_offsets)
+    self.fits = {k:LinearFit(self.window) for k in time_offsets.keys()}
+    self.latest:Dict[str, Optional[float]] = {k:None for k in time_offsets.keys()}
+
+
+class ClockModelType(Enum):
+  ema = "ema"
+  regression = "regression"
+
+  def create(self, time_offsets:Dict[str, float], window:int=200) -> ClockModel:
+    match self:
+      case ClockModelType.ema:
+        return EmaClock(time_offsets)
+      case ClockModelType.regression:
+        return RegressionClock(time_offsets, window=window)
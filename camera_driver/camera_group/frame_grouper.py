@@ -1,10 +1,14 @@
+import bisect
 from dataclasses import replace
+import math
 from datetime import datetime
-from beartype.typing import Dict, List, Optional
+from beartype.typing import Callable, Dict, List, Optional, Tuple
 import numpy as np
 
 from camera_driver.data import Timestamped
 
+from .clock_model import ClockModel, EmaClock
+
 
 def nearest_minute(timestamp:datetime):
   return datetime(timestamp.year, timestamp.month, timestamp.day, timestamp.hour, timestamp.minute, 0)
@@ -15,6 +19,12 @@ def nearest_minute(timestamp:datetime):
 class FrameGroup:
   def __init__(self, frame:Timestamped):
     self.frames = {frame.camera_name:frame}
+    # clock offsets applied to each frame's timestamp (set by FrameGrouper)
+    self.offsets:Dict[str, float] = {}
+
+    # running sums so the mean timestamps are O(1)
+    self.timestamp_sum = frame.timestamp_sec
+    self.clock_time_sum = frame.clock_time_sec
     
   def can_group(self, frame:Timestamped, threshold_sec:float=0.05):
     return (frame.camera_name not in self.frames 
@@ -31,11 +41,11 @@ class FrameGroup:
 
   @property
   def timestamp(self):
-    return np.mean([frame.timestamp_sec for frame in self.frames.values()]) 
+    return self.timestamp_sum / len(self.frames)
   
   @property 
   def clock_time(self):
-    return np.mean([frame.clock_time_sec for frame in self.frames.values()]) 
+    return self.clock_time_sum / len(self.frames)
 
 
   
@@ -51,10 +61,14 @@ class FrameGroup:
     assert frame.camera_name not in self.frames, f"frame from {frame.camera_name} already in group"
     self.frames[frame.camera_name] = frame
 
+    self.timestamp_sum += frame.timestamp_sec
+    self.clock_time_sum += frame.clock_time_sec
+
   @property
   def time_offsets(self):
     # compute time offset relative to mean timestamp
-    return {name:frame.timestamp_sec - self.timestamp 
+    t = self.timestamp
+    return {name:frame.timestamp_sec - t 
             for name, frame in sorted(self.frames.items())}
     
 
@@ -65,66 +79,130 @@ class FrameGroup:
 
 
 class FrameGrouper():
-  def __init__(self, time_offsets:Dict[str, float], threshold_sec:float=0.05):
+  """ Groups frames from different cameras by (offset corrected) timestamp. 
+      Open groups are kept in a list sorted by their mean timestamp, so finding a group 
+      for a frame is a binary search, and timed out groups are popped from the front. """
+  
+  def __init__(self, time_offsets:Dict[str, float], threshold_sec:float=0.05, 
+               clock_model:Optional[ClockModel]=None, 
+               discard_frame:Optional[Callable[[Timestamped], None]]=None):
     self.threshold_sec = threshold_sec
+    # called with frames dropped without being grouped
+    self.discard_frame = discard_frame or (lambda frame: None)
+
+    self.clock = clock_model or EmaClock(time_offsets)
 
-    self.time_offsets = time_offsets
-    self.groups:List[FrameGroup] = []
+    # (timestamp, id) keys sorted, with groups by id
+    self.index:List[Tuple[float, int]] = []
+    self.open_groups:Dict[int, FrameGroup] = {}
+    self.next_id = 0
 
-    self.camera_set = set(self.time_offsets.keys())
+    self.camera_set = set(time_offsets.keys())
     
   @property
   def num_cameras(self):
-    return len(self.time_offsets)
+    return len(self.camera_set)
+  
+  @property
+  def time_offsets(self) -> Dict[str, float]:
+    return self.clock.time_offsets
   
-  def clear(self):
-    self.groups = []
+  @property
+  def groups(self) -> List[FrameGroup]:
+    return [self.open_groups[i] for _, i in self.index]
+
+  def clear(self) -> List[FrameGroup]:
+    """ Discard all open groups, returns them (oldest first) """
+    groups = self.groups
+    self.index = []
+    self.open_groups = {}
+    return groups
     
   @property
   def time_offset_vec(self):
-    return np.array(sorted(self.time_offsets).values())
-
-  def group_frame(self, frame:Timestamped) -> FrameGroup:
-    for group in self.groups:
-      if group.can_group(frame, self.threshold_sec):
-        group.append(frame)
-        return group
-      
-    group = FrameGroup(frame)
-    self.groups.append(group)
-    return group   
+    time_offsets = self.time_offsets
+    return np.array([time_offsets[k] for k in sorted(time_offsets)])
+
+  def _insert(self, group:FrameGroup, id:int):
+    bisect.insort(self.index, (group.timestamp, id))
+    self.open_groups[id] = group
+
+  def _remove(self, key:Tuple[float, int]) -> FrameGroup:
+    i = bisect.bisect_left(self.index, key)
+    assert i < len(self.index) and self.index[i] == key, f"group {key} not in index"
+
+    del self.index[i]
+    return self.open_groups.pop(key[1])
+
+  def _find_group(self, frame:Timestamped) -> Optional[Tuple[float, int]]:
+    """ Key of the nearest open group which can accept the frame """
+    t = frame.timestamp_sec
+    i = bisect.bisect_left(self.index, (t - self.threshold_sec, -1))
+
+    best, best_dist = None, math.inf
+    while i < len(self.index):
+      key = self.index[i]
+      if key[0] > t + self.threshold_sec:
+        break
+
+      dist = abs(key[0] - t)
+      if dist < best_dist and frame.camera_name not in self.open_groups[key[1]].frames:
+        best, best_dist = key, dist
+      i += 1
+
+    return best
+
+  def group_frame(self, frame:Timestamped) -> Optional[FrameGroup]:
+    key = self._find_group(frame)
+
+    if key is not None:
+      group = self._remove(key)
+      group.append(frame)
+      id = key[1]
+    else:
+      group = FrameGroup(frame)
+      id = self.next_id
+      self.next_id += 1
+
+    if len(group) < self.num_cameras:
+      # (re-)insert, as the mean timestamp moves with each frame
+      self._insert(group, id)
+    return group
   
   @property
   def sorted_groups(self):
-    return sorted(self.groups, key=lambda group: group.timestamp)
+    return self.groups
       
-  def update_offsets(self, group:FrameGroup, ema:float=0.1):
+  def update_offsets(self, group:FrameGroup):
     """
-    Update time offsets based on differences from the mean timestamp.
+    Update the clock model based on differences from the mean timestamp.
     """
-    for name, offset in group.time_offsets.items():
-      self.time_offsets[name] -= offset * ema
+    timestamps = {k:frame.timestamp_sec - group.offsets[k] for k, frame in group.frames.items()}
+    self.clock.update(group.offsets, timestamps, group.time_offsets)
 
   def set_offsets(self, offsets:Dict[str, float]):
     assert set(offsets.keys()) == self.camera_set, "offsets must match camera set"
-    self.time_offsets = offsets
+    self.clock.reset(offsets)
 
 
   def timeout_groups(self, timeout_time:float) -> List[FrameGroup]:
-    timed_out = [group for group in self.groups
-                  if timeout_time > group.timestamp ]
-
-    for group in timed_out:
-      self.groups.remove(group)
+    """ Remove (in timestamp order) groups older than timeout_time """
+    n = bisect.bisect_left(self.index, (timeout_time, -1))
+    timed_out = [self.open_groups.pop(id) for _, id in self.index[:n]]
 
+    del self.index[:n]
     return timed_out
 
   def add_frame(self, frame:Timestamped) -> Optional[FrameGroup]:
-    frame = replace(frame, timestamp_sec=frame.timestamp_sec + self.time_offsets[frame.camera_name])
+    offset = self.clock.offset(frame.camera_name, frame.timestamp_sec)
+    frame = replace(frame, timestamp_sec=frame.timestamp_sec + offset)
+
+    group = self.group_frame(frame)
+    if group is None:
+      return None
 
-    group = self.group_frame(frame)      
+    group.offsets[frame.camera_name] = offset
     if len(group) == self.num_cameras:
-      self.groups.remove(group)      
       return group
     
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,169 @@
+from collections import Counter
+from enum import Enum
+import heapq
+import logging
+from beartype.typing import Callable, Dict, List, Optional
+
+from camera_driver.data import Timestamped
+
+from .clock_model import ClockModel, LinearFit
+from .frame_grouper import FrameGroup, FrameGrouper
+
+
+class FrameIdGrouper(FrameGrouper):
+  """ Groups frames from hardware triggered cameras by trigger index (camera frame id + per camera offset).
+
+      Each camera is aligned once, by matching its (offset corrected) timestamp against a line fitted
+      to the timestamps of previous triggers. After that a frame's group is a dict lookup, and timestamps
+      are only used to validate it. A camera whose frame doesn't match its trigger (e.g. the counter
+      was reset, or a trigger was missed without being counted) is re-aligned in the same way.
+      Skipped frames (gaps in the frame id) leave their groups incomplete, to time out as usual. """
+
+  def __init__(self, time_offsets:Dict[str, float], threshold_sec:float=0.05,
+               clock_model:Optional[ClockModel]=None, logger:Optional[logging.Logger]=None,
+               discard_frame:Optional[Callable[[Timestamped], None]]=None):
+    super().__init__(time_offsets, threshold_sec, clock_model=clock_model, discard_frame=discard_frame)
+    self.logger = logger or logging.getLogger(__name__)
+
+    # open groups are keyed by trigger index, with a heap of trigger indexes for timeouts
+    self.trigger_heap:List[int] = []
+    self.window = max(200, 10 * self.num_cameras)
+
+    self.skipped = Counter()
+    self.realigned = Counter()
+    self.reset_alignment()
+
+
+  def reset_alignment(self):
+    self.id_offsets:Dict[str, int] = {}
+    self.last_id:Dict[str, int] = {}
+
+    # trigger index -> (corrected) timestamp, from validated frames
+    self.trigger_times = LinearFit(self.window, min_samples=2)
+    self.latest_trigger = 0
+
+
+  @property
+  def groups(self) -> List[FrameGroup]:
+    return [self.open_groups[k] for k in sorted(self.open_groups)]
+
+  def clear(self) -> List[FrameGroup]:
+    groups = super().clear()
+    self.trigger_heap = []
+    # frame counters restart with acquisition
+    self.reset_alignment()
+    return groups
+
+
+  def _is_valid(self, trigger:int, timestamp_sec:float) -> bool:
+    if self.trigger_times.slope <= 0 and trigger != self.latest_trigger:
+      # no frame period yet (all frames so far from one trigger), trust the frame id
+      return True
+
+    predicted = self.trigger_times.predict(trigger, default=timestamp_sec)
+    return abs(timestamp_sec - predicted) <= self.threshold_sec
+
+  def _align(self, frame:Timestamped) -> Optional[int]:
+    """ Trigger index for a frame from an unaligned camera, or None if it can't be matched """
+    if len(self.trigger_times) == 0:
+      return 0    # first frame seen is the reference
+
+    t = frame.timestamp_sec
+    ref = self.latest_trigger
+    period = self.trigger_times.slope
+
+    trigger = ref
+    if period > 0:
+      trigger += round((t - self.trigger_times.predict(ref, default=t)) / period)
+
+    group = self.open_groups.get(trigger)
+    if not self._is_valid(trigger, t) or (group is not None and frame.camera_name in group.frames):
+      return None
+    return trigger
+
+
+  def _trigger(self, frame:Timestamped) -> Optional[int]:
+    camera, frame_id = frame.camera_name, frame.frame_id
+
+    last = self.last_id.get(camera)
+    self.last_id[camera] = frame_id
+
+    if last is not None and frame_id - last > 1:
+      self.skipped[camera] += frame_id - last - 1
+      self.logger.debug(f"{camera}: skipped {frame_id - last - 1} frames ({self.skipped[camera]} total)")
+
+    if camera in self.id_offsets:
+      trigger = frame_id + self.id_offsets[camera]
+      group = self.open_groups.get(trigger)
+
+      if self._is_valid(trigger, frame.timestamp_sec) and (group is None or camera not in group.frames):
+        return trigger
+
+      self.logger.warning(f"{camera}: frame {frame_id} does not match trigger {trigger}, re-aligning")
+      del self.id_offsets[camera]
+      self.realigned[camera] += 1
+
+    trigger = self._align(frame)
+    if trigger is not None:
+      self.id_offsets[camera] = trigger - frame_id
+    else:
+      self.logger.debug(f"{camera}: could not align frame {frame_id}, dropping")
+    return trigger
+
+
+  def group_frame(self, frame:Timestamped) -> Optional[FrameGroup]:
+    if frame.frame_id is None:
+      raise ValueError(f"{frame.camera_name}: grouping by frame id, but the driver doesn't provide frame ids")
+
+    trigger = self._trigger(frame)
+    if trigger is None:
+      self.discard_frame(frame)
+      return None
+
+    self.trigger_times.add(trigger, frame.timestamp_sec)
+    self.latest_trigger = max(self.latest_trigger, trigger)
+
+    group = self.open_groups.get(trigger)
+    if group is None:
+      group = FrameGroup(frame)
+      if len(group) < self.num_cameras:
+        self.open_groups[trigger] = group
+        heapq.heappush(self.trigger_heap, trigger)
+    else:
+      group.append(frame)
+      if len(group) == self.num_cameras:
+        del self.open_groups[trigger]
+
+    return group
+
+
+  def timeout_groups(self, timeout_time:float) -> List[FrameGroup]:
+    """ Remove (in trigger order) groups older than timeout_time """
+    timed_out = []
+    while len(self.trigger_heap) > 0:
+      # heap entries for groups which already completed are skipped
+      group = self.open_groups.get(self.trigger_heap[0])
+      if group is not None and group.timestamp >= timeout_time:
+        break
+
+      trigger = heapq.heappop(self.trigger_heap)
+      if group is not None:
+        timed_out.append(self.open_groups.pop(trigger))
+
+    return timed_out
+
+
+
+class GroupingMode(Enum):
+  timestamp = "timestamp"   # nearest (offset corrected) timestamp within the sync threshold
+  frame_id = "frame_id"     # camera frame id, for hardware triggered cameras
+
+  def create(self, time_offsets:Dict[str, float], threshold_sec:float,
+             clock_model:Optional[ClockModel]=None, logger:Optional[logging.Logger]=None,
+             discard_frame:Optional[Callable[[Timestamped], None]]=None) -> FrameGrouper:
+    match self:
+      case GroupingMode.timestamp:
+        return FrameGrouper(time_offsets, threshold_sec, clock_model=clock_model, discard_frame=discard_frame)
+      case GroupingMode.frame_id:
+        return FrameIdGrouper(time_offsets, threshold_sec, clock_model=clock_model, logger=logger,
+                              discard_frame=discard_frame)
@@ -1,13 +1,15 @@
 import logging
+import math
+from threading import Lock
 from typing import Dict, List, Optional, Set
 from beartype.typing import Callable
 
 from beartype import beartype
-from camera_driver.data.util import transpose_dicts_list
 import numpy as np
 
-from .frame_grouper import FrameGroup, FrameGrouper
+from .frame_grouper import FrameGrouper
 
+from camera_driver.concurrent.work_queue import WorkQueue
 from camera_driver.driver.interface import Buffer
 from camera_driver.data import Timestamped
 from pydispatch import Dispatcher
@@ -17,78 +19,186 @@ TimeQuery = Callable[[], float]
 ProcessBuffer = Callable[[Buffer], Timestamped]
 
 
+class RunningMean:
+  """ Welford's running mean and variance """
+  def __init__(self):
+    self.n = 0
+    self.mean = 0.0
+    self.m2 = 0.0
+
+  def add(self, x:float):
+    self.n += 1
+    delta = x - self.mean
+    self.mean += delta / self.n
+    self.m2 += delta * (x - self.mean)
+
+  @property
+  def std_error(self) -> float:
+    if self.n < 2:
+      return math.inf
+    return math.sqrt(self.m2 / (self.n - 1) / self.n)
+
+
 class Initialiser(Dispatcher):
+  """ Estimates camera clock offsets (host - camera time) from incoming frames, without latching.
+
+      Rough offsets are the median of (arrival - camera timestamp) over the first few frames of each camera,
+      frames are then grouped incrementally, and the offsets refined by the mean deviation of each camera
+      from its group. Finishes as soon as the refined offsets are stable (standard error below tolerance),
+      or once every camera has init_window frames. Frames are handled on a worker thread, not the camera callback.
+
+      Expected offsets (e.g. cached from a previous run) are validated instead: used for grouping if they agree
+      with the rough offsets (within expected_tolerance), and accepted once min_groups groups are formed.
+      Otherwise the frames so far are re-grouped with the rough offsets, as above.
+  """
   _events_ = ["initialized"]
 
   @beartype
-  def __init__(self, 
+  def __init__(self,
           cameras : Set[str],
-          query_time:TimeQuery,  
+          query_time:TimeQuery,
 
           init_window:int,
-          sync_threshold:float,  
+          sync_threshold:float,
+
+          logger:logging.Logger,
+          tolerance:Optional[float]=None,
+          min_groups:int=3,
+          min_frames:int=3,
+          expected:Optional[Dict[str, float]]=None,
+          expected_tolerance:float=0.02):
 
-          logger:logging.Logger):
-    
     self.timestamps:Dict[str, List[Timestamped]] = {camera:[] for camera in cameras}
     self.query_time = query_time
     self.logger = logger
 
     self.frame_window = init_window
     self.sync_threshold = sync_threshold
-    
+
+    self.tolerance = sync_threshold * 0.05 if tolerance is None else tolerance
+    self.min_groups = min_groups
+    self.min_frames = min(min_frames, init_window)
+
+    self.grouper:Optional[FrameGrouper] = None
+    self.deviations = {camera:RunningMean() for camera in cameras}
+    self.num_groups = 0
+    self.offsets:Optional[Dict[str, float]] = None
+
+    self.expected = expected
+    self.expected_tolerance = expected_tolerance
+    self.validating = False
+
+    self.queue = WorkQueue("initialiser", self._add_stamp, logger=logger, num_workers=1,
+                           max_size=len(cameras) * init_window)
+    self.queue_lock = Lock()
+    self.queue.start()
+
+
+  def _rough_offsets(self) -> Dict[str, float]:
+    return {k:float(np.median([stamp.clock_time_sec - stamp.timestamp_sec for stamp in stamps]))
+                for k, stamps in self.timestamps.items()}
+
+  def _create_grouper(self, offsets:Dict[str, float]):
+    self.grouper = FrameGrouper(offsets, self.sync_threshold)
+    self.deviations = {camera:RunningMean() for camera in self.timestamps}
+    self.num_groups = 0
+
+    # replay in arrival order across cameras, timeout_groups assumes time moves forward
+    stamps = [stamp for camera_stamps in self.timestamps.values() for stamp in camera_stamps]
+    for stamp in sorted(stamps, key=lambda stamp: stamp.clock_time_sec):
+      self._group_stamp(stamp)
+
+  def _start_grouping(self):
+    rough = self._rough_offsets()
+    if self.expected is not None:
+      error = max(abs(rough[k] - self.expected[k]) for k in rough)
+
+      self.validating = error <= self.expected_tolerance
+      if not self.validating:
+        self.logger.info(f"Expected offsets rejected, differ from rough offsets by {error * 1000:.1f}ms")
+
+    self._create_grouper(self.expected if self.validating else rough)
+
+  def _validation_failed(self) -> bool:
+    # frames which should have formed groups by now, but didn't
+    return (self.num_groups < self.min_groups and 
+            min(self.frame_counts().values()) >= 2 * self.min_frames + self.min_groups)
+
+  def _group_stamp(self, stamp:Timestamped):
+    group = self.grouper.add_frame(stamp)
+    if group is not None:
+      self.num_groups += 1
+      for k, deviation in group.time_offsets.items():
+        self.deviations[k].add(deviation)
+
+    # incomplete groups are not useful once all cameras have moved on
+    self.grouper.timeout_groups(stamp.clock_time_sec - 1.0)
+
+  def _add_stamp(self, stamp:Timestamped):
+    if self.offsets is not None:
+      return
+
+    self.timestamps[stamp.camera_name].append(stamp)
+
+    if self.grouper is None:
+      if min(self.frame_counts().values()) < self.min_frames:
+        return
+
+      self._start_grouping()
+    else:
+      self._group_stamp(stamp)
+
+    if self.validating and self._validation_failed():
+      self.logger.info(f"Expected offsets rejected, only {self.num_groups} groups from {self.frame_counts()}")
+      self.validating = False
+      self._create_grouper(self._rough_offsets())
+
+    offsets = self.try_initialise()
+    if offsets is not None:
+      self.offsets = offsets
+      self.emit("initialized", offsets)
+
 
   def try_initialise(self) -> Optional[Dict[str, float]]:
-    if not self.has_minimum_frames():
+    if self.num_groups == 0:
       return None
 
-    offsets = {k:np.median([offset.clock_time_sec - offset.timestamp_sec for offset in offsets])
-                for k, offsets in self.timestamps.items()}
+    if self.validating:
+      if self.num_groups < self.min_groups:
+        return None
+      self.logger.info(f"Validated expected offsets with {self.num_groups} groups")
 
-    groups:List[FrameGroup] = []
+    stable = self.validating or (self.num_groups >= self.min_groups
+              and max(d.std_error for d in self.deviations.values()) < self.tolerance)
 
-    grouper = FrameGrouper(offsets, self.sync_threshold)
-    for _, camera_stamps in self.timestamps.items():
-      for stamp in camera_stamps:
-        group = grouper.add_frame(stamp)
-        if group is not None:
-          groups.append(group)
+    if not (stable or self.has_minimum_frames()):
+      return None
 
-    group_offsets = [group.time_offsets for group in groups]
+    self.logger.info(f"Initialised offsets from {self.num_groups} groups, frames: {self.frame_counts()}")
+    rough = self.grouper.time_offsets
+    return {k: rough[k] - self.deviations[k].mean for k in rough.keys()}
 
-    
-    if len(group_offsets) == 0:
-      return None
-    
-    mean_offsets = {k: offsets[k] + np.mean(cam_offsets) for k, cam_offsets in 
-                    transpose_dicts_list(group_offsets).items()}
 
-    return mean_offsets
-    
-      
   def frame_counts(self):
     return {k:len(v) for k,v in self.timestamps.items()}
 
 
-  def has_minimum_frames(self):    
+  def has_minimum_frames(self):
     for stamps in self.timestamps.values():
       if len(stamps) < self.frame_window:
         return False
-      
+
     return True
-    
-  def push_image(self, buffer:Buffer): 
-    now = self.query_time()
 
-    stamps = self.timestamps[buffer.camera_name]
-    stamps.append(
-      Timestamped(buffer.timestamp_sec, now, buffer.camera_name))
-    
+  def push_image(self, buffer:Buffer):
+    now = self.query_time()
+    stamp = Timestamped(buffer.timestamp_sec, now, buffer.camera_name, frame_id=buffer.frame_id)
     buffer.release()
 
-    offsets = self.try_initialise() 
-    if offsets is not None:
-      self.emit("initialized", offsets)
-      
+    with self.queue_lock:
+      if self.queue.started:
+        self.queue.enqueue(stamp)
 
-  
+  def stop(self):
+    with self.queue_lock:
+      self.queue.stop()
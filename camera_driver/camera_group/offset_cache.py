@@ -0,0 +1,82 @@
+from dataclasses import asdict, dataclass
+import json
+import logging
+import os
+from pathlib import Path
+import uuid
+from beartype import beartype
+from beartype.typing import Dict, Optional
+
+
+def boot_id() -> str:
+  """ Identifies the host boot (offsets from a host clock don't survive a reboot) """
+  try:
+    return Path("/proc/sys/kernel/random/boot_id").read_text().strip()
+  except OSError:
+    return f"{uuid.getnode():x}"
+
+
+@beartype
+@dataclass
+class CachedOffset:
+  offset_sec: float     # host - camera time, when saved
+  drift: float          # rate of change of offset_sec (seconds per second)
+  saved_sec: float      # host time when saved
+  boot_id: str
+
+  def predict(self, time_sec:float) -> float:
+    return self.offset_sec + self.drift * (time_sec - self.saved_sec)
+
+
+class OffsetCache:
+  """ Camera clock offsets (and drift) by camera serial, saved when a pipeline stops so the next start
+      can validate them against a few frames instead of a full initialisation.
+      Entries from another boot (or process, when not persisted to a file) are ignored. """
+
+  def __init__(self, logger:logging.Logger, filename:Optional[str]=None):
+    self.logger = logger
+    self.filename = None if filename is None else Path(filename)
+
+    # without a file the cache only lasts as long as the process, and the query_time clock
+    self.identity = boot_id() if self.filename is not None else f"{boot_id()}:{os.getpid()}"
+    self.entries:Dict[str, CachedOffset] = {}
+
+    if self.filename is not None and self.filename.exists():
+      self.load()
+
+
+  def load(self):
+    try:
+      with open(self.filename) as f:
+        self.entries = {serial:CachedOffset(**entry) for serial, entry in json.load(f).items()}
+    except (OSError, ValueError, TypeError) as e:
+      self.logger.warning(f"Failed to load offset cache {self.filename}: {e}")
+      self.entries = {}
+
+  def save(self):
+    if self.filename is None:
+      return
+
+    try:
+      tmp = self.filename.with_suffix(self.filename.suffix + ".tmp")
+      with open(tmp, "w") as f:
+        json.dump({serial:asdict(entry) for serial, entry in self.entries.items()}, f, indent=2)
+      tmp.replace(self.filename)
+    except OSError as e:
+      self.logger.warning(f"Failed to save offset cache {self.filename}: {e}")
+
+
+  def lookup(self, serials:Dict[str, str], time_sec:float) -> Optional[Dict[str, float]]:
+    """ Predicted offsets for every camera (by name), or None if any are missing or from another boot """
+    entries = {name:self.entries.get(serial) for name, serial in serials.items()}
+    if any(entry is None or entry.boot_id != self.identity for entry in entries.values()):
+      return None
+
+    return {name:entry.predict(time_sec) for name, entry in entries.items()}
+
+
+  def store(self, serials:Dict[str, str], offsets:Dict[str, float], drifts:Dict[str, float], time_sec:float):
+    for name, offset in offsets.items():
+      self.entries[serials[name]] = CachedOffset(offset_sec=offset, drift=drifts.get(name, 0.0),
+                                                 saved_sec=time_sec, boot_id=self.identity)
+    self.save()
@@ -1,22 +1,49 @@
 from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
 import logging
+from threading import Lock
 from typing import Optional, Set
-from beartype.typing import Callable, Dict
+from beartype.typing import Callable, Dict, List
 
 from beartype import beartype
 
-from camera_driver.data.util import lerp
 from camera_driver.driver.interface import Buffer
 from camera_driver.data import Timestamped
-from camera_driver.concurrent.work_queue import WorkQueue
+from camera_driver.concurrent.work_queue import QueuePolicy, WorkQueue
 from pydispatch import Dispatcher
 
-from .frame_grouper import FrameGrouper
+from .frame_grouper import FrameGroup
+from .frame_id_grouper import GroupingMode
+from .clock_model import ClockModel, LinearFit
 
 TimeQuery = Callable[[], float]
 ProcessBuffer = Callable[[Buffer], Timestamped]
 
 
+class PartialMode(Enum):
+  never = "never"                 # drop timed out groups (default)
+  always = "always"               # emit any timed out group
+  min_cameras = "min_cameras"     # emit if at least min_cameras are present
+  required = "required"           # emit if all the required cameras are present
+
+
+@beartype
+@dataclass
+class PartialPolicy:
+  """ Which incomplete (timed out) groups are emitted downstream """
+  mode: PartialMode = PartialMode.never
+  min_cameras: int = 1
+  required: List[str] = field(default_factory=list)
+
+  def accepts(self, cameras:Set[str]) -> bool:
+    match self.mode:
+      case PartialMode.never:       return False
+      case PartialMode.always:      return len(cameras) > 0
+      case PartialMode.min_cameras: return len(cameras) >= max(1, self.min_cameras)
+      case PartialMode.required:    return len(cameras) > 0 and set(self.required) <= cameras
+
+
 class SyncHandler(Dispatcher):
   _events_ = ["on_group", "on_drop"]
 
@@ -29,7 +56,13 @@ class SyncHandler(Dispatcher):
           query_time:TimeQuery,  
 
           logger:logging.Logger,
-          num_workers:int=2):
+          num_workers:int=2,
+          queue_policy:Optional[QueuePolicy]=None,
+          release_buffers:bool=True,
+          clock_model:Optional[ClockModel]=None,
+          partial_policy:Optional[PartialPolicy]=None,
+          grouping:GroupingMode=GroupingMode.timestamp,
+          discard_frame:Optional[Callable[[Timestamped], None]]=None):
     
     
     self.sync_threshold = sync_threshold
@@ -37,14 +70,35 @@ class SyncHandler(Dispatcher):
     self.logger = logger
 
     self.process_buffer = process_buffer
+    # False if process_buffer takes ownership of the buffer (e.g. leases it)
+    self.release_buffers = release_buffers
+    # called with processed frames which are dropped (e.g. to release leased buffers)
+    self.discard_frame = discard_frame or (lambda frame: None)
 
     self.camera_set = set(time_offsets.keys())
+    self.partial_policy = partial_policy or PartialPolicy()
+
+    unknown = set(self.partial_policy.required) - self.camera_set
+    assert len(unknown) == 0, f"Required cameras {sorted(unknown)} not in {sorted(self.camera_set)}"
 
-    self.grouper = FrameGrouper(time_offsets, sync_threshold)
+    self.grouper = grouping.create(time_offsets, sync_threshold, clock_model=clock_model, logger=logger,
+                                   discard_frame=self.discard_frame)
+
+    # Two stages: buffers are processed (uploaded) by num_workers in parallel, 
+    # then grouped by a single worker which owns the grouper and clock state
     self.work_queue = WorkQueue("sync_handler", self._process_worker, 
-                                logger=logger, num_workers=num_workers, max_size=self.num_cameras)
+                                logger=logger, num_workers=num_workers, max_size=max(self.num_cameras, num_workers),
+                                policy=queue_policy, on_drop=lambda buffer: buffer.release())
+    
+    self.group_queue = WorkQueue("sync_grouper", self._group_worker,
+                                logger=logger, num_workers=1, max_size=self.num_cameras * 2,
+                                on_drop=self.discard_frame)
     
+    self.start_lock = Lock()
+
     self.query_time = query_time
+    # host arrival time relative to the (corrected) camera time, fitted over recent groups
+    self.host_clock = LinearFit(window=200)
     self.clock_drift = 0.0
 
     self.most_recent_frame = 0.0
@@ -53,15 +107,43 @@ class SyncHandler(Dispatcher):
   def num_cameras(self):
     return len(self.camera_set)
   
+  @property
+  def time_offsets(self) -> Dict[str, float]:
+    """ Current clock offsets (host - camera time) used to group frames """
+    return dict(self.grouper.time_offsets)
+
+  @property
+  def host_offsets(self) -> Dict[str, float]:
+    """ Clock offsets corrected for the drift of the group (mean camera time) relative to the host """
+    return {k:offset + self.clock_drift for k, offset in self.grouper.time_offsets.items()}
+
+  @property
+  def clock_drifts(self) -> Dict[str, float]:
+    """ Rate of change of host_offsets (seconds per second) """
+    return {k:self.grouper.clock.skew(k) + self.host_clock.slope for k in self.camera_set}
+  
 
   def push_image(self, buffer:Buffer):
     if not self.work_queue.started:
-      self.work_queue.start()
+      with self.start_lock:   # cameras call back from their own threads
+        if not self.work_queue.started:
+          self.group_queue.start()
+          self.work_queue.start()
+
     self.work_queue.enqueue(buffer)
 
 
   def _process_worker(self, buffer:Buffer):
-    image = self.process_buffer(buffer)
+    try:
+      image = self.process_buffer(buffer)
+    finally:
+      if self.release_buffers:
+        buffer.release()
+
+    self.group_queue.enqueue(image)
+
+
+  def _group_worker(self, image:Timestamped):
     group = self.grouper.add_frame(image)
 
     if group is not None:
@@ -70,7 +152,8 @@ class SyncHandler(Dispatcher):
       t = group.timestamp
       frames = {k:frame.with_timestamp(t) for k,frame in group.frames.items()}
 
-      self.clock_drift = lerp(0.02, group.clock_time - t, self.clock_drift)
+      self.host_clock.add(t, group.clock_time - t)
+      self.clock_drift = self.host_clock.predict(t, default=group.clock_time - t)
       self.most_recent_frame = t
       
       self.emit("on_group", frames)
@@ -78,13 +161,26 @@ class SyncHandler(Dispatcher):
     timed_out = self.grouper.timeout_groups(self.query_time() - self.sync_timeout)
     for group in timed_out:
       missing = self.camera_set - group.camera_set
-      self.logger.warning(f"Dropping timed out, missing {sorted(missing)}")
+
+      if self.partial_policy.accepts(group.camera_set):
+        self.logger.warning(f"Emitting partial group, missing {sorted(missing)}")
+        t = group.timestamp
+        self.emit("on_group", {k:frame.with_timestamp(t) for k,frame in group.frames.items()})
+      else:
+        self.logger.warning(f"Dropping timed out, missing {sorted(missing)}")
+        self._discard_group(group)
+
       self.emit("on_drop", missing)
 
-    buffer.release()
 
+  def _discard_group(self, group:FrameGroup):
+    for frame in group.frames.values():
+      self.discard_frame(frame)
 
   def flush(self):
+    """ Finish processing queued buffers, incomplete groups are discarded """
+    # pending uploads complete before the grouping stage is stopped
     self.work_queue.stop()
-    self.grouper.clear()
-
+    self.group_queue.stop()
+    for group in self.grouper.clear():
+      self._discard_group(group)
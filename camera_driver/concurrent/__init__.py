@@ -1,4 +1,7 @@
-from .work_queue import WorkQueue
+from .work_queue import WorkQueue, QueuePolicy, OverflowPolicy, queue_stats
+from .queue_stats import QueueStats, TimingStats, DepthStats
+from .parallel import parallel_map, ParallelError
 
 
-__all__ = ['WorkQueue']
\ No newline at end of file
+__all__ = ['WorkQueue', 'QueuePolicy', 'OverflowPolicy', 'queue_stats', 
+           'QueueStats', 'TimingStats', 'DepthStats', 'parallel_map', 'ParallelError']
@@ -0,0 +1,53 @@
+import logging
+from multiprocessing.pool import ThreadPool
+from time import perf_counter
+import traceback
+from beartype.typing import Callable, Dict, Optional, Tuple, TypeVar
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class ParallelError(RuntimeError):
+  """ One or more items of a parallel_map failed, errors has the exception for each """
+  def __init__(self, label:str, errors:Dict[str, Exception]):
+    self.errors = errors
+
+    details = "; ".join(f"{k}: {e}" for k, e in errors.items())
+    super().__init__(f"{label} failed for {sorted(errors.keys())}: {details}")
+
+
+def parallel_map(label:str, f:Callable[[T], R], items:Dict[str, T], logger:logging.Logger,
+                 num_threads:Optional[int]=None) -> Dict[str, R]:
+  """ Apply f to each item on its own thread (e.g. one per camera), logging the time for each.
+      All items run to completion, then ParallelError is raised if any of them failed. """
+  if len(items) == 0:
+    return {}
+
+  def timed(item:Tuple[str, T]):
+    k, value = item
+    start = perf_counter()
+    try:
+      return k, f(value), None, perf_counter() - start
+    except Exception as e:
+      logger.error(f"{k}: {label} failed: {traceback.format_exc()}")
+      return k, None, e, perf_counter() - start
+
+  start = perf_counter()
+  with ThreadPool(num_threads or len(items)) as pool:
+    results = pool.map(timed, items.items(), chunksize=1)
+
+  elapsed = perf_counter() - start
+  for k, _, _, t in results:
+    logger.debug(f"{k}: {label} took {t:.3f}s")
+
+  slowest, _, _, t_slowest = max(results, key=lambda result: result[3])
+  logger.info(f"{label}: {len(items)} in {elapsed:.3f}s (slowest {slowest} {t_slowest:.3f}s, "
+              f"sequential {sum(result[3] for result in results):.3f}s)")
+
+  errors = {k:e for k, _, e, _ in results if e is not None}
+  if len(errors) > 0:
+    raise ParallelError(label, errors)
+
+  return {k:result for k, result, _, _ in results}
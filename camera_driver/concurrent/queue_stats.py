@@ -0,0 +1,81 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from beartype.typing import Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class TimingStats:
+  """ Summary of a window of timing samples, in milliseconds """
+  count: int = 0
+
+  mean_ms: float = 0.0
+  p50_ms: float = 0.0
+  p90_ms: float = 0.0
+  p99_ms: float = 0.0
+  max_ms: float = 0.0
+
+  @staticmethod
+  def from_samples(samples:Sequence[float]) -> TimingStats:
+    if len(samples) == 0:
+      return TimingStats()
+    
+    ms = np.array(samples) * 1000.0
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return TimingStats(count=len(ms), mean_ms=float(ms.mean()), 
+                       p50_ms=float(p50), p90_ms=float(p90), p99_ms=float(p99), max_ms=float(ms.max()))
+
+  def __repr__(self):
+    return f"{self.p50_ms:.1f}/{self.p90_ms:.1f}/{self.p99_ms:.1f}/{self.max_ms:.1f}ms"
+  
+
+@dataclass
+class DepthStats:
+  """ Time weighted queue depth over a window of (time, depth) samples """
+  mean: float = 0.0
+  max: int = 0
+  full_fraction: float = 0.0
+
+  @staticmethod
+  def from_series(series:Sequence[Tuple[float, int]], max_size:int) -> DepthStats:
+    if len(series) < 2:
+      return DepthStats()
+    
+    times, depths = np.array(series).T
+    order = np.argsort(times, kind='stable')
+    times, depths = times[order], depths[order]
+
+    durations = np.diff(times)
+    total = durations.sum()
+    if total <= 0:
+      return DepthStats(mean=float(depths.mean()), max=int(depths.max()))
+
+    depths = depths[:-1]
+    return DepthStats(mean=float((depths * durations).sum() / total), max=int(depths.max()), 
+                      full_fraction=float(durations[depths >= max_size].sum() / total))
+  
+  def __repr__(self):
+    return f"{self.mean:.1f} (max {self.max}, full {100 * self.full_fraction:.0f}%)"
+
+
+@dataclass
+class QueueStats:
+  name: str
+  num_workers: int
+
+  size: int
+  max_size: int
+
+  accepted: int
+  dropped: int
+
+  enqueue_wait: TimingStats  # time blocked in enqueue
+  queue_time: TimingStats    # time items sit in the queue
+  run_time: TimingStats      # time spent in run
+
+  depth: DepthStats
+
+  def __repr__(self):
+    return (f"{self.name}: accepted {self.accepted} dropped {self.dropped} depth {self.depth}/{self.max_size}, "
+           f"wait {self.enqueue_wait} queued {self.queue_time} run {self.run_time} (x{self.num_workers})")
@@ -0,0 +1,59 @@
+from beartype.typing import Any, Callable, Dict
+from threading import Condition
+
+
+skipped = object()
+
+class ReorderBuffer():
+  """ Releases results strictly in sequence order. 
+      At most `window` sequence numbers may be in flight beyond the oldest unreleased result. """
+  
+  def __init__(self, emit: Callable[[Any], None], window: int):
+    assert window > 0, "ReorderBuffer: window must be positive"
+
+    self.emit = emit
+    self.window = window
+
+    self.issued: int = 0
+    self.released: int = 0
+
+    self.pending: Dict[int, Any] = {}
+    self.draining: bool = False
+    self.cond = Condition()
+
+  def next(self) -> int:
+    with self.cond:
+      seq = self.issued
+      self.issued += 1
+      return seq
+    
+  def wait(self, seq: int) -> None:
+    """ Block until seq is inside the reorder window """
+    with self.cond:
+      self.cond.wait_for(lambda: seq < self.released + self.window)
+
+  @property
+  def num_pending(self) -> int:
+    return len(self.pending)
+
+  def complete(self, seq: int, result: Any = skipped) -> None:
+    """ Record a result, emitting any results now in order. 
+        Only one thread emits at a time so listeners see results in sequence. """
+    with self.cond:
+      self.pending[seq] = result
+      if self.draining:
+        return
+      self.draining = True
+
+    while True:
+      with self.cond:
+        if self.released not in self.pending:
+          self.draining = False
+          return
+        
+        result = self.pending.pop(self.released)
+        self.released += 1
+        self.cond.notify_all()
+
+      if result is not skipped:
+        self.emit(result)
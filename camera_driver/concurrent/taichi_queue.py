@@ -2,14 +2,16 @@
 from concurrent.futures import Future, ThreadPoolExecutor
 from functools import partial
 
-import taichi as ti
 
 class TaichiQueue():
+  """ Single thread which owns the taichi runtime (taichi is imported on first use, 
+      so cpu-only pipelines run without it) """
   executor: ThreadPoolExecutor = None
     
   @classmethod
   def queue(cls) -> ThreadPoolExecutor:
     if cls.executor is None:
+      import taichi as ti
       cls.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="taichi",
         initializer=partial(ti.init, arch=ti.gpu, device_memory_GB=1.0, offline_cache=True))
     return cls.executor
@@ -31,6 +33,7 @@ class TaichiQueue():
   def stop(cls) -> None:
     executor = TaichiQueue.executor
     if executor is not None:
+      import taichi as ti
       cls.run_sync(ti.reset)
       executor.shutdown(wait=True)
       TaichiQueue.executor = None
@@ -1,34 +1,223 @@
 from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
 from logging import Logger
+from time import perf_counter
 import traceback
-from beartype.typing import Callable, Any, List, Optional
+from weakref import WeakSet
+from beartype import beartype
+from beartype.typing import Callable, Any, Dict, List, Optional, Tuple
 
-from queue import Queue
-from threading import Thread
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+
+from .queue_stats import DepthStats, QueueStats, TimingStats
+from .reorder import ReorderBuffer, skipped
+
+
+class OverflowPolicy(Enum):
+  block = "block"                 # wait for space (default)
+  block_timeout = "block_timeout" # wait up to timeout_msec, then drop the new item
+  drop_newest = "drop_newest"     # drop the new item immediately
+  drop_oldest = "drop_oldest"     # drop the oldest queued item to make space
+  keep_latest = "keep_latest"     # drop everything queued, only the newest item waits
+
+
+@beartype
+@dataclass
+class QueuePolicy:
+  overflow: OverflowPolicy = OverflowPolicy.block
+  timeout_msec: float = 1000.0
+
+
+class TimedQueue(Queue):
+  """ Queue which stamps items with the time they were inserted, and records the queue depth over time """
+  def __init__(self, maxsize: int, history: int):
+    super().__init__(maxsize)
+    self.depth_series = deque(maxlen=history)
+
+  def _put(self, item: Any) -> None:
+    t = perf_counter()
+    super()._put((t, item))
+    self.depth_series.append((t, len(self.queue)))
+
+  def _get(self) -> Any:
+    item = super()._get()
+    self.depth_series.append((perf_counter(), len(self.queue)))
+    return item
+
+
+_queues: WeakSet = WeakSet()
+
+def queue_stats() -> Dict[str, QueueStats]:
+  """ Stats for all running work queues, by name (repeated names are numbered) """
+  stats = {}
+  for queue in sorted([q for q in _queues if q.started], key=lambda q: q.name):
+    name, i = queue.name, 1
+    while name in stats:
+      name, i = f"{queue.name}_{i}", i + 1
+    stats[name] = queue.stats()
+
+  return stats
 
 
 class WorkQueue():
   def __init__(self, name: str, run: Callable, logger: Logger, 
-               num_workers: int = 1, max_size: int = None):
+               num_workers: int = 1, max_size: int = None,
+               policy: Optional[QueuePolicy] = None,
+               on_drop: Optional[Callable[[Any], None]] = None,
+               on_result: Optional[Callable[[Any], None]] = None,
+               ordered: bool = False, 
+               reorder_window: Optional[int] = None,
+               history: int = 1024):
+    """ 
+      on_result: called with the return value of run (if not None)
+      ordered: call on_result in the order items were queued, with at most 
+        reorder_window (default 2 * num_workers) items in flight
+    """
     
-    self.queue: Queue = Queue(max_size or num_workers)
+    self.queue: TimedQueue = TimedQueue(max_size or num_workers, history)
     self.workers: Optional[List[Thread]] = None
     self.num_workers: int = num_workers
     
     self.name: str = name
     self.run: Callable = run
     self.logger: Logger = logger
+
+    self.policy: QueuePolicy = policy or QueuePolicy()
+    self.on_drop: Optional[Callable[[Any], None]] = on_drop
+    self.on_result: Optional[Callable[[Any], None]] = on_result
+
+    assert not ordered or on_result is not None, f"WorkQueue {name}: ordered requires on_result"
+    self.reorder: Optional[ReorderBuffer] = ReorderBuffer(self._emit_result, reorder_window or 2 * num_workers
+                                                          ) if ordered else None
+    self.get_lock = Lock()
+
+    self.count_lock = Lock()
+    self.accepted: int = 0
+    self.dropped: int = 0
+
+    # Timing samples (seconds) over the most recent items
+    self.enqueue_wait: deque = deque(maxlen=history)
+    self.queue_time: deque = deque(maxlen=history)
+    self.run_time: deque = deque(maxlen=history)
+
+    _queues.add(self)
     
-  def enqueue(self, data: Any) -> None:
+  def enqueue(self, data: Any) -> bool:
+      """ Add an item to the queue according to the overflow policy, returns False if the item was dropped """
       assert self.started, f"WorkQueue {self.name} not started"
-      return self.queue.put(data)
+
+      start = perf_counter()
+      accepted = self._put(data)
+      self.enqueue_wait.append(perf_counter() - start)
+      return accepted
   
+  def _put(self, data: Any) -> bool:
+      overflow = self.policy.overflow
+      if overflow == OverflowPolicy.block:
+        self.queue.put(data)
+        return self._accepted()
+      
+      if overflow == OverflowPolicy.keep_latest and not self._drop_queued(all=True):
+        self._drop(data)
+        return False
+
+      try:
+        if overflow == OverflowPolicy.block_timeout:
+          self.queue.put(data, timeout=self.policy.timeout_msec / 1000.)
+        else:
+          self.queue.put_nowait(data)
+        return self._accepted()
+      
+      except Full:
+        if overflow in [OverflowPolicy.block_timeout, OverflowPolicy.drop_newest]:
+          self._drop(data)
+          return False
+
+      # drop_oldest / keep_latest - make space by discarding queued items
+      while self._drop_queued(all=overflow == OverflowPolicy.keep_latest):
+        try:
+          self.queue.put_nowait(data)
+          return self._accepted()
+        except Full:
+          pass
+
+      self._drop(data)
+      return False
+
+  def _drop_queued(self, all: bool) -> bool:
+    """ Discard the oldest queued item (or all of them), returns False if the queue is stopping """
+    while True:
+      try:
+        _, item = self.queue.get_nowait()
+      except Empty:
+        return True
+      
+      if item is None:
+        # Never discard the stop sentinel
+        self.queue.put(None)
+        return False
+      
+      self._drop(item)
+      if not all:
+        return True
+
+  def _accepted(self) -> bool:
+    with self.count_lock:
+      self.accepted += 1
+    return True
+        
+  def _drop(self, data: Any) -> None:
+    with self.count_lock:
+      self.dropped += 1
+
+    self.logger.debug(f"WorkQueue {self.name} full, dropped item ({self.dropped} total)")
+    if self.on_drop is not None:
+      self.on_drop(data)
+  
+  def _get(self) -> Tuple[float, Any, Optional[int]]:
+    if self.reorder is None:
+      queued, data = self.queue.get()
+      return queued, data, None
+    
+    # Sequence numbers follow queue order
+    with self.get_lock:
+      queued, data = self.queue.get()
+      return queued, data, (self.reorder.next() if data is not None else None)
+
+  def _emit_result(self, result: Any) -> None:
+    if result is not None:
+      self.on_result(result)
+
+  def _run(self, data: Any, seq: Optional[int]) -> None:
+    if seq is None:
+      result = self.run(data)
+      if self.on_result is not None:
+        self._emit_result(result)
+      return
+
+    result = skipped
+    try:
+      result = self.run(data)
+    finally:
+      self.reorder.complete(seq, result)
+
   def run_worker(self) -> None:
       try:
-        data = self.queue.get()
+        queued, data, seq = self._get()
         while data is not None:
-          self.run(data)
-          data = self.queue.get()
+          if seq is not None:
+            self.reorder.wait(seq)
+
+          start = perf_counter()
+          self.queue_time.append(start - queued)
+
+          self._run(data, seq)
+          self.run_time.append(perf_counter() - start)
+
+          queued, data, seq = self._get()
       except Exception as e:
         trace = traceback.format_exc()
         self.logger.error(trace)
@@ -50,6 +239,22 @@ class WorkQueue():
   def size(self) -> int:
     return self.queue.qsize()
   
+  def stats(self) -> QueueStats:
+    return QueueStats(
+      name=self.name, 
+      num_workers=self.num_workers,
+      size=self.size,
+      max_size=self.queue.maxsize,
+
+      accepted=self.accepted, 
+      dropped=self.dropped,
+
+      enqueue_wait=TimingStats.from_samples(list(self.enqueue_wait)),
+      queue_time=TimingStats.from_samples(list(self.queue_time)),
+      run_time=TimingStats.from_samples(list(self.run_time)),
+      depth=DepthStats.from_series(list(self.queue.depth_series), self.queue.maxsize)
+    )
+  
   def stop(self) -> None:
     if self.workers is not None:
       self.logger.info(f"Stopping WorkQueue {self.name}, ({self.num_workers} threads)")
@@ -63,7 +268,7 @@ class WorkQueue():
       self.workers = None
 
       
-    self.logger.info(f"Workqueue done {self.name}")
+    self.logger.info(f"Workqueue done {self.name}, accepted {self.accepted}, dropped {self.dropped}")
   
   def start(self) -> None:
     assert self.workers is None
@@ -73,5 +278,4 @@ class WorkQueue():
     for worker in self.workers:
       worker.start()
 
-    self.logger.info(f"WorkQueue {self.name} started ({self.num_workers} threads)")
-  
\ No newline at end of file
+    self.logger.info(f"WorkQueue {self.name} started ({self.num_workers} threads, {self.policy.overflow.value})")
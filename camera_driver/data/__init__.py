@@ -1,4 +1,4 @@
-from .encoding import ImageEncoding, camera_encodings, BayerPattern, bayer_pattern, encoding_type, EncodingType
+from .encoding import ImageEncoding, camera_encodings, BayerPattern, bayer_pattern, encoding_type, EncodingType, packed_size
 from .timestamped import Timestamped
 
 __all__ = [
@@ -8,4 +8,5 @@ __all__ = [
   'encoding_type', 
   'EncodingType',
   'bayer_pattern', 
+  'packed_size',
   'Timestamped']
\ No newline at end of file
@@ -52,6 +52,19 @@ def encoding_type(encoding):
     raise ValueError(f"Encoding not implemented {encoding}")
 
 
+def packed_size(image_size, encoding) -> int:
+  """ Size in bytes of a packed bayer image """
+  w, h = image_size
+  bits = {
+    EncodingType.Packed8: 8,
+    EncodingType.Packed12: 12,
+    EncodingType.Packed12_IDS: 12,
+    EncodingType.Packed16: 16
+  }[encoding_type(encoding)]
+
+  return (w * h * bits) // 8
+
+
 def bayer_pattern(encoding):
   if encoding in [ImageEncoding.Bayer_BGGR8, ImageEncoding.Bayer_BGGR12, ImageEncoding.Bayer_BGGR12_IDS,  ImageEncoding.Bayer_BGGR16]:
     return BayerPattern.BGGR
@@ -1,6 +1,7 @@
 
-from dataclasses import dataclass, replace
+from dataclasses import dataclass, field, replace
 from datetime import datetime
+from beartype.typing import Optional
 
 
 
@@ -12,6 +13,9 @@ class Timestamped:
   
   camera_name: str
 
+  # camera frame counter (if the driver provides one), keyword only so subclasses can add fields
+  frame_id: Optional[int] = field(default=None, kw_only=True)
+
   @property
   def datetime(self):
     return datetime.fromtimestamp(self.timestamp_sec)
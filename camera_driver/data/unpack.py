@@ -0,0 +1,166 @@
+""" Host side (numpy) conversion between packed bayer formats and uint16 images.
+
+    Images are split into chunks of rows which are processed on a shared thread pool,
+    numpy releases the GIL for the element-wise operations so chunks run in parallel.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+from threading import Lock
+from beartype.typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from .encoding import EncodingType
+
+min_chunk_rows = 32
+block_rows = 64   # rows processed at once within a chunk, keeps temporaries in cache
+
+_executor:Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+
+
+def default_threads() -> int:
+  return os.cpu_count() or 1
+
+
+def executor() -> ThreadPoolExecutor:
+  global _executor
+  with _executor_lock:
+    if _executor is None:
+      _executor = ThreadPoolExecutor(max_workers=default_threads(), thread_name_prefix="unpack")
+    return _executor
+
+
+def map_rows(f:Callable[[int, int], None], height:int, num_threads:Optional[int]=None):
+  """ Run f(start, end) over chunks of rows in parallel, in blocks of block_rows """
+  def blocks(start:int, end:int):
+    for i in range(start, end, block_rows):
+      f(i, min(i + block_rows, end))
+
+  num_threads = min(num_threads or default_threads(), max(1, height // min_chunk_rows))
+  if num_threads <= 1:
+    return blocks(0, height)
+
+  bounds = np.linspace(0, height, num_threads + 1).astype(int).tolist()
+  list(executor().map(blocks, bounds[:-1], bounds[1:]))
+
+
+def _rows(data:np.ndarray, image_size:Optional[Tuple[int, int]], row_bytes:Callable[[int], int]) -> np.ndarray:
+  if data.ndim == 2:
+    return data
+
+  assert image_size is not None, "image_size required for flat buffers"
+  w, h = image_size
+  return data.reshape(h, row_bytes(w))
+
+
+def _output(out:Optional[np.ndarray], shape:Tuple[int, ...], dtype) -> np.ndarray:
+  if out is None:
+    return np.empty(shape, dtype=dtype)
+
+  assert out.shape == shape and out.dtype == dtype, f"Expected output {shape} {dtype}, got {out.shape} {out.dtype}"
+  return out
+
+
+def _decode12_rows(packed:np.ndarray, out:np.ndarray, ids_format:bool):
+  b0, b1, b2 = [packed[:, i::3].astype(np.uint16) for i in range(3)]
+  p0, p1 = out[:, 0::2], out[:, 1::2]
+
+  if ids_format:
+    np.left_shift(b0, 4, out=p0)
+    p0 |= b1 & 0xF
+    np.left_shift(b2, 4, out=p1)
+    p1 |= b1 >> 4
+  else:
+    np.bitwise_and(b1, 0xF, out=p0)
+    p0 <<= 8
+    p0 |= b0
+    np.right_shift(b1, 4, out=p1)
+    p1 |= b2 << 4
+
+
+def _encode12_rows(image:np.ndarray, out:np.ndarray, ids_format:bool):
+  p0, p1 = image[:, 0::2], image[:, 1::2]
+
+  if ids_format:
+    out[:, 0::3] = p0 >> 4
+    out[:, 1::3] = (p0 & 0xF) | ((p1 & 0xF) << 4)
+    out[:, 2::3] = p1 >> 4
+  else:
+    out[:, 0::3] = p0 & 0xFF
+    out[:, 1::3] = (p0 >> 8) | ((p1 & 0xF) << 4)
+    out[:, 2::3] = p1 >> 4
+
+
+def decode12(packed:np.ndarray, image_size:Optional[Tuple[int, int]]=None, out:Optional[np.ndarray]=None,
+             ids_format:bool=False, num_threads:Optional[int]=None) -> np.ndarray:
+  """ Decode 12 bit packed pixel pairs (3 bytes) to a uint16 image (h, w),
+      GenICam 12p layout, or the IDS 12g24 layout with ids_format=True.
+
+      packed: uint8 (h, w * 3/2) or a flat buffer with image_size given
+      out: optional uint16 (h, w) array to decode into
+  """
+  packed = _rows(packed, image_size, lambda w: w * 3 // 2)
+  h, row_bytes = packed.shape
+  assert row_bytes % 3 == 0, f"Packed 12 bit rows must be a multiple of 3 bytes, got {row_bytes}"
+
+  out = _output(out, (h, row_bytes * 2 // 3), np.uint16)
+  map_rows(lambda start, end: _decode12_rows(packed[start:end], out[start:end], ids_format), h, num_threads)
+  return out
+
+
+def encode12(image:np.ndarray, out:Optional[np.ndarray]=None,
+             ids_format:bool=False, num_threads:Optional[int]=None) -> np.ndarray:
+  """ Encode a uint16 image (h, w) with 12 bit values to packed 12 bit rows (h, w * 3/2) """
+  h, w = image.shape
+  assert w % 2 == 0, f"Packed 12 bit images must have an even width, got {w}"
+
+  out = _output(out, (h, w * 3 // 2), np.uint8)
+  map_rows(lambda start, end: _encode12_rows(image[start:end], out[start:end], ids_format), h, num_threads)
+  return out
+
+
+def decode16(packed:np.ndarray, image_size:Optional[Tuple[int, int]]=None, out:Optional[np.ndarray]=None,
+             num_threads:Optional[int]=None) -> np.ndarray:
+  """ Decode little endian 16 bit rows (h, w * 2) to a uint16 image (h, w) """
+  packed = _rows(packed, image_size, lambda w: w * 2)
+  h, row_bytes = packed.shape
+
+  image = packed.view('<u2')
+  out = _output(out, (h, row_bytes // 2), np.uint16)
+
+  def f(start, end):
+    out[start:end] = image[start:end]
+  map_rows(f, h, num_threads)
+  return out
+
+
+def decode(packed:np.ndarray, encoding:EncodingType, image_size:Optional[Tuple[int, int]]=None,
+           out:Optional[np.ndarray]=None, num_threads:Optional[int]=None) -> np.ndarray:
+  """ Decode a packed 12/16 bit image to uint16 """
+  match encoding:
+    case EncodingType.Packed12:
+      return decode12(packed, image_size, out=out, num_threads=num_threads)
+    case EncodingType.Packed12_IDS:
+      return decode12(packed, image_size, out=out, ids_format=True, num_threads=num_threads)
+    case EncodingType.Packed16:
+      return decode16(packed, image_size, out=out, num_threads=num_threads)
+    case _:
+      raise ValueError(f"Decoding not implemented for {encoding}")
+
+
+def encode(image:np.ndarray, encoding:EncodingType,
+           out:Optional[np.ndarray]=None, num_threads:Optional[int]=None) -> np.ndarray:
+  """ Encode a uint16 image to packed 12/16 bit rows """
+  match encoding:
+    case EncodingType.Packed12:
+      return encode12(image, out=out, num_threads=num_threads)
+    case EncodingType.Packed12_IDS:
+      return encode12(image, out=out, ids_format=True, num_threads=num_threads)
+    case EncodingType.Packed16:
+      out = _output(out, (image.shape[0], image.shape[1] * 2), np.uint8)
+      out.view('<u2')[:] = image
+      return out
+    case _:
+      raise ValueError(f"Encoding not implemented for {encoding}")
@@ -1,4 +1,6 @@
 from .interface import CameraProperties, Camera, Manager, Buffer, ImageEncoding, BackendType, CameraInfo
+from .clock_offset import ClockOffset
+from .discovery import DeviceRegistry, DiscoveryTimeout
 
 
 
@@ -10,4 +12,7 @@ __all__ = [
     'ImageEncoding',
     'BackendType',
     'CameraInfo',
+    'ClockOffset',
+    'DeviceRegistry',
+    'DiscoveryTimeout',
 ]
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+import math
+from beartype import beartype
+from beartype.typing import Callable, List, Tuple
+
+import numpy as np
+
+
+@beartype
+@dataclass
+class ClockOffset:
+  """ Camera clock offset (host - camera time) estimated by latching the camera clock """
+  offset_sec: float   # median of the samples
+  spread_sec: float   # robust standard deviation of the samples (scaled MAD)
+  samples: int
+
+  @property
+  def error_sec(self) -> float:
+    """ Approximate standard error of the median """
+    return 1.2533 * self.spread_sec / math.sqrt(self.samples)
+
+
+def median_spread(samples:List[float]) -> Tuple[float, float]:
+  x = np.array(samples)
+  median = float(np.median(x))
+  return median, 1.4826 * float(np.median(np.abs(x - median)))
+
+
+@beartype
+def estimate_offset(sample:Callable[[], float], tolerance_sec:float=1e-5,
+                    min_samples:int=5, max_samples:int=50) -> ClockOffset:
+  """ Median of repeated offset samples, stopping early once the standard error
+      of the median is within tolerance_sec (or after max_samples) """
+  samples = [sample() for _ in range(min(min_samples, max_samples))]
+
+  while True:
+    estimate = ClockOffset(*median_spread(samples), samples=len(samples))
+    if estimate.error_sec <= tolerance_sec or len(samples) >= max_samples:
+      return estimate
+
+    samples.append(sample())
@@ -0,0 +1,93 @@
+import logging
+from threading import Condition
+from time import perf_counter
+from beartype.typing import Callable, Dict, Generic, Optional, Set, TypeVar
+
+T = TypeVar('T')
+
+
+class DiscoveryTimeout(TimeoutError):
+  def __init__(self, missing:Set[str], timeout_sec:float):
+    self.missing = missing
+    super().__init__(f"Cameras {sorted(missing)} not found after {timeout_sec:.1f}s")
+
+
+class DeviceRegistry(Generic[T]):
+  """ Devices (SDK handles) by serial, kept up to date by the SDK's arrival and removal callbacks,
+      so lookups don't enumerate devices and waiting for devices doesn't poll in a busy loop. """
+
+  def __init__(self, logger:logging.Logger):
+    self.logger = logger
+    self.devices:Dict[str, T] = {}
+    self.changed = Condition()
+
+  def added(self, serial:str, device:T):
+    with self.changed:
+      self.devices[serial] = device
+      self.changed.notify_all()
+
+  def removed(self, serial:str):
+    with self.changed:
+      self.devices.pop(serial, None)
+      self.changed.notify_all()
+
+  def discard(self, serials:Set[str]):
+    """ Forget devices which are about to go away (e.g. reset), so waiting sees them return """
+    with self.changed:
+      for serial in serials:
+        self.devices.pop(serial, None)
+
+  def clear(self):
+    with self.changed:
+      self.devices = {}
+
+
+  def serials(self) -> Set[str]:
+    with self.changed:
+      return set(self.devices.keys())
+
+  def __contains__(self, serial:str) -> bool:
+    return serial in self.devices
+
+  def __getitem__(self, serial:str) -> T:
+    device = self.devices.get(serial)
+    if device is None:
+      raise KeyError(f"Camera {serial} not found, available: {sorted(self.serials())}")
+    return device
+
+
+  def wait_for(self, serials:Set[str], timeout_sec:float=30.0, progress_sec:float=2.0,
+               poll:Optional[Callable[[], None]]=None, poll_sec:float=0.5) -> Dict[str, T]:
+    """ Wait until all serials are present (or raise DiscoveryTimeout), logging progress.
+        poll is called every poll_sec for SDKs which only run their callbacks on an explicit update. """
+    start = perf_counter()
+    last_progress = start
+    found = set()
+
+    with self.changed:
+      while True:
+        if poll is not None:
+          self.changed.release()
+          try:
+            poll()
+          finally:
+            self.changed.acquire()
+
+        now = perf_counter()
+        for serial in sorted((serials & self.devices.keys()) - found):
+          self.logger.info(f"Camera {serial} found ({now - start:.1f}s, {len(found) + 1}/{len(serials)})")
+          found.add(serial)
+
+        missing = serials - self.devices.keys()
+        if len(missing) == 0:
+          return {serial:self.devices[serial] for serial in serials}
+
+        if now - start >= timeout_sec:
+          raise DiscoveryTimeout(missing, timeout_sec)
+
+        if now - last_progress >= progress_sec:
+          self.logger.info(f"Waiting for cameras {sorted(missing)} ({now - start:.1f}s, {len(found)}/{len(serials)} found)")
+          last_progress = now
+
+        wait = min(timeout_sec - (now - start), progress_sec - (now - last_progress))
+        self.changed.wait(min(wait, poll_sec) if poll is not None else wait)
@@ -1,5 +1,6 @@
 
 from enum import Enum
+from threading import Lock
 from typing import List, Optional
 from beartype.typing import Callable, Set, Tuple, Dict
 import abc
@@ -11,6 +12,7 @@ import numpy as np
 
 from pydispatch import Dispatcher
 from camera_driver.data.encoding import ImageEncoding
+from camera_driver.driver.clock_offset import ClockOffset
 
 
 from dataclasses import dataclass
@@ -28,6 +30,15 @@ SettingList = List[Dict]
 Presets = Dict[str, SettingList]
 
 class Buffer(metaclass=abc.ABCMeta):
+  """ An image delivered by a camera, in memory owned by the driver.
+
+      Whoever takes a buffer from a queue (or is handed it by on_buffer) owns it, and releases it
+      once done, or hands it on to another queue. release() only returns the buffer on the first call.
+  """
+
+  def __init__(self):
+    self._release_lock = Lock()
+    self._released = False
 
   @property
   @abc.abstractmethod
@@ -55,8 +66,26 @@ class Buffer(metaclass=abc.ABCMeta):
   def encoding(self) -> ImageEncoding:
     raise NotImplementedError()
 
-  @abc.abstractmethod
+  @property
+  def frame_id(self) -> Optional[int]:
+    """ Camera frame counter (incremented per exposure), or None if not supported """
+    return None
+
+  @property
+  def released(self) -> bool:
+    return self._released
+
   def release(self):
+    """ Return the buffer to the driver, later calls do nothing """
+    with self._release_lock:
+      if self._released:
+        return
+      self._released = True
+
+    self._release()
+
+  @abc.abstractmethod
+  def _release(self):
     raise NotImplementedError()
 
   
@@ -77,6 +106,9 @@ class CameraInfo:
   calibration : Optional[Camera] = None
   has_latching : bool = False
 
+  # number of buffers the driver delivers into (if known)
+  buffer_count : Optional[int] = None
+
   def __repr__(self):    
     w, h = self.image_size
     t, t_max = self.throughput_mb
@@ -91,13 +123,19 @@ class Camera(Dispatcher, metaclass=abc.ABCMeta):
     raise NotImplementedError()
   
   @abc.abstractmethod
-  def compute_clock_offset(self, get_time_sec:Callable[[], float]):
+  def compute_clock_offset(self, get_time_sec:Callable[[], float], 
+                           tolerance_sec:float=1e-5, max_samples:int=50) -> ClockOffset:
+    """ Latch the camera clock until the offset estimate is within tolerance_sec (or max_samples) """
     raise NotImplementedError()
   
   @abc.abstractmethod
   def camera_info(self) -> CameraInfo:
     raise NotImplementedError()
   
+  def reserve_buffers(self, count:int):
+    """ Allocate at least count buffers on start(), for buffers held after delivery (e.g. leased).
+        Backends with a configured buffer count (see CameraInfo.buffer_count) ignore this """
+    pass
 
 
 
@@ -114,6 +152,16 @@ class Camera(Dispatcher, metaclass=abc.ABCMeta):
   def stop(self):
     raise NotImplementedError()
 
+  @abc.abstractmethod
+  def pause(self):
+    """ Stop acquiring (and delivering) frames, but keep the stream and buffers allocated """
+    raise NotImplementedError()
+
+  @abc.abstractmethod
+  def resume(self):
+    """ Resume acquisition after pause() """
+    raise NotImplementedError()
+
   @abc.abstractmethod
   def release(self):
     raise NotImplementedError()
@@ -132,7 +180,9 @@ class Manager(metaclass=abc.ABCMeta):
     raise NotImplementedError()
 
   @abc.abstractmethod
-  def wait_for_cameras(self, camera_set:Set[str]) -> Dict[str, Camera]:
+  def wait_for_cameras(self, cameras:Dict[str, str], timeout_sec:float=30.0) -> Dict[str, Camera]:
+    """ Wait for cameras (name: serial) to be available and open them, 
+        raises DiscoveryTimeout if any are not found within timeout_sec """
     raise NotImplementedError()
 
   @abc.abstractmethod
@@ -149,6 +199,7 @@ class BackendType(Enum):
 
   ids_peak = "ids_peak"
   spinnaker = "spinnaker"
+  simulated = "simulated"
 
   def create(self, presets:Dict[SettingList], logger:logging.Logger) -> Manager:
     match self:
@@ -166,3 +217,7 @@ class BackendType(Enum):
 
         from camera_driver.driver import spinnaker
         return spinnaker.Manager(presets, logger)
+
+      case BackendType.simulated:
+        from camera_driver.driver import simulated
+        return simulated.Manager(presets, logger)
@@ -14,6 +14,7 @@ import numpy as np
 
 class Buffer(interface.Buffer):
   def __init__(self, camera_name:str, buffer:ids_peak.Buffer):
+    super().__init__()
     assert not buffer.IsIncomplete()
 
     self._camera_name = camera_name
@@ -37,12 +38,16 @@ class Buffer(interface.Buffer):
   def timestamp_sec(self) -> float:
     return float(self._buffer.Timestamp_ns()) / 1e9
 
+  @property
+  def frame_id(self) -> int:
+    return int(self._buffer.FrameID())
+
   @property
   def encoding(self) -> ImageEncoding:
     format = ids_peak_ipl.PixelFormat(self._buffer.PixelFormat())
     return camera_encodings[format.Name()]
 
   
-  def release(self):
+  def _release(self):
     self._buffer.ParentDataStream().QueueBuffer(self._buffer)
     del self._buffer
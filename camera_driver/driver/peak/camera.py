@@ -3,7 +3,7 @@ from logging import Logger
 import logging
 from threading import Thread
 from types import SimpleNamespace
-from typing import Dict, List
+from typing import Dict, List, Set
 from beartype import beartype
 from beartype.typing import  Callable, Optional, Tuple
 from camera_driver.data.util import dict_item
@@ -11,6 +11,7 @@ from ids_peak import ids_peak
 
 
 from camera_driver.driver import interface
+from camera_driver.driver.settings import Snapshot, apply_presets, diff_settings, setting_names
 from camera_driver.data.encoding import ImageEncoding, camera_encodings
 
 from .buffer import Buffer
@@ -23,38 +24,65 @@ class Camera(interface.Camera):
   def __init__(self, name:str, device:ids_peak.Device, presets:interface.Presets, logger:Logger):
     self.device = device
 
-    self.nodemap = device.RemoteDevice().NodeMaps()[0]
+    self.nodemap = helpers.NodeCache(device.RemoteDevice().NodeMaps()[0])
     self.data_stream = None
 
     self.logger = logger
 
     self.capture_thread:Optional[Thread] = None
     self.started = False
+    self.paused = False
 
     self.name = name
     self.presets = presets
 
+    # configuration applied by setup_mode and update_properties
+    self.snapshot = Snapshot(presets=[])
+
     self.stream_timeout = 1000
+    self.min_buffers = 0
 
 
-  def compute_clock_offset(self, get_time_sec:Callable[[], float]):
+  def compute_clock_offset(self, get_time_sec:Callable[[], float], 
+                           tolerance_sec:float=1e-5, max_samples:int=50) -> interface.ClockOffset:
     raise NotImplementedError()
   
   @beartype
   def setup_mode(self, mode:str="slave"):
     self.log(logging.INFO, f"Loading camera configuration ({mode})...")
+    self._open_stream()
     
-    helpers.set_value(self.nodemap, "UserSetSelector", "Default")
-    helpers.execute_wait(self.nodemap, "UserSetLoad")
+    requested = self.presets['device'] + self.presets[mode]
+    self.snapshot, diff = apply_presets(self.serial, requested, 
+      load_defaults=self._load_defaults,
+      read_values=lambda names: helpers.try_get_values(self.nodemap, names),
+      write_settings=lambda diff: self._set_settings(self.nodemap, diff))
 
-    # print(self.camera_info())
+    self.log(logging.DEBUG, f"Set {len(diff)} of {len(requested)} settings")
 
-    self._set_settings(self.nodemap, self.presets['device'])
-    self._set_settings(self.nodemap, self.presets[mode])
+  def _open_stream(self):
+    """ Open the data stream (if not already open) and apply the stream presets, 
+        buffers are announced by start() """
+    if self.data_stream is not None:
+      return
 
-  
-  def _set_settings(self, nodemap, config:Dict[str, Dict]):
+    self.data_stream = self.device.DataStreams()[0].OpenDataStream()
+    stream_nodemap = self.data_stream.NodeMaps()[0]
+    stream = self.presets['stream']
+    self._set_settings(stream_nodemap, diff_settings(
+      helpers.try_get_values(stream_nodemap, setting_names(stream)), stream))
+
+  def reserve_buffers(self, count:int):
+    self.min_buffers = count
+
+  def _load_defaults(self):
+    helpers.set_value(self.nodemap, "UserSetSelector", "Default")
+    helpers.execute_wait(self.nodemap, "UserSetLoad")
 
+  
+  def _set_settings(self, nodemap, config:interface.SettingList) -> Set[str]:
+    """ Set each setting in order, returns the names of those which failed """
+    failed = set()
     for setting in config:
         setting_name, value = dict_item(setting)
         self.log(logging.DEBUG, f"Setting {setting_name} to {value}")
@@ -63,15 +91,17 @@ class Camera(interface.Camera):
           helpers.set_value(nodemap, setting_name, value)
         except helpers.NodeException as e:
           self.log(logging.WARNING, f"Failed to set {setting_name} to {value}: {e}")
+          failed.add(setting_name)
+    return failed
 
   def update_properties(self, settings: interface.CameraProperties):
+    values = {}
     if helpers.is_writable(self.nodemap, "AcquisitionFrameRate"):
-      helpers.set_value(self.nodemap, "AcquisitionFrameRate", settings.framerate)
-
+      values["AcquisitionFrameRate"] = settings.framerate
 
-
-    helpers.set_value(self.nodemap, "Gain", max(1.0, settings.gain))
-    helpers.set_value(self.nodemap, "ExposureTime", int(settings.exposure))
+    values["Gain"] = max(1.0, settings.gain)
+    values["ExposureTime"] = int(settings.exposure)
+    self.snapshot.set_changed(values, lambda changed: helpers.set_values(self.nodemap, changed))
 
   def camera_info(self) -> interface.CameraInfo:
     return interface.CameraInfo(
@@ -81,21 +111,30 @@ class Camera(interface.Camera):
       encoding=self.encoding,
       model=self.model,
       throughput_mb=self.throughput_mb,
-      has_latching=False
+      has_latching=False,
+      buffer_count=self.buffer_count
     )
 
   @property
   def model(self) -> str:
     return self.node_value("DeviceModelName")
+  
+  @property
+  def buffer_count(self) -> Optional[int]:
+    """ Buffers announced (once started), or to be announced by start() """
+    if self.data_stream is None:
+      return None
+    
+    announced = len(self.data_stream.AnnouncedBuffers())
+    if announced > 0:
+      return announced
+    return max(self.data_stream.NumBuffersAnnouncedMinRequired(), self.min_buffers)
 
 
   @property
   def throughput_mb(self) -> Tuple[float, float]:
-    t = self.node_value("DeviceLinkCurrentThroughput")
-    t_max = self.node_value("DeviceLinkThroughputLimit")
-    
-
-    return (t / 1e6, t_max / 1e6)
+    values = helpers.get_values(self.nodemap, ["DeviceLinkCurrentThroughput", "DeviceLinkThroughputLimit"])
+    return (values["DeviceLinkCurrentThroughput"] / 1e6, values["DeviceLinkThroughputLimit"] / 1e6)
   
 
   def node_value(self, name:str):
@@ -104,9 +143,8 @@ class Camera(interface.Camera):
 
   @property
   def image_size(self) -> Tuple[int, int]:
-    w = self.node_value("Width")
-    h = self.node_value("Height")
-    return w, h
+    values = helpers.get_values(self.nodemap, ["Width", "Height"])
+    return values["Width"], values["Height"]
 
   
   @property
@@ -125,10 +163,8 @@ class Camera(interface.Camera):
 
 
   def _setup_buffers(self):
-    self.nodemap.FindNode("PayloadSize").Value()
-
     payload_size = self.nodemap.FindNode("PayloadSize").Value()
-    buffer_count = self.data_stream.NumBuffersAnnouncedMinRequired()
+    buffer_count = self.buffer_count
 
     self.log(logging.DEBUG, f"Allocating {buffer_count} buffers of size {payload_size/1e6:.1f}MB")
 
@@ -155,6 +191,11 @@ class Camera(interface.Camera):
           self.log(logging.WARNING, "Recieved incomplete buffer")
           raw_buffer.ParentDataStream().QueueBuffer(raw_buffer)
           continue  
+
+        if self.paused:
+          # frames still in flight when paused are not delivered
+          raw_buffer.ParentDataStream().QueueBuffer(raw_buffer)
+          continue
               
         buffer = Buffer(self.name, raw_buffer)
         self.emit("on_buffer", buffer)
@@ -172,10 +213,7 @@ class Camera(interface.Camera):
   def start(self):
     self.log(logging.INFO, "Starting camera capture...")
 
-    self.data_stream = self.device.DataStreams()[0].OpenDataStream()
-    stream_nodemap = self.data_stream.NodeMaps()[0]
-    self._set_settings(stream_nodemap, self.presets['stream'])
-
+    self._open_stream()
     self._setup_buffers()
 
     self.capture_thread = Thread(target=self._capture_thread)
@@ -190,14 +228,35 @@ class Camera(interface.Camera):
     self.emit("on_started", True)
     self.capture_thread.start()
 
+  def pause(self):
+    assert self.started, f"Camera {self.name} is not started"
+    if self.paused:
+      return
+
+    # the data stream, buffers and capture thread stay as they are
+    self.paused = True
+    helpers.execute_wait(self.nodemap, "AcquisitionStop")
+    self.log(logging.DEBUG, "paused.")
+
+  def resume(self):
+    assert self.started, f"Camera {self.name} is not started"
+    if not self.paused:
+      return
+
+    helpers.execute_wait(self.nodemap, "AcquisitionStart")
+    self.paused = False
+    self.log(logging.DEBUG, "resumed.")
+
   def stop(self):
     self.logger.info(f"{self.name}:Stopping camera capture...")
 
     self.data_stream.StopAcquisition()
-    helpers.execute_wait(self.nodemap, "AcquisitionStop")
+    if not self.paused:
+      helpers.execute_wait(self.nodemap, "AcquisitionStop")
     self.nodemap.FindNode("TLParamsLocked").SetValue(0)
 
     self.started = False
+    self.paused = False
 
     self.log(logging.DEBUG, f"Waiting for capture thread {self.capture_thread}...")
     self.data_stream.KillWait()
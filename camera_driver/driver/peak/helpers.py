@@ -1,9 +1,30 @@
+from beartype.typing import Any, Dict, List
 from ids_peak import ids_peak
 
 class NodeException(Exception):
   def __init__(self, msg):
     super(NodeException, self).__init__(msg)
 
+
+# commands after which cached node handles are discarded
+invalidating_commands = {"UserSetLoad", "DeviceReset"}
+
+class NodeCache:
+  """ Wraps a NodeMap, caching FindNode so repeated reads and writes skip the lookup.
+      Used in place of the NodeMap by the helpers, cleared after UserSetLoad or a reset. """
+  def __init__(self, nodemap:ids_peak.NodeMap):
+    self.nodemap = nodemap
+    self.nodes = {}
+
+  def FindNode(self, node_name:str):
+    if node_name not in self.nodes:
+      self.nodes[node_name] = self.nodemap.FindNode(node_name)
+    return self.nodes[node_name]
+
+  def clear(self):
+    self.nodes = {}
+
+
 def find_node(nodemap:ids_peak.NodeMap, node_name:str):
   node = nodemap.FindNode(node_name)
   if node is None:
@@ -59,8 +80,42 @@ def set_value(nodemap:ids_peak.NodeMap, node_name:str, value):
     node.SetValue(value)
 
 
+def get_values(nodemap:ids_peak.NodeMap, node_names:List[str]) -> Dict[str, Any]:
+  return {node_name:node_value(nodemap, node_name) for node_name in node_names}
+
+def try_get_values(nodemap:ids_peak.NodeMap, node_names:List[str]) -> Dict[str, Any]:
+  """ Values of the readable nodes in node_names (others are left out), enumerations
+      by symbolic name as used by set_value """
+  values = {}
+  for node_name in node_names:
+    try:
+      node = get_readable(nodemap, node_name)
+      if node.Type() == ids_peak.NodeType_Enumeration:
+        values[node_name] = node.CurrentEntry().SymbolicValue()
+      else:
+        values[node_name] = node.Value()
+    except (NodeException, ids_peak.Exception):
+      pass
+  return values
+
+def set_values(nodemap:ids_peak.NodeMap, values:Dict[str, Any]):
+  """ Set nodes in order, raising a NodeException for every node which failed (after trying all) """
+  errors = []
+  for node_name, value in values.items():
+    try:
+      set_value(nodemap, node_name, value)
+    except NodeException as e:
+      errors.append(str(e))
+
+  if len(errors) > 0:
+    raise NodeException("; ".join(errors))
+
+
 def execute_wait(nodemap:ids_peak.NodeMap, node_name:str):
     node = find_node(nodemap, node_name)
 
     node.Execute()
-    node.WaitUntilDone()
\ No newline at end of file
+    node.WaitUntilDone()
+
+    if node_name in invalidating_commands and isinstance(nodemap, NodeCache):
+      nodemap.clear()
\ No newline at end of file
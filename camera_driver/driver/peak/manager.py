@@ -1,13 +1,14 @@
 
 from logging import Logger
-from multiprocessing.pool import ThreadPool
+from camera_driver.concurrent.parallel import parallel_map
 from typing import Dict, Optional
 from beartype import beartype
 from beartype.typing import Set
 
 from ids_peak import ids_peak
 from .camera import Camera
-from camera_driver.driver import interface
+from camera_driver.driver import interface, settings
+from camera_driver.driver.discovery import DeviceRegistry
 
 
 
@@ -18,22 +19,37 @@ class Manager(interface.Manager):
       self.presets = presets
 
       ids_peak.Library.Initialize()
-      self.devices:Dict[str, ids_peak.DeviceDescriptor] = {}
+      self.devices:DeviceRegistry[ids_peak.DeviceDescriptor] = DeviceRegistry(logger)
 
       # Initialize Harvester
       self.device_manager = ids_peak.DeviceManager.Instance()
 
+      # device keys of found devices, lost devices are only identified by key
+      self.device_keys:Dict[str, str] = {}
+
       self.found = DeviceFoundCallback(self)
+      self.lost = DeviceLostCallback(self)
       self.device_manager.RegisterDeviceFoundCallback(self.found)
+      self.device_manager.RegisterDeviceLostCallback(self.lost)
       self.device_manager.Update()      
 
 
+    def _device_found(self, device:ids_peak.DeviceDescriptor):
+      self.device_keys[device.Key()] = device.SerialNumber()
+      self.devices.added(device.SerialNumber(), device)
+
+    def _device_lost(self, key:str):
+      serial = self.device_keys.pop(key, None)
+      if serial is not None:
+        self.devices.removed(serial)
+
+
     def _open_device(self, serial:str):
       device = self.devices[serial]
       return device.OpenDevice(ids_peak.DeviceAccessType_Control)
 
     def camera_serials(self) -> Set[str]:
-      return set(self.devices.keys())
+      return self.devices.serials()
 
     @beartype
     def reset_cameras(self, camera_set:Optional[Set[str]]=None):
@@ -43,6 +59,7 @@ class Manager(interface.Manager):
 
       assert camera_set <= self.camera_serials(), f"reset_cameras: camera(s) not found {camera_set - self.camera_serials()}"      
       devices = {serial:self.devices[serial] for serial in camera_set}
+      self.devices.discard(camera_set)
 
       def reset_camera(desc:ids_peak.DeviceDescriptor):
         serial = desc.SerialNumber()
@@ -55,35 +72,33 @@ class Manager(interface.Manager):
         node.Execute()
         node.WaitUntilDone()
 
-      # with ThreadPool(len(camera_set)) as pool:
-      #   pool.map(reset_camera, devices.values(), chunksize=1)
-      for k, v in devices.items():
-        reset_camera(v)
-        del self.devices[k]
+      parallel_map("reset", reset_camera, devices, self.logger)
+      settings.applied.invalidate(set(devices.keys()))
 
       self.device_manager.Update()
 
 
 
     def init_camera(self, name:str, serial:str) -> Camera:
-      assert serial in self.devices, f"Camera {serial} not found"
-
-      desc = self.devices[serial]
-      return Camera(name, desc.OpenDevice(ids_peak.DeviceAccessType_Control), self.presets, logger=self.logger)
+      return Camera(name, self._open_device(serial), self.presets, logger=self.logger)
 
 
-    def wait_for_cameras(self, cameras:Dict[str, str]) -> interface.Dict[str, interface.Camera]:
+    def wait_for_cameras(self, cameras:Dict[str, str], timeout_sec:float=30.0) -> interface.Dict[str, interface.Camera]:
       by_serial = {serial:k for k, serial in cameras.items()}
       self.logger.info(f"Waiting for cameras {by_serial}")
 
-      while len(missing:=set(cameras.values()) - set(self.devices.keys())) > 0:
-        self.logger.debug(f"Waiting for cameras {sorted(missing)}")
-        self.device_manager.Update()
+      # device callbacks are run from Update()
+      self.devices.wait_for(set(by_serial.keys()), timeout_sec=timeout_sec, poll=self.device_manager.Update)
 
-      return {name:self.init_camera(name, serial) for name, serial in cameras.items()}
+      return parallel_map("open", lambda item: self.init_camera(*item), 
+                          {name:(name, serial) for name, serial in cameras.items()}, self.logger)
 
 
     def release(self):
+       self.device_manager.UnregisterDeviceFoundCallback(self.found)
+       self.device_manager.UnregisterDeviceLostCallback(self.lost)
+       self.devices.clear()
+
        ids_peak.Library.Close()
 
 
@@ -93,4 +108,13 @@ class DeviceFoundCallback(ids_peak.DeviceManagerDeviceFoundCallbackBase):
     self.manager = manager
 
   def call(self, device:ids_peak.DeviceDescriptor):
-    self.manager.devices[device.SerialNumber()] = device
\ No newline at end of file
+    self.manager._device_found(device)
+
+
+class DeviceLostCallback(ids_peak.DeviceManagerDeviceLostCallbackBase):
+  def __init__(self, manager:'Manager'):
+    super(DeviceLostCallback, self).__init__()
+    self.manager = manager
+
+  def call(self, device_key:str):
+    self.manager._device_lost(device_key)
\ No newline at end of file
@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field
+import math
+from threading import Lock
+from beartype import beartype
+from beartype.typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from camera_driver.data.util import dict_item
+from camera_driver.driver.interface import SettingList
+
+
+def setting_names(settings:SettingList) -> List[str]:
+  return list(dict.fromkeys(dict_item(setting)[0] for setting in settings))
+
+
+def same_value(current:Any, requested:Any) -> bool:
+  """ Compare a node value read back from the camera with a requested (preset) value """
+  if current is None:
+    return False
+
+  if isinstance(current, bool) or isinstance(requested, bool):
+    if isinstance(requested, str):
+      requested = requested.lower() in ["true", "on", "1"]
+    if isinstance(current, str):
+      current = current.lower() in ["true", "on", "1"]
+    return bool(current) == bool(requested)
+
+  if isinstance(current, (int, float)) and isinstance(requested, (int, float)):
+    return math.isclose(current, requested, rel_tol=1e-6, abs_tol=1e-9)
+
+  return str(current) == str(requested)
+
+
+def diff_settings(current:Dict[str, Any], requested:SettingList) -> SettingList:
+  """ The settings in requested (in order) which differ from the current node values,
+      or couldn't be read. Nodes after a changed selector (e.g. LineSelector) refer to
+      a different selected feature than the one read, so are all included. """
+  current = dict(current)
+  diff = []
+
+  selector_changed = False
+  for setting in requested:
+    name, value = dict_item(setting)
+    if selector_changed or not same_value(current.get(name), value):
+      diff.append(setting)
+      current[name] = value
+
+      selector_changed = selector_changed or name.endswith("Selector")
+
+  return diff
+
+
+@beartype
+@dataclass
+class Snapshot:
+  """ Configuration applied to a camera """
+  presets: SettingList                                  # applied by setup_mode, in order
+  values: Dict[str, Any] = field(default_factory=dict)  # last known node values (presets and properties)
+
+  def update(self, settings:SettingList, failed:Optional[Set[str]]=None):
+    for setting in settings:
+      name, value = dict_item(setting)
+      if failed is not None and name in failed:
+        self.values.pop(name, None)
+      else:
+        self.values[name] = value
+
+  def set_changed(self, values:Dict[str, Any], set_values:Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """ Set only the values which differ from the snapshot, returns the values set """
+    changed = {name:value for name, value in values.items()
+               if not same_value(self.values.get(name), value)}
+    try:
+      set_values(changed)
+    except Exception:
+      # not known which of them were set
+      for name in changed:
+        self.values.pop(name, None)
+      raise
+
+    self.values.update(changed)
+    return changed
+
+
+class SnapshotCache:
+  """ Snapshot of the configuration applied to each camera (by serial). Cameras keep their
+      configuration between runs, so a camera configured with the same presets before
+      (and not reset since) only needs the settings which differ from its current values. """
+
+  def __init__(self):
+    self.snapshots:Dict[str, Snapshot] = {}
+    self.lock = Lock()
+
+  def get(self, serial:str) -> Optional[Snapshot]:
+    with self.lock:
+      return self.snapshots.get(serial)
+
+  def put(self, serial:str, snapshot:Snapshot):
+    with self.lock:
+      self.snapshots[serial] = snapshot
+
+  def invalidate(self, serials:Optional[Set[str]]=None):
+    with self.lock:
+      if serials is None:
+        self.snapshots = {}
+      else:
+        for serial in serials:
+          self.snapshots.pop(serial, None)
+
+
+# shared by every camera in the process (outlives the Manager, cameras are re-created each run)
+applied = SnapshotCache()
+
+
+def apply_presets(serial:str, requested:SettingList, load_defaults:Callable[[], None],
+                  read_values:Callable[[List[str]], Dict[str, Any]],
+                  write_settings:Callable[[SettingList], Set[str]]) -> Tuple[Snapshot, SettingList]:
+  """ Apply requested presets to a camera, writing only the settings which differ from
+      the values read back. Defaults are loaded first unless the camera was last configured
+      (in this process) with the same presets. Returns the new snapshot and the settings written. """
+  snapshot = applied.get(serial)
+  if snapshot is None or snapshot.presets != requested:
+    load_defaults()
+    snapshot = Snapshot(presets=list(requested))
+
+  current = read_values(setting_names(requested))
+  diff = diff_settings(current, requested)
+  failed = write_settings(diff)
+
+  snapshot.values.update(current)
+  snapshot.update(diff, failed)
+
+  applied.put(serial, snapshot)
+  return snapshot, diff
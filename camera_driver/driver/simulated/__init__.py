@@ -0,0 +1,5 @@
+from .manager import Manager
+from .buffer import Buffer
+from .camera  import Camera
+
+__all__ = ['Manager', 'Camera', 'Buffer']
@@ -0,0 +1,52 @@
+from beartype.typing import Callable, Optional, Tuple
+
+from camera_driver.data.encoding import ImageEncoding
+from camera_driver.driver import interface
+
+import numpy as np
+
+
+class Buffer(interface.Buffer):
+  def __init__(self, camera_name:str, data:np.ndarray, image_size:Tuple[int, int], 
+               encoding:ImageEncoding, timestamp_sec:float, on_release:Callable[[np.ndarray], None],
+               frame_id:Optional[int]=None):
+    super().__init__()
+    
+    self._camera_name = camera_name
+    self._data = data
+
+    self._image_size = image_size
+    self._encoding = encoding
+    self._timestamp_sec = timestamp_sec
+    self._frame_id = frame_id
+    
+    self._on_release = on_release
+
+  @property
+  def camera_name(self) -> str:
+    return self._camera_name
+
+  @property
+  def image_data(self) -> np.ndarray:
+    """ Note this data is invalidated when the image is released, so must be copied."""
+    return self._data
+
+  @property
+  def image_size(self) -> Tuple[int, int]:
+    return self._image_size
+  
+  @property
+  def timestamp_sec(self) -> float:
+    return self._timestamp_sec
+
+  @property
+  def frame_id(self) -> Optional[int]:
+    return self._frame_id
+
+  @property
+  def encoding(self) -> ImageEncoding:
+    return self._encoding
+  
+  def _release(self):
+    self._on_release(self._data)
+    del self._data
@@ -0,0 +1,297 @@
+from logging import Logger
+import logging
+import math
+from queue import Empty, Queue
+from threading import Event, Thread
+import time
+import zlib
+from beartype import beartype
+from beartype.typing import Callable, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from camera_driver.data.util import dict_item
+from camera_driver.driver import interface, settings
+from camera_driver.data.encoding import ImageEncoding, camera_encodings, packed_size
+from camera_driver.driver.clock_offset import estimate_offset
+from camera_driver.driver.settings import Snapshot, apply_presets, diff_settings, setting_names
+
+from .buffer import Buffer
+from . import helpers
+
+
+class SimulatedClock:
+  """ Camera clock with a fixed offset and linear drift relative to the host clock """
+  def __init__(self, offset_sec:float, drift:float):
+    self.offset_sec = offset_sec
+    self.drift = drift
+
+  def camera_time(self, host_time_sec:float) -> float:
+    return (host_time_sec - self.offset_sec) * (1.0 + self.drift)
+
+
+class Camera(interface.Camera):
+
+  @beartype
+  def __init__(self, name:str, serial:str, presets:interface.Presets, 
+               trigger_epoch:float, device_settings:interface.SettingList, logger:Logger):
+    self.serial = serial
+    self.name = name
+
+    self.presets = presets
+    self.device_settings = device_settings
+
+    self.trigger_epoch = trigger_epoch
+    self.logger = logger
+
+    self.nodemap = self._reset_nodes()
+    # unlike a real camera, the simulated one doesn't keep its configuration from a previous run
+    settings.applied.invalidate({serial})
+
+    # configuration applied by setup_mode and update_properties
+    self.snapshot = Snapshot(presets=[])
+
+    self.capture_thread:Optional[Thread] = None
+    self.stopping = Event()
+    self.paused = False
+
+    self.free_buffers:Optional[Queue] = None
+    self.dropped = 0
+    self.incomplete = 0
+
+
+  def _reset_nodes(self) -> helpers.NodeMap:
+    nodemap = helpers.default_nodes(self.serial)
+
+    # Camera clock starts counting at a (deterministic) random time in the last hour
+    rng = np.random.default_rng(zlib.crc32(self.serial.encode()))
+    nodemap['SimClockOffset'] = self.trigger_epoch - rng.uniform(0, 3600)
+
+    self._set_settings(nodemap, self.device_settings)
+    return nodemap
+  
+
+  @property
+  def clock(self) -> SimulatedClock:
+    return SimulatedClock(self.node_value("SimClockOffset"), self.node_value("SimClockDrift"))
+
+  def compute_clock_offset(self, get_time_sec:Callable[[], float], 
+                           tolerance_sec:float=1e-5, max_samples:int=50) -> interface.ClockOffset:
+    if not self.node_value("SimLatching"):
+      raise NotImplementedError()
+    
+    clock = self.clock
+    latency = self.node_value("SimLatchLatency")
+    rng = np.random.default_rng()
+
+    def sample():
+      t0 = get_time_sec()
+      if latency > 0:
+        time.sleep(rng.exponential(latency))
+      t1 = get_time_sec()
+
+      latched = t0 + rng.uniform(0, t1 - t0)
+      return (t0 + t1) / 2 - clock.camera_time(latched)
+
+    return estimate_offset(sample, tolerance_sec=tolerance_sec, max_samples=max_samples)
+  
+  @beartype
+  def setup_mode(self, mode:str="slave"):
+    self.log(logging.INFO, f"Loading camera configuration ({mode})...")
+    for k in ['device', mode]:
+        assert k in self.presets, f"presets missing {k}, options are {list(self.presets.keys())}"
+
+    def load_defaults():
+      self.nodemap = self._reset_nodes()
+
+    # Per-device settings take precedence over the shared presets
+    requested = self.presets['device'] + self.presets[mode] + self.device_settings
+    self.snapshot, diff = apply_presets(self.serial, requested, 
+      load_defaults=load_defaults,
+      read_values=lambda names: helpers.try_get_values(self.nodemap, names),
+      write_settings=lambda diff: self._set_settings(self.nodemap, diff))
+
+    self.log(logging.DEBUG, f"Set {len(diff)} of {len(requested)} settings")
+
+    # stream settings share the nodemap here, so are set after it is (possibly) reset,
+    # and before start() so camera_info() reports the buffer count which will be used
+    stream = self.presets.get('stream', [])
+    self._set_settings(self.nodemap, diff_settings(
+      helpers.try_get_values(self.nodemap, setting_names(stream)), stream))
+
+
+  def _set_settings(self, nodemap:helpers.NodeMap, config:interface.SettingList) -> Set[str]:
+    """ Set each setting in order, returns the names of those which failed """
+    failed = set()
+    for setting in config:
+        setting_name, value = dict_item(setting)
+        self.log(logging.DEBUG, f"Setting {setting_name} to {value}")
+
+        try:
+          helpers.set_value(nodemap, setting_name, value)
+        except helpers.NodeException as e:
+          self.log(logging.WARNING, f"Failed to set {setting_name} to {value}: {e}")
+          failed.add(setting_name)
+    return failed
+
+  def update_properties(self, settings: interface.CameraProperties):
+    values = dict(AcquisitionFrameRate=settings.framerate, Gain=settings.gain, ExposureTime=int(settings.exposure))
+    self.snapshot.set_changed(values, lambda changed: helpers.set_values(self.nodemap, changed))
+
+  def camera_info(self) -> interface.CameraInfo:
+    return interface.CameraInfo(
+      name=self.name,
+      serial=self.serial,
+      image_size=self.image_size,
+      encoding=self.encoding,
+      model=self.model,
+      throughput_mb=self.throughput_mb,
+      has_latching=self.node_value("SimLatching"),
+      buffer_count=self.node_value("StreamBufferCountManual")
+    )
+
+  def node_value(self, name:str):
+    return helpers.node_value(self.nodemap, name)
+
+  @property
+  def model(self) -> str:
+    return self.node_value("DeviceModelName")
+
+  @property
+  def image_size(self) -> Tuple[int, int]:
+    return self.node_value("Width"), self.node_value("Height")
+  
+  @property
+  def encoding(self) -> ImageEncoding:
+    pixel_format = self.node_value("PixelFormat")
+    if pixel_format not in camera_encodings:
+      raise ValueError(f"Unsupported pixel format {pixel_format}")
+    return camera_encodings[pixel_format]
+  
+  @property
+  def frame_bytes(self) -> int:
+    return packed_size(self.image_size, self.encoding)
+
+  @property
+  def throughput_mb(self) -> Tuple[float, float]:
+    t = self.frame_bytes * self.node_value("AcquisitionFrameRate")
+    t_max = self.node_value("DeviceLinkThroughputLimit")
+
+    return (t / 1e6, t_max / 1e6)
+
+  def __repr__(self):
+    w, h = self.image_size
+    return f"simulated.Camera({self.name}:{self.serial} {w}x{h} {self.encoding})"
+  
+
+  def log(self, level:int, message:str):
+    self.logger.log(level, f"{self.name}:{message}")
+
+
+  def _setup_buffers(self, rng:np.random.Generator):
+    buffer_count = self.node_value("StreamBufferCountManual")
+    self.log(logging.DEBUG, f"Allocating {buffer_count} buffers of size {self.frame_bytes/1e6:.1f}MB")
+
+    # Random bytes are a valid image in every packed encoding
+    frame = rng.integers(0, 256, size=self.frame_bytes, dtype=np.uint8)
+
+    self.free_buffers = Queue()
+    for _ in range(buffer_count):
+      self.free_buffers.put(frame.copy())
+
+
+  def _capture_thread(self, rng:np.random.Generator):
+    clock = self.clock
+    image_size, encoding = self.image_size, self.encoding
+
+    period = 1.0 / self.node_value("AcquisitionFrameRate")
+    latency = self.node_value("SimCallbackLatency")
+    jitter = self.node_value("SimClockJitter")
+    incomplete_rate = self.node_value("SimIncompleteRate")
+
+    # Frames are triggered on a grid shared by all cameras from the same manager
+    frame = math.ceil((time.time() - self.trigger_epoch) / period)
+    # camera frame counter starts at zero and counts every exposure, including lost frames
+    exposures = 0
+
+    while True:
+      trigger_time = self.trigger_epoch + frame * period
+      if self.stopping.wait(max(0.0, trigger_time + latency - time.time())):
+        break
+
+      frame += 1
+      if self.paused:
+        continue    # acquisition stopped, triggers are ignored
+
+      frame_id = exposures
+      exposures += 1
+      if incomplete_rate > 0 and rng.random() < incomplete_rate:
+        self.incomplete += 1
+        self.log(logging.WARNING, "Recieved incomplete buffer")
+        continue
+
+      try:
+        data = self.free_buffers.get_nowait()
+      except Empty:
+        self.dropped += 1
+        self.log(logging.DEBUG, f"No free buffers, dropped frame ({self.dropped} total)")
+        continue
+
+      timestamp = clock.camera_time(trigger_time) + (rng.normal(0, jitter) if jitter > 0 else 0.0)
+      buffer = Buffer(self.name, data, image_size, encoding, timestamp, on_release=self.free_buffers.put,
+                      frame_id=frame_id)
+      self.emit("on_buffer", buffer)
+
+      # Triggers missed while the callback was blocked are lost, as with a real camera
+      missed = math.floor((time.time() - latency - self.trigger_epoch) / period) - frame
+      if missed > 0:
+        self.dropped += missed
+        frame += missed
+        exposures += missed
+
+
+  @property
+  def started(self):
+    return self.capture_thread is not None
+
+  def start(self):
+    assert not self.started, f"Camera {self.name} is already started"
+    self.log(logging.INFO, "Starting camera capture...")
+
+    rng = np.random.default_rng([self.node_value("SimSeed"), zlib.crc32(self.serial.encode())])
+    self._setup_buffers(rng)
+
+    self.stopping.clear()
+    self.capture_thread = Thread(target=self._capture_thread, args=(rng,), name=f"{self.name}_capture")
+
+    self.log(logging.DEBUG, "started.")
+    self.emit("on_started", True)
+    self.capture_thread.start()
+
+  def pause(self):
+    assert self.started, f"Camera {self.name} is not started"
+    self.paused = True
+    self.log(logging.DEBUG, "paused.")
+
+  def resume(self):
+    assert self.started, f"Camera {self.name} is not started"
+    self.paused = False
+    self.log(logging.DEBUG, "resumed.")
+
+  def stop(self):
+    assert self.started, f"Camera {self.name} is not started"
+    self.logger.info(f"{self.name}:Stopping camera capture...")
+
+    self.stopping.set()
+    self.capture_thread.join()
+    self.capture_thread = None
+    self.paused = False
+
+    self.free_buffers = None
+    
+    self.log(logging.DEBUG, f"stopped, dropped {self.dropped}, incomplete {self.incomplete}.")
+    self.emit("on_started", False)
+
+  def release(self):
+    if self.started:
+      self.stop()
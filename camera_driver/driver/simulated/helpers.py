@@ -0,0 +1,99 @@
+from beartype.typing import Any, Dict, List
+
+
+class NodeException(Exception):
+  def __init__(self, msg):
+    super(NodeException, self).__init__(msg)
+
+
+NodeMap = Dict[str, Any]
+
+
+def default_nodes(serial:str) -> NodeMap:
+  """ Node values for a freshly reset simulated camera, names follow the GenICam SFNC
+      where a matching node exists. Simulation parameters use the Sim prefix. """
+  return dict(
+    DeviceModelName="Simulated",
+    DeviceSerialNumber=serial,
+
+    Width=2048,
+    Height=1536,
+    PixelFormat="BayerRG12p",
+
+    AcquisitionFrameRate=10.0,
+    AcquisitionFrameRateEnable=True,
+    ExposureTime=2000,
+    Gain=1.0,
+
+    TriggerMode="Off",
+    TriggerSource="Software",
+
+    DeviceLinkThroughputLimit=125e6,
+    StreamBufferCountManual=4,
+
+    # Simulated clock: camera_time = (host_time - SimClockOffset) * (1 + SimClockDrift) + N(0, SimClockJitter)
+    SimClockOffset=0.0,
+    SimClockDrift=0.0,
+    SimClockJitter=0.0,
+
+    # Fraction of frames delivered incomplete, and delay between exposure and the SDK callback
+    SimIncompleteRate=0.0,
+    SimCallbackLatency=0.0,
+
+    # Clock latching, with a random round trip (mean SimLatchLatency) per latch as over a real link
+    SimLatching=True,
+    SimLatchLatency=0.0,
+    SimSeed=0,
+  )
+
+
+def find_node(nodemap:NodeMap, node_name:str):
+  if node_name not in nodemap:
+    raise NodeException(f"Node {node_name} not found")
+  return nodemap[node_name]
+
+
+def node_value(nodemap:NodeMap, node_name:str):
+  return find_node(nodemap, node_name)
+
+
+def is_writable(nodemap:NodeMap, node_name:str):
+  return node_name in nodemap and node_name not in read_only
+
+
+def set_value(nodemap:NodeMap, node_name:str, value:Any):
+  current = find_node(nodemap, node_name)
+  if node_name in read_only:
+    raise NodeException(f"Node {node_name} is ReadOnly")
+
+  if isinstance(current, bool) and isinstance(value, str):
+    value = value.lower() in ["true", "on", "1"]
+
+  try:
+    nodemap[node_name] = type(current)(value)
+  except ValueError as e:
+    raise NodeException(f"Invalid value {value} for node {node_name}: {e}")
+
+
+def get_values(nodemap:NodeMap, node_names:List[str]) -> Dict[str, Any]:
+  return {node_name:node_value(nodemap, node_name) for node_name in node_names}
+
+
+def try_get_values(nodemap:NodeMap, node_names:List[str]) -> Dict[str, Any]:
+  return {node_name:nodemap[node_name] for node_name in node_names if node_name in nodemap}
+
+
+def set_values(nodemap:NodeMap, values:Dict[str, Any]):
+  """ Set nodes in order, raising a NodeException for every node which failed (after trying all) """
+  errors = []
+  for node_name, value in values.items():
+    try:
+      set_value(nodemap, node_name, value)
+    except NodeException as e:
+      errors.append(str(e))
+
+  if len(errors) > 0:
+    raise NodeException("; ".join(errors))
+
+
+read_only = {"DeviceModelName", "DeviceSerialNumber", "DeviceLinkThroughputLimit"}
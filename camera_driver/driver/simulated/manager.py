@@ -0,0 +1,45 @@
+from logging import Logger
+import time
+from beartype.typing import Dict, Set
+
+from camera_driver.data.util import dict_item
+from camera_driver.driver import interface, settings
+from .camera import Camera
+
+
+class Manager(interface.Manager):
+    """ Simulated cameras, declared in the `devices` preset as a list of serial: settings pairs, e.g.
+        
+        devices:
+          - sim1: [SimClockDrift: 1e-5, SimIncompleteRate: 0.01]
+          - sim2: []
+    """
+    def __init__(self, presets:Dict[str, interface.SettingList], logger:Logger):
+      self.logger = logger
+      self.presets = presets
+
+      self.devices:Dict[str, interface.SettingList] = {}
+      for device in presets.get('devices', []):
+        serial, settings = dict_item(device)
+        self.devices[str(serial)] = list(settings or [])
+
+      self.trigger_epoch = time.time()
+
+
+    def camera_serials(self) -> Set[str]:
+      return set(self.devices.keys())
+
+    def reset_cameras(self, camera_set:Set[str]):
+      assert camera_set <= self.camera_serials(), f"reset_cameras: camera(s) not found {camera_set - self.camera_serials()}"      
+      self.logger.info(f"Resetting {len(camera_set)} cameras...")
+      settings.applied.invalidate(camera_set)
+
+    def init_camera(self, name:str, serial:str) -> Camera:
+      assert serial in self.devices, f"Camera {serial} not found"
+      return Camera(name, serial, self.presets, self.trigger_epoch, self.devices[serial], logger=self.logger)
+
+    def wait_for_cameras(self, cameras:Dict[str, str], timeout_sec:float=30.0) -> Dict[str, interface.Camera]:
+      return {name:self.init_camera(name, serial) for name, serial in cameras.items()}
+
+    def release(self):
+      self.devices = {}
@@ -24,6 +24,7 @@ pyspin_encoding = {
 
 class Buffer(interface.Buffer):
   def __init__(self, camera_name:str, image:PySpin.Image):
+    super().__init__()
     assert not image.IsIncomplete()
 
     self._camera_name = camera_name
@@ -47,6 +48,10 @@ class Buffer(interface.Buffer):
   def timestamp_sec(self):
     return float(self._image.GetTimeStamp()) / 1e9
 
+  @property
+  def frame_id(self) -> int:
+    return int(self._image.GetFrameID())
+
   @property
   def encoding(self):
     pixel_format = self._image.GetPixelFormat()
@@ -56,6 +61,6 @@ class Buffer(interface.Buffer):
     return pyspin_encoding[pixel_format]
 
 
-  def release(self):
+  def _release(self):
     self._image.Release()
     del self._image
@@ -3,7 +3,7 @@ from logging import Logger
 import logging
 import traceback
 from typing import Tuple
-from beartype.typing import  Callable, Dict, List
+from beartype.typing import  Callable, Dict, List, Set
 import PySpin
 
 from beartype import beartype
@@ -14,6 +14,7 @@ from camera_driver.data.encoding import ImageEncoding, camera_encodings
 from .buffer import Buffer
 
 from camera_driver.driver import interface
+from camera_driver.driver.settings import Snapshot, apply_presets, diff_settings, setting_names
 
 from . import helpers
 
@@ -37,15 +38,25 @@ class Camera(interface.Camera):
     if not helpers.validate_init(camera):
       raise RuntimeError(f"Failed to initialize camera {name}")
 
+    # resolved node handles, reused across reads and writes
+    self.nodes = helpers.NodeCache(camera.GetNodeMap())
+    self.stream_nodes = helpers.NodeCache(camera.GetTLStreamNodeMap())
+
     self.logger = logger
     self.name = name
 
     self.handler = None
+    self.paused = False
     self.presets = presets
 
+    # configuration applied by setup_mode and update_properties
+    self.snapshot = Snapshot(presets=[])
+
 
-  def compute_clock_offset(self, get_time_sec:Callable[[], float]):
-    return helpers.camera_time_offset(self.camera, get_time_sec)
+  def compute_clock_offset(self, get_time_sec:Callable[[], float], 
+                           tolerance_sec:float=1e-5, max_samples:int=50) -> interface.ClockOffset:
+    return helpers.camera_time_offset(self.camera, get_time_sec, 
+                                      tolerance_sec=tolerance_sec, max_samples=max_samples)
 
 
   def camera_info(self) -> interface.CameraInfo:
@@ -57,12 +68,14 @@ class Camera(interface.Camera):
       model=self.model,
       throughput_mb=self.throughput_mb,
 
-      has_latching=True
+      has_latching=True,
+      buffer_count=helpers.try_get_value(self.stream_nodemap, "StreamBufferCountResult")
     )
 
   @property
   def image_size(self):
-    return helpers.get_image_size(self.camera)
+    values = helpers.get_values(self.nodemap, ["Width", "Height"])
+    return (values["Width"], values["Height"])
   
   @property
   def encoding(self) -> ImageEncoding:
@@ -74,10 +87,8 @@ class Camera(interface.Camera):
   
   @property
   def throughput_mb(self) -> Tuple[float, float]:
-    t = helpers.get_value(self.nodemap, "DeviceLinkCurrentThroughput")
-    t_max = helpers.get_value(self.nodemap, "DeviceLinkThroughputLimit")
-
-    return (t / 1e6, t_max / 1e6)
+    values = helpers.get_values(self.nodemap, ["DeviceLinkCurrentThroughput", "DeviceLinkThroughputLimit"])
+    return (values["DeviceLinkCurrentThroughput"] / 1e6, values["DeviceLinkThroughputLimit"] / 1e6)
   
   @property
   def model(self) -> str:
@@ -94,12 +105,12 @@ class Camera(interface.Camera):
 
 
   @property 
-  def nodemap(self):
-    return self.camera.GetNodeMap()
+  def nodemap(self) -> helpers.NodeCache:
+    return self.nodes
   
   @property
-  def stream_nodemap(self):
-    return self.camera.GetTLStreamNodeMap()
+  def stream_nodemap(self) -> helpers.NodeCache:
+    return self.stream_nodes
 
   @beartype
   def setup_mode(self, mode:str="slave"):
@@ -107,15 +118,23 @@ class Camera(interface.Camera):
     for k in ['stream', 'device', mode]:
         assert k in self.presets, f"presets missing {k}, options are {list(self.presets.keys())}"
 
-    helpers.load_defaults(self.camera)
+    stream = self.presets['stream']
+    self._set_settings(self.stream_nodemap, diff_settings(
+      helpers.try_get_values(self.stream_nodemap, setting_names(stream)), stream))
 
-    self._set_settings(self.stream_nodemap, self.presets['stream'])
-    self._set_settings(self.nodemap, self.presets['device'])
-    self._set_settings(self.nodemap, self.presets[mode])
+    requested = self.presets['device'] + self.presets[mode]
+    self.snapshot, diff = apply_presets(self.serial, requested, 
+      load_defaults=lambda: helpers.load_defaults(self.nodemap),
+      read_values=lambda names: helpers.try_get_values(self.nodemap, names),
+      write_settings=lambda diff: self._set_settings(self.nodemap, diff))
+    
+    self.log(logging.DEBUG, f"Set {len(diff)} of {len(requested)} settings")
 
 
 
-  def _set_settings(self, nodemap, config:Dict[str, Dict]):
+  def _set_settings(self, nodemap, config:interface.SettingList) -> Set[str]:
+    """ Set each setting in order, returns the names of those which failed """
+    failed = set()
     for setting in config:
         setting_name, value = dict_item(setting)
         self.log(logging.DEBUG, f"Setting {setting_name} to {value}")
@@ -124,6 +143,8 @@ class Camera(interface.Camera):
           helpers.set_value(nodemap, setting_name, value)
         except helpers.NodeException as e:
           self.log(logging.WARNING, f"Failed to set {setting_name} to {value}: {e}")
+          failed.add(setting_name)
+    return failed
 
 
   def log(self, level:int, message:str):
@@ -134,6 +155,10 @@ class Camera(interface.Camera):
       self.log(logging.WARNING, "Recieved incomplete buffer")
       image.Release()
 
+    elif self.paused:
+      # frames still in flight when paused are not delivered
+      image.Release()
+
     else:
       try:
         self.emit("on_buffer", Buffer(self.name, image))
@@ -142,12 +167,13 @@ class Camera(interface.Camera):
 
 
   def update_properties(self, settings:interface.CameraProperties):
-    
+    values = {}
     if helpers.is_writable(self.nodemap, "AcquisitionFrameRate"):
-      helpers.set_float(self.nodemap, "AcquisitionFrameRate", settings.framerate)
+      values["AcquisitionFrameRate"] = float(settings.framerate)
 
-    helpers.set_float(self.nodemap, "Gain", settings.gain)
-    helpers.set_int(self.nodemap, "ExposureTime", int(settings.exposure))
+    values["Gain"] = float(settings.gain)
+    values["ExposureTime"] = int(settings.exposure)
+    self.snapshot.set_changed(values, lambda changed: helpers.set_values(self.nodemap, changed))
 
 
 
@@ -170,6 +196,32 @@ class Camera(interface.Camera):
 
     self.emit("on_started", True)
 
+  def _execute_acquisition(self, node_name:str):
+    try:
+      helpers.execute(self.nodemap, node_name)
+    except (helpers.NodeException, PySpin.SpinnakerException) as e:
+      # frames are still not delivered while paused, but the camera keeps acquiring
+      self.log(logging.WARNING, f"{node_name} failed, pausing delivery only: {e}")
+
+  def pause(self):
+    assert self.started, f"Camera {self.name} is not started"
+    if self.paused:
+      return
+
+    # the event handler stays registered, and the stream (and its buffers) open
+    self.paused = True
+    self._execute_acquisition("AcquisitionStop")
+    self.log(logging.DEBUG, "paused.")
+
+  def resume(self):
+    assert self.started, f"Camera {self.name} is not started"
+    if not self.paused:
+      return
+
+    self._execute_acquisition("AcquisitionStart")
+    self.paused = False
+    self.log(logging.DEBUG, "resumed.")
+
   def stop(self):
     assert self.started, f"Camera {self.name} is not started"
     self.logger.info(f"{self.name}:Stopping camera capture...")
@@ -178,6 +230,7 @@ class Camera(interface.Camera):
     self.handler = None
     
     self.camera.EndAcquisition()
+    self.paused = False
 
     self.log(logging.DEBUG, "stopped.")
     self.emit("on_started", False)
@@ -186,5 +239,8 @@ class Camera(interface.Camera):
     if self.started:
       self.stop()
 
+    self.nodes.clear()
+    self.stream_nodes.clear()
+
     self.camera.DeInit()
     self.camera = None
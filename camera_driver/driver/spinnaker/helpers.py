@@ -1,16 +1,20 @@
 
 from numbers import Number
-from beartype.typing import Any, Callable, Dict,  Tuple
+from beartype.typing import Any, Callable, Dict, List, Tuple
 import PySpin
-import statistics
 from beartype import beartype
 
 from disable_gc import disable_gc
 from fuzzywuzzy import process
 
+from camera_driver.driver.clock_offset import ClockOffset, estimate_offset
+
 
 
 def suggest_node(nodemap, k, threshold=50):
+  if isinstance(nodemap, NodeCache):
+    nodemap = nodemap.nodemap
+
   names = [node.GetName() for node in nodemap.GetNodes()]
   if k in names:  
     return "Node {} exists, but not available".format(k)
@@ -28,12 +32,13 @@ class NodeException(RuntimeError):
 node_type_mapping = {
    2: PySpin.CIntegerPtr,
    3: PySpin.CBooleanPtr,
+   4: PySpin.CCommandPtr,
    5: PySpin.CFloatPtr,
    6: PySpin.CStringPtr,
    9: PySpin.CEnumerationPtr
 }
 
-def get_node(nodemap:PySpin.INodeMap, node_name:str):
+def resolve_node(nodemap:PySpin.INodeMap, node_name:str):
   node = nodemap.GetNode(node_name)
   if node is None:
     raise NodeException(suggest_node(nodemap, node_name))
@@ -44,7 +49,44 @@ def get_node(nodemap:PySpin.INodeMap, node_name:str):
   return node_type_mapping[t](node)
 
 
-def get_writable(nodemap:PySpin.INodeMap, node_name:str):
+# commands after which cached node handles are discarded
+invalidating_commands = {"UserSetLoad", "DeviceReset"}
+
+class NodeCache:
+  """ Resolved (typed) node handles for a nodemap, so repeated reads and writes skip the lookup
+      (and missing nodes skip suggest_node). Can be passed to the helpers in place of the nodemap,
+      cleared by execute() after UserSetLoad or a reset. """
+
+  def __init__(self, nodemap:PySpin.INodeMap):
+    self.nodemap = nodemap
+    self.nodes:Dict[str, Any] = {}
+
+  def get_node(self, node_name:str):
+    node = self.nodes.get(node_name)
+    if node is None:
+      try:
+        node = resolve_node(self.nodemap, node_name)
+      except NodeException as e:
+        node = e
+      self.nodes[node_name] = node
+
+    if isinstance(node, NodeException):
+      raise node
+    return node
+
+  def clear(self):
+    self.nodes = {}
+
+
+NodeMap = PySpin.INodeMap | NodeCache
+
+def get_node(nodemap:NodeMap, node_name:str):
+  if isinstance(nodemap, NodeCache):
+    return nodemap.get_node(node_name)
+  return resolve_node(nodemap, node_name)
+
+
+def get_writable(nodemap:NodeMap, node_name:str):
   node = get_node(nodemap, node_name)
   if not PySpin.IsAvailable(node):
     raise NodeException(suggest_node(nodemap, node_name))
@@ -54,12 +96,12 @@ def get_writable(nodemap:PySpin.INodeMap, node_name:str):
   return node
 
 
-def is_writable(nodemap:PySpin.INodeMap, node_name:str):
+def is_writable(nodemap:NodeMap, node_name:str):
   node = get_node(nodemap, node_name)
   return PySpin.IsAvailable(node) and PySpin.IsWritable(node)
   
   
-def get_readable(nodemap:PySpin.INodeMap, node_name:str):
+def get_readable(nodemap:NodeMap, node_name:str):
   node = get_node(nodemap, node_name)
     
   if not PySpin.IsAvailable(node):
@@ -69,11 +111,11 @@ def get_readable(nodemap:PySpin.INodeMap, node_name:str):
     raise NodeException('Node not readable {}. '.format(node_name))
   return node
 
-def is_readable(nodemap:PySpin.INodeMap, node_name:str):
+def is_readable(nodemap:NodeMap, node_name:str):
   node = get_node(nodemap, node_name)
   return PySpin.IsAvailable(node) and PySpin.IsReadable(node)
 
-def get_value(nodemap:PySpin.INodeMap, node_name:str):
+def get_value(nodemap:NodeMap, node_name:str):
   node = get_readable(nodemap, node_name)
   if isinstance(node, PySpin.CEnumerationPtr):
      return node.GetCurrentEntry().GetSymbolic()
@@ -86,8 +128,21 @@ def try_get_value(nodemap, node_name, default=None):
   except NodeException:
     return default
 
+def get_values(nodemap:NodeMap, node_names:List[str]) -> Dict[str, Any]:
+  return {node_name:get_value(nodemap, node_name) for node_name in node_names}
+
+def try_get_values(nodemap:NodeMap, node_names:List[str]) -> Dict[str, Any]:
+  """ Values of the readable nodes in node_names (others are left out) """
+  values = {}
+  for node_name in node_names:
+    try:
+      values[node_name] = get_value(nodemap, node_name)
+    except (NodeException, PySpin.SpinnakerException):
+      pass
+  return values
 
-def set_value(nodemap:PySpin.INodeMap, node_name:str, value:Any):
+
+def set_value(nodemap:NodeMap, node_name:str, value:Any):
   try:
     node = get_writable(nodemap, node_name)
     if isinstance(node, PySpin.CEnumerationPtr):
@@ -113,66 +168,83 @@ def set_value(nodemap:PySpin.INodeMap, node_name:str, value:Any):
     raise NodeException(f"Invalid value {value} for node {node_name}: {e}")
 
 
+def set_values(nodemap:NodeMap, values:Dict[str, Any]):
+  """ Set nodes in order, raising a NodeException for every node which failed (after trying all) """
+  errors = []
+  for node_name, value in values.items():
+    try:
+      set_value(nodemap, node_name, value)
+    except NodeException as e:
+      errors.append(str(e))
+
+  if len(errors) > 0:
+    raise NodeException("; ".join(errors))
+
+
 @beartype
-def set_bool(nodemap:PySpin.INodeMap, node_name:str, value:bool):
+def set_bool(nodemap:NodeMap, node_name:str, value:bool):
   return set_value(nodemap, node_name, value)
 
 @beartype
-def set_float(nodemap:PySpin.INodeMap, node_name:str, value:Number):
+def set_float(nodemap:NodeMap, node_name:str, value:Number):
   return set_value(nodemap, node_name, value)
 
 @beartype
-def set_int(nodemap:PySpin.INodeMap, node_name:str, value:int):
+def set_int(nodemap:NodeMap, node_name:str, value:int):
   return set_value(nodemap, node_name, value)
 
 
 @beartype
-def set_enum(nodemap:PySpin.INodeMap, node_name:str, value:str):
+def set_enum(nodemap:NodeMap, node_name:str, value:str):
   return set_value(nodemap, node_name, value)
 
-def try_set_value(nodemap:PySpin.INodeMap, node_name:str, value):
+def try_set_value(nodemap:NodeMap, node_name:str, value):
   try:
       return set_value(nodemap, node_name, value)
   except PySpin.SpinnakerException as e:
       return get_value(nodemap, node_name)
 
 @beartype
-def try_set_bool(nodemap:PySpin.INodeMap, node_name:str, value:bool):
+def try_set_bool(nodemap:NodeMap, node_name:str, value:bool):
   return try_set_value(nodemap, node_name, value)
 
 @beartype
-def try_set_float(nodemap:PySpin.INodeMap, node_name:str, value:Number):
+def try_set_float(nodemap:NodeMap, node_name:str, value:Number):
   return try_set_value(nodemap, node_name, value)
 
 @beartype
-def try_set_int(nodemap:PySpin.INodeMap, node_name:str, value:int):
+def try_set_int(nodemap:NodeMap, node_name:str, value:int):
   return try_set_value(nodemap, node_name, value)
 
 
 @disable_gc
-def camera_time_offset(cam:PySpin.Camera, get_time_sec:Callable[[], float], iters:int=50):
-    """ Gets timestamp offset in seconds from camera to system clock """
+def camera_time_offset(cam:PySpin.Camera, get_time_sec:Callable[[], float], 
+                       tolerance_sec:float=1e-5, max_samples:int=50) -> ClockOffset:
+    """ Gets timestamp offset in seconds from camera to system clock, sampling until
+        the standard error of the median is within tolerance """
 
-    timestamp_offsets = []
-    for i in range(iters):
+    def sample():
+        t0 = get_time_sec()
         cam.TimestampLatch.Execute()
+        t1 = get_time_sec()
 
-        # Compute timestamp offset in seconds; note that timestamp latch value is in seconds
-        timestamp_offset = get_time_sec() - float(cam.TimestampLatchValue.GetValue()) / 1e9
-        timestamp_offsets.append(timestamp_offset)
+        # Latched somewhere within the round trip; note that timestamp latch value is in nanoseconds
+        return (t0 + t1) / 2 - float(cam.TimestampLatchValue.GetValue()) / 1e9
 
-    # Return the median value
-    return statistics.median(timestamp_offsets)
+    return estimate_offset(sample, tolerance_sec=tolerance_sec, max_samples=max_samples)
 
 
 
-def execute(nodemap:PySpin.INodeMap, node_name:str):
-    node = PySpin.CCommandPtr(nodemap.GetNode(node_name))
+def execute(nodemap:NodeMap, node_name:str):
+    node = get_node(nodemap, node_name)
     if not PySpin.IsAvailable(node) or not PySpin.IsWritable(node):
         raise NodeException(suggest_node(nodemap, node_name))
     
     node.Execute(True)
 
+    if node_name in invalidating_commands and isinstance(nodemap, NodeCache):
+      nodemap.clear()
+
 
 def reset_camera(camera:PySpin.CameraPtr):
     camera.Init()
@@ -180,8 +252,7 @@ def reset_camera(camera:PySpin.CameraPtr):
     execute(nodemap, "DeviceReset")  
 
 
-def load_defaults(camera: PySpin.Camera):
-    nodemap = camera.GetNodeMap()
+def load_defaults(nodemap:NodeMap):
     set_enum(nodemap, "UserSetSelector", "Default")
     execute(nodemap, "UserSetLoad")
 
@@ -1,16 +1,14 @@
 
 from logging import Logger
-from multiprocessing.pool import ThreadPool
-import threading
+from camera_driver.concurrent.parallel import parallel_map
 from beartype.typing import Dict, Set
 
-from queue import Queue
-
 import PySpin
 from .camera import Camera
 from . import helpers
 
-from camera_driver.driver import interface
+from camera_driver.driver import interface, settings
+from camera_driver.driver.discovery import DeviceRegistry
 
 
 class Manager(interface.Manager):
@@ -20,59 +18,46 @@ class Manager(interface.Manager):
       self.system = PySpin.System.GetInstance()
 
       self.presets = presets
-  
-    def _devices(self) -> Dict[str, PySpin.CameraPtr]:
+
+      # enumerate once, then keep up to date from arrival/removal events
+      self.devices:DeviceRegistry[PySpin.CameraPtr] = DeviceRegistry(logger)
       camera_list = self.system.GetCameras()
-      return {str(helpers.get_camera_serial(camera)): camera for camera in camera_list}
+      for camera in camera_list:
+        self.devices.added(str(helpers.get_camera_serial(camera)), camera)
+      camera_list.Clear()
+
+      self.handler = DeviceEventHandler(self.devices, logger)
+      self.interfaces = self.system.GetInterfaces()
+      for iface in self.interfaces:
+        iface.RegisterEventHandler(self.handler)
 
 
     def camera_serials(self) -> Set[str]:
-      return set(self._devices().keys())
+      return self.devices.serials()
 
     
     def init_camera(self, name:str, serial:str) -> Camera:
-      camera = self._devices()[serial]
-      return Camera(name, camera, self.presets, logger=self.logger)
+      return Camera(name, self.devices[serial], self.presets, logger=self.logger)
     
 
-    def wait_for_cameras(self, cameras:Dict[str, str]):
-      queue = Queue(1)
-      handler = ResetHandler(on_added=queue.put)
-
-      interfaces = self.system.GetInterfaces()    
-
-      for iface in interfaces:
-        iface.RegisterEventHandler(handler)
-
+    def wait_for_cameras(self, cameras:Dict[str, str], timeout_sec:float=30.0):
       by_serial = {serial:k for k, serial in cameras.items()}
-      cameras_found = {}
       self.logger.info(f"Waiting for cameras {by_serial}")
 
-      while len(by_serial) > 0:
-        camera = queue.get()
-        serial = str(helpers.get_camera_serial(camera))
-        if serial in by_serial:
-
-          name = by_serial[serial]
-          cameras_found[name] = Camera(name, camera, self.presets, self.logger)
-          self.logger.info(f"Camera {name}:{serial} found.")
-
-          del by_serial[serial]      
-
-      for iface in interfaces:
-        iface.UnregisterEventHandler(handler)
-
-      return cameras_found
+      self.devices.wait_for(set(by_serial.keys()), timeout_sec=timeout_sec)
+      return {name:self.init_camera(name, serial) for name, serial in cameras.items()}
 
 
     def reset_cameras(self, camera_set:Set[str]):
       assert camera_set <= self.camera_serials(), f"reset_cameras: camera(s) not found {camera_set - self.camera_serials()}"      
 
-      cameras = self._devices()
+      cameras = {serial:self.devices[serial] for serial in camera_set}
       self.logger.info(f"Resetting {len(cameras)} cameras...")
 
-      with ThreadPool(len(cameras)) as pool:
-        pool.map(helpers.reset_camera, cameras.values())
+      # reset cameras re-appear through the arrival event
+      self.devices.discard(camera_set)
+      parallel_map("reset", helpers.reset_camera, cameras, self.logger)
+      settings.applied.invalidate(camera_set)
 
     
       self.logger.info("Done.")
@@ -80,19 +65,29 @@ class Manager(interface.Manager):
 
     def release(self):
         self.logger.info("Releasing Spinnaker instance...")
+        for iface in self.interfaces:
+          iface.UnregisterEventHandler(self.handler)
+        self.interfaces.Clear()
+
+        # camera references must be released before the system
+        self.devices.clear()
         self.system.ReleaseInstance()
         self.logger.info("Done.")
 
 
 
 
-class ResetHandler(PySpin.InterfaceEventHandler):
-    def __init__(self, on_added):
-        super(ResetHandler, self).__init__()      
-        self.on_added = on_added
+class DeviceEventHandler(PySpin.InterfaceEventHandler):
+    def __init__(self, devices:DeviceRegistry, logger:Logger):
+        super(DeviceEventHandler, self).__init__()      
+        self.devices = devices
+        self.logger = logger
 
     def OnDeviceArrival(self, camera):
-        self.on_added(camera)
+        self.devices.added(str(helpers.get_camera_serial(camera)), camera)
 
     def OnDeviceRemoval(self, camera):
-        pass
+        try:
+          self.devices.removed(str(helpers.get_camera_serial(camera)))
+        except PySpin.SpinnakerException as e:
+          self.logger.warning(f"Camera removed, but failed to read its serial: {e}")
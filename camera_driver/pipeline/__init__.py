@@ -1,6 +1,7 @@
 from .pipeline import CameraPipeline, cameras_from_config
 from .image import ImageOutputs, CameraImage, FrameProcessor
-from .config import ImageSettings, ToneMapper, CameraPipelineConfig, Transform, load_structured
+from .raw_writer import RawWriter, RawGroup, Compression, read_raw_group
+from .config import ImageSettings, ToneMapper, CameraPipelineConfig, Transform, IspType, load_structured
 from camera_driver.driver import Camera, CameraProperties, Manager, CameraInfo
 
 
@@ -14,9 +15,15 @@ __all__ = [
   'CameraImage', 
   'FrameProcessor',
 
+  'RawWriter',
+  'RawGroup',
+  'Compression',
+  'read_raw_group',
+
   'ImageSettings',
   'ToneMapper',
   'Transform',
+  'IspType',
 
   'load_structured',
 
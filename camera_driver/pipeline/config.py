@@ -4,6 +4,10 @@ from beartype.typing import Dict, Optional, List
 from beartype import beartype
 
 from camera_driver.driver.interface import BackendType, CameraProperties
+from camera_driver.concurrent.work_queue import QueuePolicy
+from camera_driver.camera_group.clock_model import ClockModelType
+from camera_driver.camera_group.frame_id_grouper import GroupingMode
+from camera_driver.camera_group.sync_handler import PartialPolicy
 from omegaconf import OmegaConf
 
 class Transform(Enum):
@@ -22,6 +26,11 @@ class ToneMapper(Enum):
   reinhard = 1
 
 
+class IspType(Enum):
+  taichi = "taichi"
+  cpu = "cpu"
+
+
 def clamp(x, lower, upper):
   return min(max(x, lower), upper)
 
@@ -82,22 +91,67 @@ class CameraPipelineConfig:
   master:Optional[str] 
   default_mode:str = 'slave'
   reset_cycle:bool = True
+  reset_timeout_sec:float = 30.0    # time for cameras to re-appear after a reset cycle
 
   sync_threshold_msec:float = 10.0
   timeout_msec:float = 2000.0
 
+  # group frames by: timestamp (within sync_threshold_msec) | frame_id (hardware triggered, 
+  # timestamps only used to align cameras and validate)
+  group_by:GroupingMode = GroupingMode.timestamp
+
   init_window:int = 5
   init_timeout_msec:float = 5000.0
 
   resync_offset_sec:float = 600.0 # 10 minutes
+
+  # cameras with clock latching: latch until the offset's standard error is within latch_tolerance_usec
+  latch_tolerance_usec:float = 10.0
+  latch_samples:int = 50   # maximum latches per camera
+
+  # clock offsets (and drift) saved on stop, validated against the first frames on the next start
+  # instead of a full initialisation. Persisted to offset_cache (json) if set, otherwise in memory
+  offset_cache:Optional[str] = None
+  offset_cache_tolerance_msec:float = 20.0
+
+  # per camera clock offset estimation: regression (offset and skew over clock_window groups) | ema
+  clock_model:ClockModelType = ClockModelType.regression
+  clock_window:int = 200
   device:str = 'cuda'
+  tensor_pools:bool = True # reuse per camera tensors for uploads
+  isp:IspType = IspType.taichi # taichi (gpu, or cpu fallback) | cpu (numpy/opencv)
+  buffer_leases:bool = False # (cpu device only) process driver buffers in place instead of copying
 
   process_workers:int = 4
   sync_workers:int = 1
 
+  # buffers queued per camera between the SDK callback and the pipeline (oldest dropped when full, 
+  # see queue_policies 'ingest'), 0 to run the pipeline on the SDK callback thread
+  ingest_size:int = 4
+
+  # emit incomplete (timed out) groups: mode never | always | min_cameras | required
+  partial_groups: PartialPolicy = field(default_factory=PartialPolicy)
+
+  # emit grouped packed images (on_raw_set) without processing, e.g. to record with RawWriter
+  raw_passthrough:bool = False
+
+  # emit processed frames in the order they were submitted (across process_workers)
+  ordered_output:bool = False
+
+  # unsynchronised pipeline: batch frames arriving within batch_window_msec (up to batch_size, 
+  # default all cameras) into one ISP call, 0 to process each camera separately
+  batch_window_msec:float = 0.0
+  batch_size:int = 0
+
+  # overflow policy for named work queues (e.g. sync_handler, frame_processor, buffer_handler, ingest)
+  queue_policies: Dict[str, QueuePolicy] = field(default_factory=dict)
+
   parameters: ImageSettings
   camera_settings: Dict[str, List]
 
+  def queue_policy(self, name:str) -> QueuePolicy:
+    return self.queue_policies.get(name, QueuePolicy())
+
   @staticmethod
   def load_yaml(*filenames:str) -> 'CameraPipelineConfig':
     return load_structured(CameraPipelineConfig, *filenames)
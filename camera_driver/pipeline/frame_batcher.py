@@ -0,0 +1,91 @@
+from collections import deque
+import logging
+from threading import Condition, Thread
+from time import monotonic
+import traceback
+from beartype.typing import Deque, Dict, Optional
+
+from pydispatch import Dispatcher
+
+from .image.camera_image import CameraImage
+
+
+class FrameBatcher(Dispatcher):
+  """ Collects frames from different cameras into batches, a batch is emitted when it 
+      holds max_size frames or window_sec after its first frame arrived. 
+      A batch holds at most one frame per camera. """
+  _events_ = ["on_batch"]
+
+  def __init__(self, window_sec:float, max_size:int, logger:logging.Logger):
+    self.window_sec = window_sec
+    self.max_size = max_size
+    self.logger = logger
+
+    self.batches:Deque[Dict[str, CameraImage]] = deque()
+    self.opened:Deque[float] = deque()
+
+    self.cond = Condition()
+    self.thread:Optional[Thread] = None
+    self.stopping = False
+
+  @property
+  def started(self) -> bool:
+    return self.thread is not None
+
+  def push_image(self, image:CameraImage):
+    with self.cond:
+      if (len(self.batches) == 0 or image.camera_name in self.batches[-1] 
+          or len(self.batches[-1]) >= self.max_size):
+        self.batches.append({})
+        self.opened.append(monotonic())
+
+      self.batches[-1][image.camera_name] = image
+      self.cond.notify()
+
+  def _ready(self) -> bool:
+    if len(self.batches) == 0:
+      return False
+    
+    return (len(self.batches) > 1 or self.stopping 
+            or len(self.batches[0]) >= self.max_size 
+            or monotonic() >= self.opened[0] + self.window_sec)
+
+  def _run(self):
+    with self.cond:
+      while True:
+        if self._ready():
+          batch = self.batches.popleft()
+          self.opened.popleft()
+
+          self.cond.release()
+          try:
+            self.emit("on_batch", batch)
+          except Exception:
+            self.logger.error(f"Error processing batch: {traceback.format_exc()}")
+          finally:
+            self.cond.acquire()
+
+        elif self.stopping:
+          return
+        else:
+          timeout = (self.opened[0] + self.window_sec - monotonic()) if len(self.batches) > 0 else None
+          self.cond.wait(timeout)
+
+  def start(self):
+    assert not self.started, "FrameBatcher already started"
+    self.stopping = False
+
+    self.thread = Thread(target=self._run, name="frame_batcher")
+    self.thread.start()
+
+  def stop(self):
+    """ Stop after emitting any remaining batches """
+    if not self.started:
+      return
+
+    with self.cond:
+      self.stopping = True
+      self.cond.notify()
+
+    self.thread.join()
+    self.thread = None
@@ -1,6 +1,7 @@
-from dataclasses import dataclass
-from beartype.typing import  Optional, Tuple
+from dataclasses import dataclass, replace
+from beartype.typing import  Callable, Optional, Tuple
 import warnings
+import weakref
 from beartype import beartype
 
 import numpy as np
@@ -13,6 +14,44 @@ from camera_driver.driver.interface import Buffer
 
 
 
+class Lease:
+  """ Holds memory (a driver buffer or pooled tensor) until it is given back, by release() or when 
+      the lease is garbage collected. Copies of an image share its lease, so the memory (and views of it) 
+      stay valid for as long as any image or output holding the lease is referenced. """
+
+  def __init__(self, give_back:Callable, *args):
+    self.returned = weakref.finalize(self, give_back, *args)
+    self.returned.atexit = False
+
+  @property
+  def released(self) -> bool:
+    return not self.returned.alive
+
+  def release(self):
+    self.returned()   # runs at most once
+
+
+class BufferLease(Lease):
+  """ A driver Buffer, used in place of copying its image data """
+  def __init__(self, buffer:Buffer):
+    super().__init__(buffer.release)
+
+
+def return_tensor(pool, tensor:torch.Tensor):
+  ready = None
+  if tensor.is_cuda:
+    # work already queued on the tensor completes before it is reused
+    ready = torch.cuda.Event()
+    ready.record()
+  pool.release(tensor, ready)
+
+
+class PoolLease(Lease):
+  """ A pooled tensor, returned to its pool (see TensorPool) """
+  def __init__(self, pool, tensor:torch.Tensor):
+    super().__init__(return_tensor, pool, tensor)
+
+
 @beartype
 @dataclass
 class CameraImage(Timestamped):
@@ -21,6 +60,8 @@ class CameraImage(Timestamped):
   image_size: Tuple[int, int]
   encoding: ImageEncoding
 
+  lease: Optional[Lease] = None
+
   @property
   def device(self):
     return self.image_data.device
@@ -30,17 +71,48 @@ class CameraImage(Timestamped):
     return f"CameraImage({self.camera_name}, {w}x{h}, {str(self.image_data.dtype)}, {self.encoding.value}, {self.stamp_pretty})"
 
   @staticmethod
-  def from_buffer(buffer:Buffer, clock_time_sec:float, device:torch.device):
+  def from_buffer(buffer:Buffer, clock_time_sec:float, device:torch.device, 
+                  image_data:Optional[torch.Tensor]=None, lease:Optional[PoolLease]=None):
     """ Convert buffer to CameraImage
-        Image is copied to torch Tensor and uploaded to device """
+        Image is copied to torch Tensor and uploaded to device (unless already uploaded as image_data,
+        a pooled image_data is returned to its pool by release_lease()) """
+
+    torch_image = numpy_torch(buffer.image_data, device) if image_data is None else image_data
+    return CameraImage(timestamp_sec=buffer.timestamp_sec,
+                      clock_time_sec=clock_time_sec,
+                      camera_name=buffer.camera_name,
+                      image_data = torch_image,
+                      image_size=buffer.image_size,
+                      encoding=buffer.encoding,
+                      frame_id=buffer.frame_id,
+                      lease=lease)
+  
+  @staticmethod
+  def lease_buffer(buffer:Buffer, clock_time_sec:float):
+    """ Wrap buffer memory as a (cpu) CameraImage without copying. 
+        The buffer is released by release_lease() on whichever path drops the image, 
+        or when the last image holding the lease is garbage collected """
+
+    torch_image = numpy_torch(buffer.image_data)
+    lease = BufferLease(buffer)
 
-    torch_image = numpy_torch(buffer.image_data, device)
     return CameraImage(timestamp_sec=buffer.timestamp_sec,
                       clock_time_sec=clock_time_sec,
                       camera_name=buffer.camera_name,
                       image_data = torch_image,
                       image_size=buffer.image_size,
-                      encoding=buffer.encoding)
+                      encoding=buffer.encoding,
+                      frame_id=buffer.frame_id,
+                      lease=lease)
+  
+  def release_lease(self) -> 'CameraImage':
+    """ Return a leased buffer to the driver (or pooled tensor to its pool),
+        the returned image no longer holds image data """
+    if self.lease is None:
+      return self
+    
+    self.lease.release()
+    return replace(self, image_data=torch.empty(0, dtype=torch.uint8), lease=None)
                        
 
 
@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import os
+from threading import Lock
+from beartype.typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from camera_driver.pipeline.config import ImageSettings, ToneMapper, Transform
+from camera_driver.data import BayerPattern, EncodingType, unpack
+
+from .isp import Isp, resized_size, transformed_size
+
+
+# OpenCV names bayer codes by the second row (offset by one) of the pattern
+cv_bayer = {
+  BayerPattern.RGGB: cv2.COLOR_BayerBG2RGB,
+  BayerPattern.BGGR: cv2.COLOR_BayerRG2RGB,
+  BayerPattern.GRBG: cv2.COLOR_BayerGB2RGB,
+  BayerPattern.GBRG: cv2.COLOR_BayerGR2RGB,
+}
+
+bit_depth = {
+  EncodingType.Packed8: 8,
+  EncodingType.Packed12: 12,
+  EncodingType.Packed12_IDS: 12,
+  EncodingType.Packed16: 16,
+}
+
+
+def transform_view(image:np.ndarray, transform:Transform) -> np.ndarray:
+  """ Transform an image (as a view) following PIL Transpose conventions """
+  match transform:
+    case Transform.none:        return image
+    case Transform.rotate_90:   return np.rot90(image, 1)
+    case Transform.rotate_180:  return np.rot90(image, 2)
+    case Transform.rotate_270:  return np.rot90(image, 3)
+    case Transform.transpose:   return image.swapaxes(0, 1)
+    case Transform.flip_horiz:  return image[:, ::-1]
+    case Transform.flip_vert:   return image[::-1]
+    case Transform.transverse:  return np.rot90(image, 2).swapaxes(0, 1)
+
+
+inverse_transform = {
+  Transform.rotate_90: Transform.rotate_270,
+  Transform.rotate_270: Transform.rotate_90,
+}
+
+
+@dataclass
+class ToneStats:
+  """ Luminance statistics used for tonemapping (over a batch of images) """
+  log_mean:float
+  mean:float
+  max:float
+  rgb_mean:np.ndarray
+
+  @staticmethod
+  def from_images(images:List[np.ndarray], scale:float, stride:int=4) -> 'ToneStats':
+    samples = np.concatenate([image[::stride, ::stride].reshape(-1, 3) for image in images])
+    samples = samples.astype(np.float32) * scale
+
+    gray = samples @ np.array([0.2125, 0.7154, 0.0721], dtype=np.float32)
+    return ToneStats(
+      log_mean = float(np.log(gray + 1e-4).mean()),
+      mean = float(gray.mean()),
+      max = float(gray.max()),
+      rgb_mean = samples.mean(axis=0))
+
+  def lerp(self, other:'ToneStats', t:float) -> 'ToneStats':
+    return ToneStats(
+      log_mean = self.log_mean + (other.log_mean - self.log_mean) * t,
+      mean = self.mean + (other.mean - self.mean) * t,
+      max = self.max + (other.max - self.max) * t,
+      rgb_mean = self.rgb_mean + (other.rgb_mean - self.rgb_mean) * t)
+
+
+def tonemap_linear(image:np.ndarray, scale:float, stats:ToneStats, gamma:float) -> np.ndarray:
+  x = image.astype(np.float32) * (scale / max(stats.max, 1e-4))
+  return to_uint8(x, gamma)
+
+
+def tonemap_reinhard(image:np.ndarray, scale:float, stats:ToneStats,
+                     gamma:float, intensity:float, light_adapt:float, color_adapt:float) -> np.ndarray:
+  """ Reinhard-Devlin photoreceptor tonemapping """
+  x = image.astype(np.float32) * scale
+  gray = x @ np.array([0.2125, 0.7154, 0.0721], dtype=np.float32)
+
+  log_max = np.log(max(stats.max, 1e-4))
+  key = (log_max - stats.log_mean) / max(log_max - np.log(1e-4), 1e-4)
+  f = np.exp(-intensity)
+  m = 0.3 + 0.7 * np.power(max(key, 0.0), 1.4)
+
+  # local (per pixel) and global adaptation, each interpolated between luminance and color
+  local = color_adapt * x + (1 - color_adapt) * gray[..., None]
+  global_ = color_adapt * stats.rgb_mean + (1 - color_adapt) * stats.mean
+  adapt = light_adapt * local + (1 - light_adapt) * global_
+
+  x = x / (x + np.power(f * adapt, m) + 1e-6)
+  return to_uint8(x, gamma)
+
+
+def to_uint8(x:np.ndarray, gamma:float) -> np.ndarray:
+  np.clip(x, 0, 1, out=x)
+  return (np.power(x, 1.0 / gamma, out=x) * 255 + 0.5).astype(np.uint8)
+
+
+class CpuIsp(Isp):
+  """ ISP using numpy and OpenCV, work is split into row chunks over a thread pool
+      for use without a GPU (or alongside one) """
+
+  def __init__(self, pattern:BayerPattern, encoding:EncodingType, settings:ImageSettings,
+               device:torch.device, num_threads:Optional[int]=None):
+    self.pattern = pattern
+    self.encoding_type = encoding
+    self.settings = settings
+    self.device = device
+
+    self.num_threads = num_threads or os.cpu_count() or 1
+    self.executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="cpu_isp")
+
+    self.scale = 1.0 / (2 ** bit_depth[encoding] - 1)
+    self.stats:Optional[ToneStats] = None
+    self.lock = Lock()
+
+  def update_settings(self, settings:ImageSettings):
+    self.settings = settings
+
+  def output_shape(self, image_size:Tuple[int, int]) -> Optional[Tuple[int, int, int]]:
+    if self.device.type != 'cpu':
+      return None
+
+    return self._output_shape(image_size, self.settings)
+
+  @staticmethod
+  def _output_shape(image_size:Tuple[int, int], settings:ImageSettings) -> Tuple[int, int, int]:
+    w, h = transformed_size(resized_size(image_size, int(settings.resize_width)),
+                            Transform(settings.transform))
+    return (h, w, 3)
+
+  def warmup(self, image_sizes:List[Tuple[int, int]]):
+    images = []
+    for (w, h) in image_sizes:
+      row_bytes = w * bit_depth[self.encoding_type] // 8
+      images.append(torch.from_numpy(np.random.randint(0, 255, (h, row_bytes), dtype=np.uint8)))
+
+    self.process(images)
+    self.stats = None
+
+  def _map_rows(self, f:Callable[[int, int], None], height:int, align:int=2):
+    """ Run f(start, end) over chunks of rows in parallel """
+    bounds = (np.linspace(0, height // align, self.num_threads + 1).astype(int) * align).tolist()
+    bounds[-1] = height
+
+    list(self.executor.map(f, bounds[:-1], bounds[1:]))
+
+  def _develop(self, packed:np.ndarray, settings:ImageSettings) -> np.ndarray:
+    """ Unpack, demosaic and resize a raw image to RGB (uint8 or uint16) """
+    if self.encoding_type == EncodingType.Packed8:
+      bayer = packed   # demosaic directly from 8 bit
+    else:
+      bayer = unpack.decode(packed, self.encoding_type, num_threads=self.num_threads)
+    rgb = cv2.cvtColor(bayer, cv_bayer[self.pattern])
+
+    h, w, _ = rgb.shape
+    size = resized_size((w, h), int(settings.resize_width))
+    if size != (w, h):
+      rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+    return rgb
+
+  def _update_stats(self, images:List[np.ndarray], settings:ImageSettings) -> ToneStats:
+    stats = ToneStats.from_images(images, self.scale)
+    with self.lock:
+      if self.stats is not None:
+        stats = self.stats.lerp(stats, settings.moving_average)
+      self.stats = stats
+    return stats
+
+  def _tonemap(self, image:np.ndarray, out:np.ndarray, stats:ToneStats, settings:ImageSettings):
+    if settings.tone_mapping == ToneMapper.linear:
+      tonemap = lambda x: tonemap_linear(x, self.scale, stats, settings.tone_gamma)
+    else:
+      tonemap = lambda x: tonemap_reinhard(x, self.scale, stats,
+        gamma=settings.tone_gamma, intensity=settings.tone_intensity,
+        light_adapt=settings.light_adapt, color_adapt=settings.color_adapt)
+
+    # write into the output through the inverse transform, so the result is transformed
+    transform = Transform(settings.transform)
+    target = transform_view(out, inverse_transform.get(transform, transform))
+    assert target.shape == image.shape, f"Output shape {out.shape} does not match {image.shape} ({transform})"
+
+    def f(start, end):
+      target[start:end] = tonemap(image[start:end])
+    self._map_rows(f, image.shape[0], align=1)
+
+  def process(self, images:List[torch.Tensor],
+              outputs:Optional[List[torch.Tensor]]=None) -> List[torch.Tensor]:
+
+    # settings may be updated from another thread, use the same ones throughout
+    settings = self.settings
+
+    rgb = [self._develop(image.cpu().numpy(), settings) for image in images]
+    stats = self._update_stats(rgb, settings)
+
+    results = []
+    for i, image in enumerate(rgb):
+      h, w, _ = image.shape
+      w, h = transformed_size((w, h), Transform(settings.transform))
+
+      out = outputs[i] if outputs is not None else None
+      if out is None or tuple(out.shape) != (h, w, 3):
+        # outputs sized before a settings change are not used
+        out = torch.empty((h, w, 3), dtype=torch.uint8)
+
+      self._tonemap(image, out.numpy(), stats, settings)
+      results.append(out)
+
+    return [out.to(self.device) for out in results]
+
+  def stop(self):
+    self.executor.shutdown(wait=False)
@@ -1,91 +1,92 @@
 
-from functools import partial
 from logging import Logger
-from beartype.typing import Dict, List, Tuple
-from camera_driver.driver.interface import CameraInfo
+from beartype.typing import Dict, List, Optional, Tuple
+from camera_driver.driver.interface import Buffer, CameraInfo
 import torch
 
 from pydispatch import Dispatcher
 from beartype import beartype
 
-from camera_driver.concurrent.taichi_queue import TaichiQueue
-from camera_driver.concurrent.work_queue import WorkQueue
-from camera_driver.pipeline.config import ImageSettings, ToneMapper, Transform
+from camera_driver.concurrent.work_queue import QueuePolicy, WorkQueue
+from camera_driver.pipeline.config import ImageSettings, IspType
 
-from camera_driver.data import BayerPattern, bayer_pattern, EncodingType, encoding_type
+from camera_driver.data import bayer_pattern, EncodingType, encoding_type
 
 from .image_outputs import ImageOutputs
-from .camera_image import CameraImage
-
-from taichi_image import camera_isp, interpolate, bayer, packed
+from .camera_image import BufferLease, CameraImage, PoolLease
+from .tensor_pool import FramePools, PoolStats
+from .isp import create_isp
 
 
 class FrameProcessor(Dispatcher):
-  """ FrameProcessor - process raw 12/16 bit images from cameras into tonemapped RGB images
+  """ FrameProcessor - process raw 8/12/16 bit images from cameras into tonemapped RGB images
   """
   _events_ = ["on_frame"]
 
   @beartype
-  def __init__(self, cameras:Dict[str, CameraInfo], settings:ImageSettings, logger:Logger, device:torch.device, num_workers:int=4, max_size:int=4):
+  def __init__(self, cameras:Dict[str, CameraInfo], settings:ImageSettings, logger:Logger, device:torch.device, 
+               num_workers:int=4, max_size:int=4, queue_policy:Optional[QueuePolicy]=None, ordered:bool=False,
+               tensor_pools:bool=True, isp:IspType=IspType.taichi):
     self.settings = settings
     self.cameras = cameras
     self.logger = logger
     self.device = device
 
-    self.queue = WorkQueue("frame_processor", run=self.process_worker, 
-                           logger=logger, num_workers=num_workers, max_size=max_size)
-
-    self.processor = TaichiQueue.run_sync(self._init_processor, cameras)
-    self.queue.start()
-
-    self.warmup()
-
-
-  def update_settings(self, settings:ImageSettings):
-    self.settings = settings
-    transform = interpolate.ImageTransform(Transform(settings.transform).name)
-    
-    self.isp.set(moving_alpha=self.settings.moving_average, 
-                 resize_width=int(self.settings.resize_width),
-                 transform=transform)
+    self.pools = FramePools(cameras, device, max_free=max_size + num_workers) if tensor_pools else None
 
+    self.queue = WorkQueue("frame_processor", run=self.process_worker, 
+                           logger=logger, num_workers=num_workers, max_size=max_size, policy=queue_policy,
+                           on_result=self._emit_frame, ordered=ordered, on_drop=self._release_images)
 
-  @beartype
-  def _init_processor(self, cameras:Dict[str, CameraInfo]):
     enc = common_value("encoding", [camera.encoding for camera in cameras.values()])    
     
     self.pattern = bayer_pattern(enc)
     self.encoding_type = encoding_type(enc)
 
-    if encoding_type(enc) not in [EncodingType.Packed12, EncodingType.Packed12_IDS, EncodingType.Packed16]:
-      raise ValueError(f"Unsupported encoding {encoding_type(enc)} in {enc}")
+    if self.encoding_type not in [EncodingType.Packed8, EncodingType.Packed12, EncodingType.Packed12_IDS, EncodingType.Packed16]:
+      raise ValueError(f"Unsupported encoding {self.encoding_type} in {enc}")
 
+    self.isp = create_isp(isp, self.pattern, self.encoding_type, settings, device)
+    self.queue.start()
 
-    transform = interpolate.ImageTransform(Transform(self.settings.transform).name)
-    self.isp = camera_isp.Camera16(taichi_pattern[self.pattern], 
-                         resize_width=int(self.settings.resize_width), 
-                         moving_alpha=self.settings.moving_average,
-                         transform=transform,
-                         device=self.device)
-    
+    self.warmup()
+
+
+  def update_settings(self, settings:ImageSettings):
+    self.settings = settings
+    self.isp.update_settings(settings)
   
   def warmup(self):
     """ Warm start - run some empty images through to avoid delay at later stage """
-    def f():
-      test_images = [empty_test_image(camera.image_size, device=self.device) 
-                     for camera in self.cameras.values()]
-      
-      self._process_images(test_images)
-
     self.logger.info("FrameProcessor warmup")
-    TaichiQueue.run_sync(f)
+    self.isp.warmup([camera.image_size for camera in self.cameras.values()])
+
 
+  def image_from_buffer(self, buffer:Buffer, clock_time_sec:float, lease:bool=False) -> CameraImage:
+    """ Copy buffer to a CameraImage on the processing device (using pooled tensors if enabled).
+        With lease=True (cpu only) the buffer memory is used directly, and the buffer is released once processed. """
+    if lease:
+      assert self.device.type == 'cpu', f"Buffer leases require a cpu device, got {self.device}"
+      return CameraImage.lease_buffer(buffer, clock_time_sec)
 
+    image_data, pooled = None, None
+    if self.pools is not None:
+      image_data, pooled = self.pools.upload(buffer.camera_name, buffer.image_data)
+
+    return CameraImage.from_buffer(buffer, clock_time_sec, self.device, image_data=image_data, lease=pooled)
+  
+  def pool_stats(self) -> Dict[str, PoolStats]:
+    return self.pools.stats() if self.pools is not None else {}
 
   @beartype
-  def process_image_set(self, images:Dict[str, CameraImage]):
-    assert set(images.keys()) == set(self.cameras.keys()
-      ), f"Expected {set(self.cameras.keys())} - got {set(images.keys())}"
+  def process_image_set(self, images:Dict[str, CameraImage], partial:bool=False):
+    """ Queue a set of images for processing, with partial=True any non-empty subset of cameras is accepted """
+    if partial:
+      assert len(images) > 0 and set(images.keys()) <= set(self.cameras.keys()
+        ), f"Expected subset of {set(self.cameras.keys())} - got {set(images.keys())}"
+    else:
+      assert set(images.keys()) == set(self.cameras.keys()
+        ), f"Expected {set(self.cameras.keys())} - got {set(images.keys())}"
     
     return self.queue.enqueue(images)
 
@@ -99,66 +100,64 @@ class FrameProcessor(Dispatcher):
   
 
   @beartype
-  def process_worker(self, camera_images:Dict[str, CameraImage]):
+  def process_worker(self, camera_images:Dict[str, CameraImage]) -> Dict[str, ImageOutputs]:
     images = [self._check_image(k, image.image_data) 
               for k, image in camera_images.items()]
 
-    images = TaichiQueue.run_sync(self._process_images, images)
+    pooled = self._output_tensors(camera_images)
+    images = self.isp.process(images, [out for out, _ in pooled] if pooled is not None else None)
+
+    leases = [None] * len(images)
+    if pooled is not None:
+      for i, (image, (out, lease)) in enumerate(zip(images, pooled)):
+        if image is out:
+          leases[i] = lease     # returned with the ImageOutputs
+        else:
+          lease.release()       # not written to (e.g. resized by a settings change)
+
+    # Leased buffers go back to the driver as soon as the ISP has consumed them,
+    # pooled raw images are kept (as ImageOutputs.raw) and returned with the outputs
+    camera_images = {k:image.release_lease() if isinstance(image.lease, BufferLease) else image 
+                     for k, image in camera_images.items()}
+
     outputs = {k:ImageOutputs(
       raw = camera_images[k], 
       rgb = image, 
       calibration=self.cameras[k].calibration,
-      settings = self.settings)
-                    for k, image in zip(camera_images.keys(), images)}
+      settings = self.settings,
+      lease = lease)
+                    for k, image, lease in zip(camera_images.keys(), images, leases)}
+    return outputs
 
+  def _emit_frame(self, outputs:Dict[str, ImageOutputs]):
     self.emit("on_frame", outputs)
 
-  @beartype
-  def _process_images(self, images:List[torch.Tensor]):
-
-    if self.encoding_type == EncodingType.Packed12:
-      load_data = self.isp.load_packed12
-    elif self.encoding_type == EncodingType.Packed12_IDS:
-      load_data = partial(self.isp.load_packed12, ids_format=True)
-    elif self.encoding_type == EncodingType.Packed16:
-      load_data = self.isp.load_packed16
-
-
-    images =  [load_data(image) for image in images]
-    settings = self.settings
-
-    if settings.tone_mapping == ToneMapper.linear:
-      outputs = self.isp.tonemap_linear(images, gamma=settings.tone_gamma)
-    elif settings.tone_mapping == ToneMapper.reinhard:
-      outputs = self.isp.tonemap_reinhard(
-        images, gamma=settings.tone_gamma, 
-        intensity = settings.tone_intensity,
-        light_adapt = settings.light_adapt,
-        color_adapt = settings.color_adapt)
-      
-    return outputs
+  def _output_tensors(self, camera_images:Dict[str, CameraImage]) -> Optional[List[Tuple[torch.Tensor, PoolLease]]]:
+    """ Pooled output tensors for the ISP to write into, where the ISP supports it """
+    if self.pools is None:
+      return None
+    
+    shapes = {k:self.isp.output_shape(self.cameras[k].image_size) for k in camera_images.keys()}
+    if any(shape is None for shape in shapes.values()):
+      return None
+    
+    return [self.pools.output(k, shape) for k, shape in shapes.items()]
 
+  def _release_images(self, camera_images:Dict[str, CameraImage]):
+    # dropped by the queue (never processed)
+    for image in camera_images.values():
+      image.release_lease()
 
-  def stop(self):
+  def flush(self):
+    """ Process the queued image sets (returning any leased buffers), and accept more afterwards """
     self.queue.stop()
+    self.queue.start()
 
-
-def empty_test_image(image_size:Tuple[int, int], pattern = bayer.BayerPattern.RGGB, device="cpu"):
-  w, h = image_size
-  test_image = torch.rand( (h, w, 3), dtype=torch.float32, device=device)
-  
-  cfa = bayer.rgb_to_bayer(test_image, pattern=pattern) 
-  return packed.encode12(cfa, scaled=True) 
-
+  def stop(self):
+    self.queue.stop()
+    self.isp.stop()
 
 
 def common_value(name, values):
   assert len(set(values)) == 1, f"All cameras must have the same {name}"
   return values[0]
-
-taichi_pattern = {
-    BayerPattern.BGGR: bayer.BayerPattern.BGGR,
-    BayerPattern.RGGB: bayer.BayerPattern.RGGB,
-    BayerPattern.GBRG: bayer.BayerPattern.GBRG,
-    BayerPattern.GRBG: bayer.BayerPattern.GRBG,
-}
\ No newline at end of file
@@ -5,22 +5,22 @@ from beartype.typing import  Optional
 from beartype import beartype
 from functools import cached_property
 
+import cv2
 import numpy as np
-from nvjpeg_torch import Jpeg
 
 from camera_geometry import Camera
-from taichi_image import interpolate
 
 import torch 
 
-from camera_driver.concurrent.taichi_queue import TaichiQueue
 from camera_driver.pipeline.config import ImageSettings
 
-from .camera_image import CameraImage
+from .camera_image import CameraImage, PoolLease
 
 local_jpeg = threading.local()
 
 def jpeg():
+  # gpu only, so cpu processing works without nvjpeg installed
+  from nvjpeg_torch import Jpeg
 
   if not hasattr(local_jpeg, "encoder"):
     local_jpeg.encoder = Jpeg()
@@ -30,6 +30,9 @@ def jpeg():
 @beartype
 @dataclass
 class ImageOutputs(object):
+  """ Outputs for one camera image. Pooled tensors (rgb, and raw image data) are returned to their 
+      pools by release(), or when the last reference to the outputs is dropped - tensors taken 
+      from the outputs are only valid while the outputs are referenced. """
     
   raw:CameraImage
   
@@ -37,6 +40,14 @@ class ImageOutputs(object):
   settings : ImageSettings
   calibration:Optional[Camera] = None
 
+  lease:Optional[PoolLease] = None    # pooled rgb
+
+  def release(self):
+    """ Return pooled tensors for reuse, the outputs must not be used afterwards """
+    if self.lease is not None:
+      self.lease.release()
+    self.raw.release_lease()
+
   def __repr__(self):
     h, w, c = self.rgb.shape
 
@@ -44,8 +55,14 @@ class ImageOutputs(object):
     return f"ImageOutputs({self.raw.camera_name}, {w}x{h}x{c} {calibrated}, {self.rgb.device})"
 
   def encode(self, image:torch.Tensor):
-    encoder = jpeg()  
-    return encoder.encode(image,
+    if image.device.type == 'cpu':
+      ok, data = cv2.imencode(".jpg", cv2.cvtColor(image.numpy(), cv2.COLOR_RGB2BGR), 
+                              [cv2.IMWRITE_JPEG_QUALITY, self.settings.jpeg_quality])
+      assert ok, f"Failed to encode {self.camera_name}"
+      return data.tobytes()
+    
+    from nvjpeg_torch import Jpeg
+    return jpeg().encode(image,
                           quality=self.settings.jpeg_quality,
                           input_format=Jpeg.RGBI).numpy().tobytes()
   
@@ -64,6 +81,15 @@ class ImageOutputs(object):
 
   @cached_property
   def preview(self) -> torch.Tensor:
+    if self.rgb.device.type == 'cpu':
+      # cpu ISP, without taichi
+      h, w, _ = self.rgb.shape
+      width = int(self.settings.preview_size)
+      size = (width, max(1, int(round(h * width / w))))
+      return torch.from_numpy(cv2.resize(self.rgb.numpy(), size, interpolation=cv2.INTER_AREA))
+
+    from taichi_image import interpolate
+    from camera_driver.concurrent.taichi_queue import TaichiQueue
     return TaichiQueue.run_sync(interpolate.resize_width, self.rgb, self.settings.preview_size)
 
   @cached_property
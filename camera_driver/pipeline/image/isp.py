@@ -0,0 +1,60 @@
+import abc
+from beartype.typing import List, Optional, Tuple
+import torch
+
+from camera_driver.data import BayerPattern, EncodingType
+from camera_driver.pipeline.config import ImageSettings, IspType, Transform
+
+
+class Isp(metaclass=abc.ABCMeta):
+  """ Image signal processor - converts batches of packed bayer images (uint8, rows x bytes) 
+      into tonemapped RGB images (uint8, height x width x 3) """
+
+  @abc.abstractmethod
+  def update_settings(self, settings:ImageSettings):
+    raise NotImplementedError()
+
+  @abc.abstractmethod
+  def process(self, images:List[torch.Tensor], 
+              outputs:Optional[List[torch.Tensor]]=None) -> List[torch.Tensor]:
+    """ Process a batch of images, tonemapped together. 
+        If outputs are given (see output_shape) results are written into them. """
+    raise NotImplementedError()
+  
+  @abc.abstractmethod
+  def warmup(self, image_sizes:List[Tuple[int, int]]):
+    raise NotImplementedError()
+
+  def output_shape(self, image_size:Tuple[int, int]) -> Optional[Tuple[int, int, int]]:
+    """ Shape of the output for an image size, or None if the ISP can't write to provided outputs """
+    return None
+  
+  def stop(self):
+    pass
+
+
+def create_isp(isp_type:IspType, pattern:BayerPattern, encoding:EncodingType, 
+               settings:ImageSettings, device:torch.device) -> Isp:
+  match isp_type:
+    case IspType.taichi:
+      from .taichi_isp import TaichiIsp
+      return TaichiIsp(pattern, encoding, settings, device)
+    
+    case IspType.cpu:
+      from .cpu_isp import CpuIsp
+      return CpuIsp(pattern, encoding, settings, device)
+
+
+def resized_size(image_size:Tuple[int, int], resize_width:int) -> Tuple[int, int]:
+  w, h = image_size
+  if resize_width <= 0:
+    return (w, h)
+  
+  return (resize_width, int(round(h * resize_width / w)))
+
+
+def transformed_size(image_size:Tuple[int, int], transform:Transform) -> Tuple[int, int]:
+  w, h = image_size
+  if transform in [Transform.rotate_90, Transform.rotate_270, Transform.transpose, Transform.transverse]:
+    return (h, w)
+  return (w, h)
@@ -0,0 +1,120 @@
+from functools import partial
+from beartype.typing import List, Optional, Tuple
+import torch
+
+from beartype import beartype
+
+from camera_driver.concurrent.taichi_queue import TaichiQueue
+from camera_driver.pipeline.config import ImageSettings, ToneMapper, Transform
+from camera_driver.data import BayerPattern, EncodingType
+
+from .isp import Isp
+
+from taichi_image import camera_isp, interpolate, bayer, packed
+
+
+class TaichiIsp(Isp):
+  """ ISP using taichi_image Camera16, all calls are run on the TaichiQueue """
+
+  def __init__(self, pattern:BayerPattern, encoding:EncodingType, settings:ImageSettings, device:torch.device):
+    self.settings = settings
+    self.encoding_type = encoding
+    self.device = device
+
+    TaichiQueue.run_sync(self._init_processor, pattern)
+
+  def _init_processor(self, pattern:BayerPattern):
+    transform = interpolate.ImageTransform(Transform(self.settings.transform).name)
+    self.isp = camera_isp.Camera16(taichi_pattern[pattern], 
+                         resize_width=int(self.settings.resize_width), 
+                         moving_alpha=self.settings.moving_average,
+                         transform=transform,
+                         device=self.device)
+    
+  def update_settings(self, settings:ImageSettings):
+    self.settings = settings
+    transform = interpolate.ImageTransform(Transform(settings.transform).name)
+    
+    self.isp.set(moving_alpha=self.settings.moving_average, 
+                 resize_width=int(self.settings.resize_width),
+                 transform=transform)
+
+  def warmup(self, image_sizes:List[Tuple[int, int]]):
+    """ Warm start - run some empty images through to avoid delay at later stage """
+    def f():
+      test_images = [empty_test_image(image_size, self.encoding_type, device=self.device) 
+                     for image_size in image_sizes]
+      
+      self._process_images(test_images)
+
+    TaichiQueue.run_sync(f)
+
+  def process(self, images:List[torch.Tensor], 
+              outputs:Optional[List[torch.Tensor]]=None) -> List[torch.Tensor]:
+    return TaichiQueue.run_sync(self._process_images, images)
+
+  @beartype
+  def _process_images(self, images:List[torch.Tensor]):
+
+    if self.encoding_type == EncodingType.Packed12:
+      load_data = self.isp.load_packed12
+    elif self.encoding_type == EncodingType.Packed12_IDS:
+      load_data = partial(self.isp.load_packed12, ids_format=True)
+    elif self.encoding_type == EncodingType.Packed16:
+      load_data = self.isp.load_packed16
+    elif self.encoding_type == EncodingType.Packed8:
+      load_data = lambda image: self.isp.load_packed16(expand8(image))
+
+
+    images =  [load_data(image) for image in images]
+    settings = self.settings
+
+    if settings.tone_mapping == ToneMapper.linear:
+      outputs = self.isp.tonemap_linear(images, gamma=settings.tone_gamma)
+    elif settings.tone_mapping == ToneMapper.reinhard:
+      outputs = self.isp.tonemap_reinhard(
+        images, gamma=settings.tone_gamma, 
+        intensity = settings.tone_intensity,
+        light_adapt = settings.light_adapt,
+        color_adapt = settings.color_adapt)
+      
+    return outputs
+
+
+def empty_test_image(image_size:Tuple[int, int], encoding:EncodingType=EncodingType.Packed12, 
+                     pattern = bayer.BayerPattern.RGGB, device="cpu"):
+  w, h = image_size
+  test_image = torch.rand( (h, w, 3), dtype=torch.float32, device=device)
+  
+  cfa = bayer.rgb_to_bayer(test_image, pattern=pattern) 
+  return encode_test_image(cfa, encoding)
+
+
+def encode_test_image(cfa:torch.Tensor, encoding:EncodingType) -> torch.Tensor:
+  """ Encode a float bayer image (0-1) as packed rows for the given encoding """
+  if encoding == EncodingType.Packed8:
+    return (cfa * 255).to(torch.uint8)
+  elif encoding == EncodingType.Packed16:
+    return to_packed16((cfa * 65535).to(torch.int32))
+  else:
+    return packed.encode12(cfa, scaled=True) 
+
+
+def to_packed16(image:torch.Tensor) -> torch.Tensor:
+  """ Integer image to little endian 16 bit rows (h, w * 2) """
+  h, w = image.shape
+  return torch.stack([image & 0xFF, image >> 8], dim=-1).to(torch.uint8).view(h, w * 2)
+
+
+def expand8(image:torch.Tensor) -> torch.Tensor:
+  """ 8 bit bayer image (h, w) to 16 bit rows (h, w * 2) with the value in the high byte """
+  h, w = image.shape
+  return torch.stack([torch.zeros_like(image), image], dim=-1).view(h, w * 2)
+
+
+taichi_pattern = {
+    BayerPattern.BGGR: bayer.BayerPattern.BGGR,
+    BayerPattern.RGGB: bayer.BayerPattern.RGGB,
+    BayerPattern.GBRG: bayer.BayerPattern.GBRG,
+    BayerPattern.GRBG: bayer.BayerPattern.GRBG,
+}
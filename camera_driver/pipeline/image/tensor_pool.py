@@ -0,0 +1,153 @@
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock, RLock
+from beartype import beartype
+from beartype.typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+from camera_driver.data import packed_size
+from camera_driver.driver.interface import CameraInfo
+
+from .camera_image import PoolLease, numpy_torch
+
+
+@dataclass
+class PoolStats:
+  hits: int = 0
+  misses: int = 0
+  returned: int = 0
+  free: int = 0
+
+  def __add__(self, other:'PoolStats') -> 'PoolStats':
+    return PoolStats(self.hits + other.hits, self.misses + other.misses, 
+                     self.returned + other.returned, self.free + other.free)
+
+  def __repr__(self):
+    total = max(1, self.hits + self.misses)
+    return f"PoolStats(hits {self.hits} ({100 * self.hits / total:.0f}%), misses {self.misses}, free {self.free})"
+
+
+class TensorPool():
+  """ Pool of fixed shape tensors. 
+  
+      Tensors from acquire() are returned with release() once nothing refers to them (including views),
+      usually through a PoolLease. Tensors never released are garbage collected, and the pool allocates more.
+  """
+
+  @beartype
+  def __init__(self, shape:Tuple[int, ...], dtype:torch.dtype, device:torch.device, 
+               max_free:int=8, pin_memory:bool=False):
+    self.shape = shape
+    self.dtype = dtype
+    self.device = device
+    self.pin_memory = pin_memory and torch.cuda.is_available()
+
+    self.max_free = max_free
+    self.free:Deque[Tuple[torch.Tensor, Optional[torch.cuda.Event]]] = deque()
+    # re-entrant, a lease finalizer may return a tensor during garbage collection within acquire()
+    self.lock = RLock()
+
+    self.counts = PoolStats()
+
+  def acquire(self) -> torch.Tensor:
+    with self.lock:
+      for i in range(len(self.free)):
+        tensor, ready = self.free[i]
+        if ready is None or ready.query():
+          del self.free[i]
+          self.counts.hits += 1
+          return tensor
+        
+      self.counts.misses += 1
+
+    return torch.empty(self.shape, dtype=self.dtype, device=self.device, pin_memory=self.pin_memory)
+
+  def release(self, tensor:torch.Tensor, after:Optional[torch.cuda.Event]=None):
+    """ Return a tensor to the pool, once the (optional) event has completed it can be reused """
+    with self.lock:
+      if len(self.free) < self.max_free:
+        self.free.append((tensor, after))
+        self.counts.returned += 1
+
+  def stats(self) -> PoolStats:
+    with self.lock:
+      return PoolStats(self.counts.hits, self.counts.misses, self.counts.returned, len(self.free))
+    
+  def __repr__(self):
+    return f"TensorPool({list(self.shape)}, {self.dtype}, {self.device}, {self.stats()})"
+
+
+class FramePools():
+  """ Per camera tensor pools for raw images (plus pinned host staging when uploading to cuda) 
+      and processed outputs """
+  
+  @beartype
+  def __init__(self, cameras:Dict[str, CameraInfo], device:torch.device, max_free:int=8):
+    self.device = device
+    self.max_free = max_free
+
+    def raw_shape(info:CameraInfo):
+      return (packed_size(info.image_size, info.encoding),)
+    
+    self.raw = {k:TensorPool(raw_shape(info), torch.uint8, device, max_free=max_free) 
+                for k, info in cameras.items()}
+    
+    self.staging = {k:TensorPool(raw_shape(info), torch.uint8, torch.device('cpu'), 
+                                 max_free=2, pin_memory=True) 
+                for k, info in cameras.items()} if device.type == 'cuda' else {}
+
+    # keyed by shape too, output size depends on the settings
+    self.outputs:Dict[Tuple[str, Tuple[int, ...]], TensorPool] = {}
+    self.lock = Lock()
+
+
+  def upload(self, camera_name:str, arr:np.ndarray) -> Tuple[torch.Tensor, Optional[PoolLease]]:
+    """ Copy image data into a pooled tensor on the device, 
+        returns the tensor and a lease to return it to the pool (None if not pooled) """
+    src = numpy_torch(arr)
+    pool = self.raw[camera_name]
+
+    if src.shape != pool.shape:
+      # Image not the expected size (e.g. padded), fall back to allocating
+      return src.to(device=self.device, copy=True), None
+    
+    dst = pool.acquire()
+    if camera_name in self.staging:
+      staging = self.staging[camera_name]
+      host = staging.acquire()
+      host.copy_(src)
+
+      dst.copy_(host, non_blocking=True)
+      ready = torch.cuda.Event()
+      ready.record()
+      staging.release(host, after=ready)
+    else:
+      dst.copy_(src)
+
+    return dst, PoolLease(pool, dst)
+  
+
+  def output(self, camera_name:str, shape:Tuple[int, ...]) -> Tuple[torch.Tensor, PoolLease]:
+    """ Pooled (uint8) output tensor, and a lease to return it to the pool """
+    key = (camera_name, shape)
+    with self.lock:
+      if key not in self.outputs:
+        self.outputs[key] = TensorPool(shape, torch.uint8, self.device, max_free=self.max_free)
+      pool = self.outputs[key]
+
+    tensor = pool.acquire()
+    return tensor, PoolLease(pool, tensor)
+
+
+  def stats(self) -> Dict[str, PoolStats]:
+    with self.lock:
+      outputs = list(self.outputs.values())
+
+    stats = dict(raw=sum([pool.stats() for pool in self.raw.values()], PoolStats()))
+    if len(self.staging) > 0:
+      stats['staging'] = sum([pool.stats() for pool in self.staging.values()], PoolStats())
+    if len(outputs) > 0:
+      stats['outputs'] = sum([pool.stats() for pool in outputs], PoolStats())
+    return stats
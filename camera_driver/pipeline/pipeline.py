@@ -12,12 +12,15 @@ from pydispatch import Dispatcher
 from camera_driver.camera_group.camera_set import CameraSet
 from camera_driver.camera_group.sync_handler import SyncHandler, TimeQuery
 from camera_driver.camera_group.initializer import Initialiser
-from camera_driver.driver.interface import Buffer
+from camera_driver.camera_group.offset_cache import OffsetCache
+from camera_driver.driver.interface import Buffer, CameraInfo
 
 from .config import CameraPipelineConfig, ImageSettings
-from .image.camera_image import CameraImage
+from .image.camera_image import CameraImage, numpy_torch
+from .image.tensor_pool import FramePools, PoolStats
 from .image.frame_processor import FrameProcessor
 from .image.image_outputs import ImageOutputs
+from .raw_writer import RawGroup
 
 from camera_driver.concurrent.taichi_queue import TaichiQueue
 
@@ -37,7 +40,7 @@ def cameras_from_config(config:CameraPipelineConfig, logger:logging.Logger):
 
   if config.reset_cycle is True:
     manager.reset_cameras(set(config.camera_serials.values()))
-    cameras = manager.wait_for_cameras(config.camera_serials)
+    cameras = manager.wait_for_cameras(config.camera_serials, timeout_sec=config.reset_timeout_sec)
 
   else:
     cameras = {name:manager.init_camera(name, serial)
@@ -47,8 +50,26 @@ def cameras_from_config(config:CameraPipelineConfig, logger:logging.Logger):
   return cameras, manager
 
 
+@beartype
+def check_buffer_leases(camera_info:Dict[str, CameraInfo], in_flight:int, logger:logging.Logger):
+  """ Check the driver has enough buffers for each camera to cover the leased buffers in flight """
+  for k, info in camera_info.items():
+    if info.buffer_count is None:
+      logger.warning(f"{k}: buffer count unknown, can't check {in_flight} leased buffers are available")
+    elif info.buffer_count < in_flight:
+      raise ValueError(f"{k}: {info.buffer_count} buffers can't cover {in_flight} leased buffers in flight, "
+                       "increase the stream buffer count or disable buffer_leases")
+
+
+def use_buffer_leases(config:CameraPipelineConfig, logger:logging.Logger) -> bool:
+  if config.buffer_leases and torch.device(config.device).type != 'cpu':
+    logger.warning(f"buffer_leases ignored, images are copied to {config.device} anyway")
+    return False
+  return config.buffer_leases
+
+
 class CameraPipeline(Dispatcher):
-  _events_ = ["on_image_set", "on_drop", "on_stopped", "on_settings"]
+  _events_ = ["on_image_set", "on_raw_set", "on_drop", "on_stopped", "on_settings"]
 
   @beartype
   def __init__(self, config:CameraPipelineConfig, 
@@ -61,29 +82,55 @@ class CameraPipeline(Dispatcher):
     cameras, manager = cameras_from_config(config, logger)
 
 
-    for k, camera in cameras.items():
-      camera.setup_mode("master" if k == config.master else "slave")
-      camera.update_properties(config.parameters.camera_properties)
-
-    self.camera_set = CameraSet(cameras, logger, master=config.master)
+    self.camera_set = CameraSet(cameras, logger, master=config.master, ingest_size=config.ingest_size,
+                                ingest_policy=config.queue_policies.get("ingest"))
+    self.camera_set.setup({k:"master" if k == config.master else "slave" for k in cameras}, 
+                          config.parameters.camera_properties)
 
     self.sync_handler = None
     self.init = None
+    self.offset_cache = OffsetCache(logger, config.offset_cache)
 
     self.manager = manager
     self.logger = logger
 
-    self.camera_info = {name:camera.camera_info() for name, camera in cameras.items()}
+    if config.raw_passthrough:
+      if config.buffer_leases:
+        logger.warning("buffer_leases ignored with raw_passthrough")
+      self.lease_buffers = False
+    else:
+      self.lease_buffers = use_buffer_leases(config, logger)
+
+    # one being grouped, plus queued and in-progress image sets
+    leased = 1 + 2 * config.process_workers
+    if self.lease_buffers:
+      self.camera_set.reserve_buffers(leased)
+
+    self.camera_info = self.camera_set.camera_info()
 
     for info in self.camera_info.values():
       logger.info(str(info))
 
-    self.processor = FrameProcessor(self.camera_info, settings=config.parameters, 
-                                    logger=logger, device=torch.device(config.device), 
-                                    num_workers=config.process_workers, max_size=config.process_workers)
-  
+    if self.lease_buffers:
+      # checked before starting the processor, which would otherwise be left running
+      check_buffer_leases(self.camera_info, leased, logger)
+      logger.info(f"Leasing buffers, incomplete groups hold buffers for up to {config.timeout_msec}ms")
 
-    self.processor.bind(on_frame=self._on_image_set)
+    self.processor = None
+    self.raw_pools = None
+
+    if config.raw_passthrough:
+      # packed images are copied to the host and emitted as groups, without processing
+      if config.tensor_pools:
+        self.raw_pools = FramePools(self.camera_info, torch.device('cpu'))
+    else:
+      self.processor = FrameProcessor(self.camera_info, settings=config.parameters, 
+                                      logger=logger, device=torch.device(config.device), 
+                                      num_workers=config.process_workers, max_size=config.process_workers,
+                                      queue_policy=config.queue_policy("frame_processor"),
+                                      ordered=config.ordered_output, tensor_pools=config.tensor_pools,
+                                      isp=config.isp)
+      self.processor.bind(on_frame=self._on_image_set)
 
     
   def _on_buffer(self, buffer:Buffer):
@@ -102,13 +149,39 @@ class CameraPipeline(Dispatcher):
   def _on_image_set(self, group:Dict[str, ImageOutputs]):
     self.emit("on_image_set", group)
   
+  def _process_group(self, group:Dict[str, CameraImage]):
+    # groups may be a subset of cameras (see partial_groups)
+    self.processor.process_image_set(group, partial=True)
+
+  def _on_raw_set(self, group:Dict[str, CameraImage]):
+    self.emit("on_raw_set", RawGroup(images=group, 
+      clock_offsets=self.sync_handler.time_offsets, settings=self.config.parameters))
+
   def _process_buffer(self, buffer:Buffer):
     now = self.query_time()
-    return CameraImage.from_buffer(buffer, now, self.processor.device)
+    if self.processor is None:
+      return self._raw_image(buffer, now)
+
+    return self.processor.image_from_buffer(buffer, now, lease=self.lease_buffers)
+
+  def _raw_image(self, buffer:Buffer, clock_time_sec:float):
+    pooled = None
+    if self.raw_pools is not None:
+      image_data, pooled = self.raw_pools.upload(buffer.camera_name, buffer.image_data)
+    else:
+      image_data = numpy_torch(buffer.image_data).clone()
+
+    return CameraImage.from_buffer(buffer, clock_time_sec, torch.device('cpu'), image_data=image_data, lease=pooled)
 
 
+  def pool_stats(self) -> Dict[str, PoolStats]:
+    if self.processor is not None:
+      return self.processor.pool_stats()
+    return self.raw_pools.stats() if self.raw_pools is not None else {}
+
   def update_settings(self, image_settings:ImageSettings):
-    self.processor.update_settings(image_settings)
+    if self.processor is not None:
+      self.processor.update_settings(image_settings)
 
     if self.is_started:
       self.camera_set.update_properties(image_settings.camera_properties)
@@ -117,11 +190,17 @@ class CameraPipeline(Dispatcher):
     self.emit("on_settings", image_settings)
 
   def initialize_offsets(self):
+      cached = self.offset_cache.lookup(self.config.camera_serials, self.query_time())
+      if cached is not None:
+        self.logger.info("Validating cached clock offsets")
+
       self.init = Initialiser(self.camera_set.camera_ids, 
                          self.query_time, 
                 init_window=self.config.init_window, 
                 sync_threshold=self.config.sync_threshold_msec / 1000., 
-                logger=self.logger)
+                logger=self.logger,
+                expected=cached,
+                expected_tolerance=self.config.offset_cache_tolerance_msec / 1000.)
       
       self.camera_set.bind(on_buffer=self._on_buffer)
       self.camera_set.start()
@@ -129,17 +208,21 @@ class CameraPipeline(Dispatcher):
       offsets = wait_for(self.init, 'initialized', self.config.init_timeout_msec / 1000.)
       # self.camera_set.stop()
 
+      init, self.init = self.init, None
+      init.stop()
+
       if offsets is None:
-        raise InitException(f"Failed to initialize camera offsets, recieved: {self.init.frame_counts()}, minimum frames: {self.config.init_window}")
+        raise InitException(f"Failed to initialize camera offsets, recieved: {init.frame_counts()}, minimum frames: {self.config.init_window}")
 
-      self.init = None
       return offsets
 
   def create_sync(self):
     has_latching = all([info.has_latching for info in self.camera_info.values()])
 
     if has_latching:
-      timestamp_offsets = self.camera_set.compute_clock_offsets(self.query_time)
+      latched = self.camera_set.compute_clock_offsets(self.query_time, 
+                    tolerance_sec=self.config.latch_tolerance_usec / 1e6, max_samples=self.config.latch_samples)
+      timestamp_offsets = {k:offset.offset_sec for k, offset in latched.items()}
     else:
       timestamp_offsets = self.initialize_offsets()
 
@@ -155,9 +238,19 @@ class CameraPipeline(Dispatcher):
                                     process_buffer = self._process_buffer,
                                     query_time=self.query_time, 
                                     logger=self.logger,
-                                    num_workers=self.config.sync_workers)    
-
-    self.sync_handler.bind(on_group=self.processor.process_image_set)
+                                    num_workers=self.config.sync_workers,
+                                    queue_policy=self.config.queue_policy("sync_handler"),
+                                    release_buffers=not self.lease_buffers,
+                                    clock_model=self.config.clock_model.create(
+                                      timestamp_offsets, window=self.config.clock_window),
+                                    partial_policy=self.config.partial_groups,
+                                    grouping=self.config.group_by,
+                                    discard_frame=lambda image: image.release_lease())
+
+    if self.processor is not None:
+      self.sync_handler.bind(on_group=self._process_group)
+    else:
+      self.sync_handler.bind(on_group=self._on_raw_set)
     self.sync_handler.bind(on_drop=self._on_drop)
 
 
@@ -187,6 +280,27 @@ class CameraPipeline(Dispatcher):
   @property
   def is_started(self):
     return self.camera_set.is_started
+  
+  @property
+  def is_paused(self):
+    return self.camera_set.is_paused
+
+  def pause(self):
+    """ Stop acquisition, keeping camera streams, buffers and synchronisation state for a quick resume() """
+    if not self.is_started or self.is_paused:
+      self.logger.info("Camera pipeline not running, can't pause")
+      return
+
+    self.camera_set.pause()
+    self.logger.info("Paused camera pipeline")
+
+  def resume(self):
+    if not self.is_paused:
+      self.logger.info("Camera pipeline not paused")
+      return
+
+    self.camera_set.resume()
+    self.logger.info("Resumed camera pipeline")
 
   def stop(self):
     if not self.is_started:
@@ -200,7 +314,17 @@ class CameraPipeline(Dispatcher):
 
     self.sync_handler.flush()
 
+    # leased buffers must be back with the driver before the cameras stop
+    if self.processor is not None:
+      self.processor.flush()
+
+    self.offset_cache.store(self.config.camera_serials, self.sync_handler.host_offsets, 
+                            self.sync_handler.clock_drifts, self.query_time())
+
     self.camera_set.stop()
+    for name, stats in self.pool_stats().items():
+      self.logger.info(f"Tensor pool {name}: {stats}")
+
     self.logger.info("Stopped camera pipeline")
     self.emit("on_stopped")
 
@@ -208,7 +332,8 @@ class CameraPipeline(Dispatcher):
   def release(self):
     self.stop()
 
-    self.processor.stop()
+    if self.processor is not None:
+      self.processor.stop()
     del self.camera_set
 
     self.manager.release()
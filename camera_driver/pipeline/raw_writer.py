@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from enum import Enum
+import json
+import logging
+import lzma
+from pathlib import Path
+import zlib
+from beartype.typing import Dict, Optional, Tuple
+from beartype import beartype
+
+import numpy as np
+from omegaconf import OmegaConf
+
+from camera_driver.concurrent.work_queue import WorkQueue
+
+from .config import ImageSettings
+from .image.camera_image import CameraImage
+
+
+class Compression(Enum):
+  none = "none"
+  zlib = "zlib"
+  lzma = "lzma"
+
+  @property
+  def extension(self) -> str:
+    return {Compression.none: ".raw", Compression.zlib: ".raw.zlib", Compression.lzma: ".raw.xz"}[self]
+
+  def compress(self, data, level:int) -> bytes:
+    # both zlib and lzma release the GIL, so workers compress in parallel
+    match self:
+      case Compression.none:  return data
+      case Compression.zlib:  return zlib.compress(data, level)
+      case Compression.lzma:  return lzma.compress(data, preset=level)
+
+  def decompress(self, data:bytes) -> bytes:
+    match self:
+      case Compression.none:  return data
+      case Compression.zlib:  return zlib.decompress(data)
+      case Compression.lzma:  return lzma.decompress(data)
+
+
+@beartype
+@dataclass
+class RawGroup:
+  """ A synchronised group of packed (unprocessed) camera images.
+      Images may hold pooled tensors, returned to the pool by CameraImage.release_lease() """
+  images: Dict[str, CameraImage]
+  clock_offsets: Dict[str, float]
+  settings: ImageSettings
+
+  @property
+  def timestamp_sec(self) -> float:
+    return next(iter(self.images.values())).timestamp_sec
+
+
+class RawWriter():
+  """ Writes packed images as they come off the wire, with a json metadata file per group:
+
+      output_dir/group_000000.json
+      output_dir/<camera>/raw_000000.raw[.zlib|.xz]
+
+      Pooled images are released once written, other consumers shouldn't keep their image data.
+  """
+
+  @beartype
+  def __init__(self, output_dir:str, logger:logging.Logger,
+               compression:Compression=Compression.zlib, level:int=1,
+               num_workers:int=4, max_size:Optional[int]=None):
+    self.output_dir = Path(output_dir)
+    self.compression = compression
+    self.level = level
+    self.counter = 0
+
+    self.queue = WorkQueue("raw_writer", self._write, logger=logger,
+                           num_workers=num_workers, max_size=max_size or num_workers * 4)
+    self.queue.start()
+    self.logger = logger
+
+  def image_filename(self, camera_name:str, index:int) -> Path:
+    return Path(camera_name) / f"raw_{index:06d}{self.compression.extension}"
+
+  def write_group(self, group:RawGroup):
+    index = self.counter
+    self.counter = self.counter + 1
+
+    cameras = {k:dict(
+        file = str(self.image_filename(k, index)),
+        clock_time_sec = image.clock_time_sec,
+        clock_offset = group.clock_offsets.get(k),
+        encoding = image.encoding.value,
+        image_size = list(image.image_size),
+        size_bytes = image.image_data.numel())
+      for k, image in group.images.items()}
+
+    metadata = dict(
+      index = index,
+      timestamp_sec = group.timestamp_sec,
+      compression = self.compression.value,
+      settings = OmegaConf.to_container(OmegaConf.structured(group.settings), enum_to_str=True),
+      cameras = cameras)
+
+    for k, image in group.images.items():
+      self.queue.enqueue((self.output_dir / cameras[k]['file'], image))
+    self.queue.enqueue((self.output_dir / f"group_{index:06d}.json", metadata))
+
+  def _write(self, item:Tuple[Path, CameraImage | dict]):
+    filename, data = item
+    filename.parent.mkdir(parents=True, exist_ok=True)
+
+    if isinstance(data, dict):
+      with open(filename, "w") as f:
+        json.dump(data, f, indent=2)
+    else:
+      raw = np.ascontiguousarray(data.image_data.cpu().numpy())
+      with open(filename, "wb") as f:
+        f.write(self.compression.compress(raw, self.level))
+
+      del raw
+      data.release_lease()
+
+  def stop(self):
+    self.queue.stop()
+
+
+def read_raw_group(filename:str) -> Tuple[dict, Dict[str, np.ndarray]]:
+  """ Read group metadata and packed images (uint8 rows) written by RawWriter """
+  path = Path(filename)
+  with open(path) as f:
+    metadata = json.load(f)
+
+  compression = Compression(metadata['compression'])
+  images = {}
+  for k, camera in metadata['cameras'].items():
+    with open(path.parent / camera['file'], "rb") as f:
+      data = np.frombuffer(compression.decompress(f.read()), dtype=np.uint8)
+
+    w, h = camera['image_size']
+    images[k] = data.reshape(h, -1)
+
+  return metadata, images
+
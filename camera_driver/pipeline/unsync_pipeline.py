@@ -3,18 +3,20 @@ import logging
 from beartype.typing import Dict
 
 from camera_driver.concurrent.work_queue import WorkQueue
-from camera_driver.pipeline.pipeline import cameras_from_config
+from camera_driver.pipeline.pipeline import cameras_from_config, check_buffer_leases, use_buffer_leases
 import torch
 from beartype import beartype
 from pydispatch import Dispatcher
 
 from camera_driver.camera_group.camera_set import CameraSet
 from camera_driver.camera_group.sync_handler import TimeQuery
-from camera_driver.driver.interface import Buffer
+from camera_driver.driver.interface import Buffer, CameraInfo
 
 from .config import CameraPipelineConfig, ImageSettings
+from .frame_batcher import FrameBatcher
 from .image.camera_image import CameraImage
 from .image.frame_processor import FrameProcessor
+from .image.tensor_pool import PoolStats
 from .image.image_outputs import ImageOutputs
 
 from camera_driver.concurrent.taichi_queue import TaichiQueue
@@ -33,53 +35,103 @@ class CameraPipelineUnsync(Dispatcher):
     self.query_time = query_time
 
     cameras, manager = cameras_from_config(config, logger)
-    for k, camera in cameras.items():
-      camera.setup_mode(config.default_mode)
-      camera.update_properties(config.parameters.camera_properties)
-
-    self.camera_set = CameraSet(cameras, logger, master=config.master)
+    self.camera_set = CameraSet(cameras, logger, master=config.master, ingest_size=config.ingest_size,
+                                ingest_policy=config.queue_policies.get("ingest"))
+    self.camera_set.setup({k:config.default_mode for k in cameras}, config.parameters.camera_properties)
 
     self.manager = manager
     self.logger = logger
 
     self.device = torch.device(config.device)
-    self.camera_info = {name:camera.camera_info() for name, camera in cameras.items()}
+
+    self.lease_buffers = use_buffer_leases(config, logger)
+
+    # one being handled, plus one waiting in a batch and queued and in-progress images
+    workers = config.process_workers if config.batch_window_msec > 0 else 1
+    leased = 2 + 2 * workers
+    if self.lease_buffers:
+      self.camera_set.reserve_buffers(leased)
+
+    self.camera_info = self.camera_set.camera_info()
 
     for info in self.camera_info.values():
       logger.info(str(info))
 
+    if self.lease_buffers:
+      # before any worker threads exist, so a failure leaves nothing running
+      check_buffer_leases(self.camera_info, leased, logger)
+
     self.work_queue = WorkQueue("buffer_handler", self._process_buffer, 
-                                logger=logger, num_workers=1)
+                                logger=logger, num_workers=1,
+                                policy=config.queue_policy("buffer_handler"), on_drop=lambda buffer: buffer.release())
     self.work_queue.start()
 
-  
-    def frame_processor(k):
-      processor = FrameProcessor({k:self.camera_info[k]}, settings=config.parameters, 
-                            logger=logger, device=torch.device(config.device), max_size=1, num_workers=1)
+
+    def frame_processor(cameras:Dict[str, CameraInfo], num_workers:int):
+      processor = FrameProcessor(cameras, settings=config.parameters, 
+                            logger=logger, device=torch.device(config.device), 
+                            max_size=num_workers, num_workers=num_workers,
+                            queue_policy=config.queue_policy("frame_processor"),
+                            tensor_pools=config.tensor_pools, isp=config.isp)
       processor.bind(on_frame=self._on_image)
       return processor
 
-    self.processors = {k:frame_processor(k) for k in cameras.keys()}
+    self.batcher = None
+    if config.batch_window_msec > 0:
+      # One shared processor for all cameras, fed with batches of frames
+      self.batch_processor = frame_processor(self.camera_info, num_workers=config.process_workers)
+      self.processors = {k:self.batch_processor for k in cameras.keys()}
+
+      self.batcher = FrameBatcher(config.batch_window_msec / 1000., 
+                                  max_size=config.batch_size or len(cameras), logger=logger)
+      self.batcher.bind(on_batch=self._on_batch)
+      self.batcher.start()
+    else:
+      self.processors = {k:frame_processor({k:self.camera_info[k]}, num_workers=1) 
+                         for k in cameras.keys()}
   
 
   def _on_image(self, group:Dict[str, ImageOutputs]):
-    outputs = list(group.values())[0]
-    self.emit("on_image", outputs)
+    for outputs in group.values():
+      self.emit("on_image", outputs)
     self.emit("on_image_set", group)
   
 
+  def _on_batch(self, batch:Dict[str, CameraImage]):
+    self.batch_processor.process_image_set(batch, partial=True)
+
+  def _on_buffer(self, buffer:Buffer):
+    if self.work_queue.started:
+      self.work_queue.enqueue(buffer)   # released by _process_buffer, or on_drop
+    else:
+      buffer.release()
+
   def _process_buffer(self, buffer:Buffer):
     now = self.query_time()
-    image = CameraImage.from_buffer(buffer, now, self.device)
-    buffer.release()
-
-    k = image.camera_name
-    self.processors[k].process_image_set({k:image})
+    k = buffer.camera_name
+    
+    try:
+      image = self.processors[k].image_from_buffer(buffer, now, lease=self.lease_buffers)
+    finally:
+      if not self.lease_buffers:
+        buffer.release()
+
+    if self.batcher is not None:
+      self.batcher.push_image(image)
+    else:
+      self.processors[k].process_image_set({k:image})
   
 
 
+  def pool_stats(self) -> Dict[str, PoolStats]:
+    stats = {}
+    for processor in set(self.processors.values()):
+      for name, pool in processor.pool_stats().items():
+        stats[name] = stats.get(name, PoolStats()) + pool
+    return stats
+
   def update_settings(self, image_settings:ImageSettings):
-    for processor in self.processors.values():
+    for processor in set(self.processors.values()):
       processor.update_settings(image_settings)
 
     if self.is_started:
@@ -97,7 +149,12 @@ class CameraPipelineUnsync(Dispatcher):
 
     self.logger.info("Starting camera pipeline")
     
-    self.camera_set.bind(on_buffer=self.work_queue.enqueue)  
+    if not self.work_queue.started:
+      self.work_queue.start()   # stopped by stop()
+    if self.batcher is not None and not self.batcher.started:
+      self.batcher.start()
+
+    self.camera_set.bind(on_buffer=self._on_buffer)
     self.camera_set.start()
 
     self.logger.info("Started camera pipeline")
@@ -107,6 +164,27 @@ class CameraPipelineUnsync(Dispatcher):
   def is_started(self):
     return self.camera_set.is_started
 
+  @property
+  def is_paused(self):
+    return self.camera_set.is_paused
+
+  def pause(self):
+    """ Stop acquisition, keeping camera streams and buffers for a quick resume() """
+    if not self.is_started or self.is_paused:
+      self.logger.info("Camera pipeline not running, can't pause")
+      return
+
+    self.camera_set.pause()
+    self.logger.info("Paused camera pipeline")
+
+  def resume(self):
+    if not self.is_paused:
+      self.logger.info("Camera pipeline not paused")
+      return
+
+    self.camera_set.resume()
+    self.logger.info("Resumed camera pipeline")
+
   def stop(self):
     if not self.is_started:
       self.logger.info("Camera pipeline already stopped")
@@ -117,8 +195,18 @@ class CameraPipelineUnsync(Dispatcher):
     self.camera_set.unbind_cameras()
 
     self.work_queue.stop()
+
+    # emit the remaining batches and process them, so leased buffers are returned before the cameras stop
+    if self.batcher is not None:
+      self.batcher.stop()
+    for processor in set(self.processors.values()):
+      processor.flush()
+
     self.camera_set.stop()
 
+    for name, stats in self.pool_stats().items():
+      self.logger.info(f"Tensor pool {name}: {stats}")
+
     self.logger.info("Stopped camera pipeline")
     self.emit("on_stopped")
 
@@ -127,7 +215,10 @@ class CameraPipelineUnsync(Dispatcher):
     if self.is_started:
       self.stop()
 
-    for processor in self.processors.values():
+    if self.batcher is not None:
+      self.batcher.stop()
+
+    for processor in set(self.processors.values()):
       processor.stop()
 
     self.manager.release()
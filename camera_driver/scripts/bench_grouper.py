@@ -0,0 +1,111 @@
+import argparse
+import logging
+from time import perf_counter
+
+import numpy as np
+
+from camera_driver.camera_group.clock_model import ClockModelType
+from camera_driver.camera_group.frame_id_grouper import GroupingMode
+from camera_driver.data import Timestamped
+
+
+def simulate_frames(args) -> tuple[list[Timestamped], dict[str, float]]:
+  """ Frames from cameras on a shared trigger, with per camera clock offsets, jitter,
+      callback latency (so arrival order is shuffled) and randomly dropped frames.
+      Frame ids count from a random start per camera, and skip a count where a camera
+      misses a trigger without counting it (uncounted_rate) """
+  rng = np.random.default_rng(args.seed)
+  cameras = [f"cam{i}" for i in range(args.cameras)]
+  offsets = rng.uniform(-1000, 1000, len(cameras))
+  drifts = rng.normal(0, args.drift_ppm * 1e-6, len(cameras))
+  frame_ids = rng.integers(0, 10000, len(cameras))
+
+  frames = []
+  for n in range(int(args.seconds * args.fps)):
+    trigger = n / args.fps
+
+    for i, (camera, offset, drift) in enumerate(zip(cameras, offsets, drifts)):
+      if rng.random() < args.uncounted_rate:
+        frame_ids[i] -= 1
+        continue
+
+      frame_id = int(frame_ids[i] + n)
+      if rng.random() < args.drop_rate:
+        continue
+
+      timestamp = trigger + rng.normal(0, args.jitter_msec / 1000.)
+      arrival = trigger + rng.exponential(args.latency_msec / 1000.)
+      frames.append(Timestamped(timestamp * (1 + drift) - offset, arrival, camera, frame_id=frame_id))
+
+  frames.sort(key=lambda frame: frame.clock_time_sec)
+  return frames, {camera:offset for camera, offset in zip(cameras, offsets)}
+
+
+def run(args, frames:list[Timestamped], offsets:dict[str, float], 
+        clock_model:ClockModelType, grouping:GroupingMode, logger:logging.Logger):
+  grouper = grouping.create(dict(offsets), args.threshold_msec / 1000., 
+                            clock_model=clock_model.create(offsets), logger=logger)
+  timeout = args.timeout_msec / 1000.
+
+  completed, timed_out, max_open, mismatched = 0, 0, 0, 0
+  spread = []
+  times = np.zeros(len(frames))
+
+  for i, frame in enumerate(frames):
+    start = perf_counter()
+
+    group = grouper.add_frame(frame)
+    if group is not None:
+      grouper.update_offsets(group)
+      completed += 1
+      spread.append(np.abs(group.time_offset_vec).max())
+      # frames from different triggers are (at least) a frame period apart
+      mismatched += spread[-1] > 0.5 / args.fps
+
+    timed_out += len(grouper.timeout_groups(frame.clock_time_sec - timeout))
+
+    times[i] = perf_counter() - start
+    max_open = max(max_open, len(grouper.groups))
+
+  us = times * 1e6
+  logger.info(f"{grouping.value}, {clock_model.value}: {len(frames)} frames, {args.cameras} cameras at {args.fps}fps: "
+              f"{completed} groups complete ({mismatched} mismatched), {timed_out} timed out, "
+              f"up to {max_open} open groups, mean max deviation {np.mean(spread) * 1e6:.1f}us")
+  logger.info(f"Per frame: mean {us.mean():.1f}us, p50 {np.percentile(us, 50):.1f}us, "
+              f"p99 {np.percentile(us, 99):.1f}us, max {us.max():.1f}us "
+              f"({us.sum() / 1e6 / args.seconds * 100:.1f}% of one core)")
+
+
+def main():
+  logger = logging.getLogger(__name__)
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+  parser = argparse.ArgumentParser(description="Benchmark per-frame cost of FrameGrouper")
+  parser.add_argument("--cameras", type=int, default=50, help="Number of cameras")
+  parser.add_argument("--fps", type=float, default=100.0, help="Frame rate")
+  parser.add_argument("--seconds", type=float, default=20.0, help="Duration to simulate")
+  parser.add_argument("--timeout_msec", type=float, default=2000.0, help="Group timeout")
+  parser.add_argument("--threshold_msec", type=float, default=2.0, help="Sync threshold")
+  parser.add_argument("--drop_rate", type=float, default=0.01, help="Fraction of frames dropped")
+  parser.add_argument("--uncounted_rate", type=float, default=0.0, 
+                      help="Fraction of triggers missed without incrementing the frame id")
+  parser.add_argument("--jitter_msec", type=float, default=0.1, help="Timestamp jitter")
+  parser.add_argument("--latency_msec", type=float, default=5.0, help="Mean arrival latency")
+  parser.add_argument("--drift_ppm", type=float, default=20.0, help="Std. deviation of camera clock drift")
+  parser.add_argument("--clock_model", nargs="+", default=[c.value for c in ClockModelType], 
+                      choices=[c.value for c in ClockModelType], help="Clock models to compare")
+  parser.add_argument("--grouping", nargs="+", default=[g.value for g in GroupingMode], 
+                      choices=[g.value for g in GroupingMode], help="Grouping modes to compare")
+  parser.add_argument("--seed", type=int, default=0)
+
+  args = parser.parse_args()
+  logger.info(str(args))
+
+  frames, offsets = simulate_frames(args)
+  for grouping in map(GroupingMode, args.grouping):
+    for clock_model in map(ClockModelType, args.clock_model):
+      run(args, frames, offsets, clock_model, grouping, logger)
+
+
+if __name__ == "__main__":
+  main()
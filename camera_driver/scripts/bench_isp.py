@@ -0,0 +1,102 @@
+import argparse
+import logging
+from time import perf_counter
+
+import cv2
+import numpy as np
+import torch
+
+from camera_driver import pipeline
+from camera_driver.data import BayerPattern, EncodingType, unpack
+from camera_driver.pipeline.image.isp import create_isp
+
+
+def test_image(filename:str | None, image_size:tuple[int, int]) -> np.ndarray:
+  """ RGGB bayer image (12 bit) from an image file or random noise """
+  if filename is not None:
+    rgb = cv2.cvtColor(cv2.imread(filename, cv2.IMREAD_UNCHANGED), cv2.COLOR_BGR2RGB)
+    scale = 4095 / np.iinfo(rgb.dtype).max
+  else:
+    w, h = image_size
+    rgb = np.random.randint(0, 4096, (h, w, 3), dtype=np.uint16)
+    scale = 1.0
+
+  h, w, _ = rgb.shape
+  rgb = rgb[:h // 2 * 2, :w // 4 * 4]
+
+  cfa = np.empty(rgb.shape[:2], dtype=np.uint16)
+  cfa[0::2, 0::2] = rgb[0::2, 0::2, 0] * scale
+  cfa[0::2, 1::2] = rgb[0::2, 1::2, 1] * scale
+  cfa[1::2, 0::2] = rgb[1::2, 0::2, 1] * scale
+  cfa[1::2, 1::2] = rgb[1::2, 1::2, 2] * scale
+  return cfa
+
+
+def main():
+  logger = logging.getLogger(__name__)
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+  parser = argparse.ArgumentParser(description="Compare ISP engines on the same packed 12 bit inputs")
+  parser.add_argument("--filename", default=None, help="Path to image file (default random)")
+  parser.add_argument("--image_size", type=int, nargs=2, default=(4096, 3000), help="Random image size (w h)")
+  parser.add_argument("--isp", nargs="+", default=[t.value for t in pipeline.IspType],
+                      choices=[t.value for t in pipeline.IspType], help="ISP engines to compare")
+  parser.add_argument("--device", default="cuda", help="Device for the taichi engine")
+  parser.add_argument("--resize_width", type=int, default=0, help="Resize width")
+  parser.add_argument("--transform", type=str, default='none', help="Transformation to apply")
+  parser.add_argument("--tone_mapping", type=str, default='reinhard', help="Tone mapper (linear|reinhard)")
+  parser.add_argument("--n", type=int, default=6, help="Number of cameras per batch")
+  parser.add_argument("--frames", type=int, default=50, help="Number of batches to process")
+
+  args = parser.parse_args()
+  logger.info(str(args))
+
+  settings = pipeline.ImageSettings(
+      resize_width=args.resize_width,
+      tone_mapping=pipeline.ToneMapper[args.tone_mapping],
+      transform=pipeline.Transform[args.transform])
+
+  cfa = test_image(args.filename, tuple(args.image_size))
+  h, w = cfa.shape
+  packed = torch.from_numpy(unpack.encode12(cfa))
+
+  logger.info(f"Benchmarking {w}x{h} with {args.n} cameras")
+
+  results = {}
+  for isp_type in map(pipeline.IspType, args.isp):
+    device = torch.device(args.device if isp_type == pipeline.IspType.taichi else "cpu")
+    isp = create_isp(isp_type, BayerPattern.RGGB, EncodingType.Packed12, settings, device)
+    isp.warmup([(w, h)])
+
+    images = [packed.to(device) for _ in range(args.n)]
+
+    start = perf_counter()
+    for _ in range(args.frames):
+      outputs = isp.process(images)
+    if device.type == 'cuda':
+      torch.cuda.synchronize()
+    elapsed = perf_counter() - start
+
+    isp.stop()
+    results[isp_type] = outputs[0].cpu().numpy()
+
+    rate = args.frames / elapsed
+    logger.info(f"{isp_type.value}: {1000 / rate:.1f}ms per batch, {rate:.1f} batches/s, "
+                f"{rate * args.n * w * h / 1e6:.1f} Mpix/s")
+
+  if len(results) > 1:
+    (a_type, a), (b_type, b) = list(results.items())[:2]
+    if a.shape == b.shape:
+      diff = np.abs(a.astype(np.float32) - b.astype(np.float32))
+      logger.info(f"{a_type.value} vs {b_type.value}: mean abs diff {diff.mean():.2f}, max {diff.max():.0f} (of 255)")
+    else:
+      logger.info(f"{a_type.value} vs {b_type.value}: output shapes differ {a.shape} {b.shape}")
+
+  if pipeline.IspType.taichi in results:
+    from camera_driver.concurrent.taichi_queue import TaichiQueue
+    TaichiQueue.stop()
+
+
+if __name__ == "__main__":
+  with torch.inference_mode():
+    main()
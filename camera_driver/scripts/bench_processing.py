@@ -1,60 +1,39 @@
 import argparse
 import logging
 
+from time import perf_counter
+from beartype.typing import Tuple
+
 import torch
 from taichi_image import bayer
 from taichi_image.test.camera_isp import load_test_image
 from tqdm import tqdm
 
 from camera_driver.concurrent.taichi_queue import TaichiQueue
-from camera_driver.concurrent.work_queue import WorkQueue
-from camera_driver.data.encoding import ImageEncoding
+from camera_driver.data.encoding import ImageEncoding, encoding_type, packed_size
+from camera_driver.pipeline.image.taichi_isp import encode_test_image
 
 from camera_driver import pipeline
 
-def main():
-  logger = logging.getLogger(__name__)
-  logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+bit_encodings = {
+  8: ImageEncoding.Bayer_BGGR8,
+  12: ImageEncoding.Bayer_BGGR12,
+  16: ImageEncoding.Bayer_BGGR16,
+}
 
 
+def bench_encoding(args, logger:logging.Logger, image_settings:pipeline.ImageSettings, 
+                   encoding:ImageEncoding, test_image:torch.Tensor, image_size:Tuple[int, int]) -> float:
+  w, h = image_size
 
-  parser = argparse.ArgumentParser()
-  parser.add_argument("filename", help="Path to image file")
-  parser.add_argument("--device", default="cuda", help="Device to use for processing")
-  parser.add_argument("--resize_width", type=int, default=0, help="Resize width")
-  parser.add_argument("--transform", type=str, default='none', help="Transformation to apply")
-  parser.add_argument("--preload", action="store_true", help="Preload imges to cuda")
-  parser.add_argument("--n", type=int, default=12, help="Number of cameras to test")
-  parser.add_argument("--frames", type=int, default=300, help="Number of cameras to test")
-  parser.add_argument("--no_compress", action="store_true", help="Disable compression")
-
-  args = parser.parse_args()
-
-
-  logging.info(str(args))
-  image_settings= pipeline.ImageSettings(
-      jpeg_quality=94,
-      preview_size=200,
-      resize_width=args.resize_width,
-      tone_mapping=pipeline.ToneMapper.reinhard,
-      tone_gamma= 1.0,
-      tone_intensity= 1.0,
-      color_adapt=0.0,
-      light_adapt=0.5,
-      transform=pipeline.Transform[args.transform]
-  )
-
-  test_packed, test_image  = TaichiQueue.run_sync(load_test_image, 
-                                args.filename, bayer.BayerPattern.RGGB)
-  test_packed = torch.from_numpy(test_packed)
+  cfa = TaichiQueue.run_sync(bayer.rgb_to_bayer, torch.as_tensor(test_image), pattern=bayer.BayerPattern.BGGR)
+  test_packed = TaichiQueue.run_sync(encode_test_image, cfa, encoding_type(encoding)).cpu()
 
   if args.preload:
       test_packed = test_packed.cuda()
 
-  h, w, _ = test_image.shape
-  logger.info(f"Benchmarking on {args.filename}: {w}x{h} with {args.n} cameras")
+  logger.info(f"Benchmarking {encoding.value} on {args.filename}: {w}x{h} with {args.n} cameras")
 
-  encoding = ImageEncoding.Bayer_BGGR12
   camera_info = {f"cam{n}":pipeline.CameraInfo(
       name="cam{n}",
       serial="{n}"*5,
@@ -66,7 +45,8 @@ def main():
   frame_processor = pipeline.FrameProcessor(camera_info, 
               settings = image_settings,
               device=torch.device(args.device), 
-              logger=logger)
+              logger=logger,
+              isp=pipeline.IspType(args.isp))
 
 
   pbar = tqdm(total=int(args.frames))
@@ -80,10 +60,6 @@ def main():
 
     pbar.update(1)
 
-  processor = WorkQueue("publisher", run=on_frame, num_workers=4, max_size=4, logger=logger)
-  processor.start()
-
-
   images = {f"cam{n}":pipeline.CameraImage(
     camera_name=f"cam{n}",
     image_data=test_packed.clone(),
@@ -94,11 +70,61 @@ def main():
 
   frame_processor.bind(on_frame=on_frame)
       
+  start = perf_counter()
   for _ in range(int(args.frames)):
     frame_processor.process_image_set(images)
 
   frame_processor.stop()
-  processor.stop()
+  pbar.close()
+
+  return args.frames / (perf_counter() - start)
+
+
+def main():
+  logger = logging.getLogger(__name__)
+  logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+
+
+
+  parser = argparse.ArgumentParser()
+  parser.add_argument("filename", help="Path to image file")
+  parser.add_argument("--device", default="cuda", help="Device to use for processing")
+  parser.add_argument("--resize_width", type=int, default=0, help="Resize width")
+  parser.add_argument("--transform", type=str, default='none', help="Transformation to apply")
+  parser.add_argument("--preload", action="store_true", help="Preload imges to cuda")
+  parser.add_argument("--n", type=int, default=12, help="Number of cameras to test")
+  parser.add_argument("--frames", type=int, default=300, help="Number of cameras to test")
+  parser.add_argument("--no_compress", action="store_true", help="Disable compression")
+  parser.add_argument("--bits", type=int, nargs="+", default=[12], choices=list(bit_encodings.keys()), 
+                      help="Bit depths to compare (8, 12, 16)")
+  parser.add_argument("--isp", default="taichi", choices=[t.value for t in pipeline.IspType], help="ISP engine to use")
+
+  args = parser.parse_args()
+
+
+  logging.info(str(args))
+  image_settings= pipeline.ImageSettings(
+      jpeg_quality=94,
+      preview_size=200,
+      resize_width=args.resize_width,
+      tone_mapping=pipeline.ToneMapper.reinhard,
+      tone_gamma= 1.0,
+      tone_intensity= 1.0,
+      color_adapt=0.0,
+      light_adapt=0.5,
+      transform=pipeline.Transform[args.transform]
+  )
+
+  _, test_image  = TaichiQueue.run_sync(load_test_image, 
+                                args.filename, bayer.BayerPattern.RGGB)
+  h, w, _ = test_image.shape
+
+  rates = {}
+  for bits in args.bits:
+    rates[bits] = bench_encoding(args, logger, image_settings, bit_encodings[bits], test_image, (w, h))
+
+  for bits, rate in rates.items():
+    logger.info(f"{bits} bit: {rate:.1f} frames/s, {rate * args.n * packed_size((w, h), bit_encodings[bits]) / 1e9:.2f} GB/s raw")
 
   TaichiQueue.stop()
   print("Finished")
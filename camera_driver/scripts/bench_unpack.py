@@ -0,0 +1,55 @@
+import argparse
+import logging
+from time import perf_counter
+
+import numpy as np
+
+from camera_driver.data import EncodingType, unpack
+
+
+def bench(f, repeats:int) -> float:
+  f()
+  start = perf_counter()
+  for _ in range(repeats):
+    f()
+  return (perf_counter() - start) / repeats
+
+
+def main():
+  logger = logging.getLogger(__name__)
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+  parser = argparse.ArgumentParser(description="Benchmark host side packed image decoding/encoding")
+  parser.add_argument("--image_size", type=int, nargs=2, default=(4096, 3000), help="Image size (w h)")
+  parser.add_argument("--threads", type=int, nargs="+", default=None, help="Thread counts to test (default 1, 2, 4 .. cores)")
+  parser.add_argument("--repeats", type=int, default=20, help="Repeats per measurement")
+
+  args = parser.parse_args()
+
+  w, h = args.image_size
+  image = np.random.randint(0, 4096, (h, w), dtype=np.uint16)
+
+  threads = args.threads
+  if threads is None:
+    cores = unpack.default_threads()
+    threads = sorted({2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores} | {cores})
+
+  logger.info(f"Image {w}x{h}, threads {threads}")
+  for encoding in [EncodingType.Packed12, EncodingType.Packed12_IDS, EncodingType.Packed16]:
+    packed = unpack.encode(image, encoding)
+    decoded = np.empty_like(image)
+
+    assert np.array_equal(unpack.decode(packed, encoding, out=decoded), image), f"{encoding} round trip failed"
+    gb = packed.nbytes / 1e9
+
+    for n in threads:
+      decode = bench(lambda: unpack.decode(packed, encoding, out=decoded, num_threads=n), args.repeats)
+      encode = bench(lambda: unpack.encode(image, encoding, out=packed, num_threads=n), args.repeats)
+
+      logger.info(f"{encoding.value:>14} threads={n:<3} "
+                  f"decode {gb / decode:6.2f} GB/s ({gb / decode / n:5.2f} per core), "
+                  f"encode {gb / encode:6.2f} GB/s ({gb / encode / n:5.2f} per core)")
+
+
+if __name__ == "__main__":
+  main()
@@ -12,7 +12,7 @@ from omegaconf import OmegaConf
 from argparse import ArgumentParser
 
 from camera_driver.pipeline.unsync_pipeline import CameraPipelineUnsync
-from camera_driver.pipeline import CameraPipeline, ImageOutputs, CameraPipelineConfig
+from camera_driver.pipeline import CameraPipeline, ImageOutputs, CameraPipelineConfig, RawWriter, Compression
 
 
 
@@ -27,9 +27,14 @@ def main():
 
 
   parser.add_argument("--write", type=str)
+  parser.add_argument("--raw", type=str, help="Record packed images (no processing) to this directory")
+  parser.add_argument("--compression", default="zlib", choices=[c.value for c in Compression], help="Raw compression")
+  parser.add_argument("--compression_level", default=1, type=int, help="Raw compression level")
+  parser.add_argument("--compress_workers", default=4, type=int, help="Threads for raw compression")
   parser.add_argument("--show", action="store_true")
   parser.add_argument("--no_sync", action="store_true")
   parser.add_argument("--reset", action="store_true")
+  parser.add_argument("--queue_stats", action="store_true", help="Log work queue latency and depth")
 
   args = parser.parse_args()
 
@@ -43,6 +48,10 @@ def main():
   if args.reset:
     config = replace(config, reset_cycle=True)
 
+  if args.raw:
+    assert not (args.no_sync or args.show or args.write), "--raw records synchronised groups only"
+    config = replace(config, raw_passthrough=True)
+
   def get_timestamp():
     return datetime.now().timestamp()
   
@@ -57,8 +66,15 @@ def main():
     pipeline.bind(on_image_set=writer.write_images)
     pipeline.bind(on_stopped=writer.stop) 
 
+  if args.raw:
+    raw_writer = RawWriter(args.raw, logger=logger, compression=Compression(args.compression),
+                           level=args.compression_level, num_workers=args.compress_workers)
+    
+    pipeline.bind(on_raw_set=raw_writer.write_group)
+    pipeline.bind(on_stopped=raw_writer.stop)
+
 
-  monitor = RateMonitor(pipeline, logger, interval=2.0)
+  monitor = RateMonitor(pipeline, logger, interval=2.0, show_queues=args.queue_stats)
 
   try:
 
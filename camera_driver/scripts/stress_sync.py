@@ -0,0 +1,108 @@
+import argparse
+from collections import Counter
+import logging
+from threading import Lock, Thread
+from time import perf_counter, sleep
+
+import numpy as np
+
+from camera_driver.camera_group.sync_handler import SyncHandler
+from camera_driver.data import ImageEncoding, Timestamped
+from camera_driver.driver.simulated import Buffer
+
+
+class Stats():
+  def __init__(self):
+    self.lock = Lock()
+    self.released = Counter()
+    self.groups = []
+    self.dropped = 0
+
+  def on_release(self, data:np.ndarray):
+    with self.lock:
+      self.released[id(data)] += 1
+
+  def on_group(self, group):
+    with self.lock:
+      self.groups.append(group)
+
+  def on_drop(self, missing):
+    with self.lock:
+      self.dropped += 1
+
+
+def run(args, num_workers:int, logger:logging.Logger) -> float:
+  cameras = [f"cam{i}" for i in range(args.cameras)]
+  offsets = {k:float(i) for i, k in enumerate(cameras)}
+  stats = Stats()
+
+  start = perf_counter()
+  query_time = lambda: perf_counter() - start
+
+  def process_buffer(buffer:Buffer) -> Timestamped:
+    # stand in for the host to device upload
+    buffer.image_data.copy()
+    if args.upload_msec > 0:
+      sleep(args.upload_msec / 1000.)
+
+    return Timestamped(buffer.timestamp_sec, query_time(), buffer.camera_name)
+
+  handler = SyncHandler(time_offsets=offsets, sync_threshold=0.001, sync_timeout=10.0,
+                        process_buffer=process_buffer, query_time=query_time,
+                        logger=logger, num_workers=num_workers)
+  handler.bind(on_group=stats.on_group, on_drop=stats.on_drop)
+
+  buffers = {k:[np.zeros(args.image_bytes, dtype=np.uint8) for _ in range(args.frames)] for k in cameras}
+
+  def camera_thread(k:str):
+    # camera callbacks, each from their own thread with timestamps in the camera's clock
+    for n, data in enumerate(buffers[k]):
+      t = n / args.fps - offsets[k]
+      handler.push_image(Buffer(k, data, (args.image_bytes, 1), ImageEncoding.Bayer_RGGB8, t,
+                                on_release=stats.on_release))
+
+  threads = [Thread(target=camera_thread, args=(k,)) for k in cameras]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  handler.flush()
+  elapsed = perf_counter() - start
+
+  # every buffer released exactly once, and every trigger grouped with all cameras
+  num_buffers = args.frames * len(cameras)
+  assert len(stats.released) == num_buffers and set(stats.released.values()) == {1}, \
+    f"expected {num_buffers} buffers released once, got {len(stats.released)} {set(stats.released.values())}"
+
+  assert len(stats.groups) == args.frames and stats.dropped == 0, \
+    f"expected {args.frames} groups, got {len(stats.groups)} ({stats.dropped} dropped)"
+
+  timestamps = sorted(next(iter(group.values())).timestamp_sec for group in stats.groups)
+  assert np.allclose(np.diff(timestamps), 1 / args.fps), "groups contain frames from different triggers"
+
+  return num_buffers / elapsed
+
+
+def main():
+  logger = logging.getLogger(__name__)
+  logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+  parser = argparse.ArgumentParser(description="Stress test SyncHandler with concurrent camera buffers")
+  parser.add_argument("--cameras", type=int, default=16, help="Number of cameras (threads)")
+  parser.add_argument("--frames", type=int, default=200, help="Frames per camera")
+  parser.add_argument("--fps", type=float, default=100.0, help="Frame rate (for timestamps)")
+  parser.add_argument("--image_bytes", type=int, default=2 ** 20, help="Buffer size to copy")
+  parser.add_argument("--upload_msec", type=float, default=1.0, help="Extra (GIL free) upload time per buffer")
+  parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="sync_workers to test")
+  parser.add_argument("--repeats", type=int, default=3, help="Runs per setting")
+
+  args = parser.parse_args()
+
+  for num_workers in args.workers:
+    rates = [run(args, num_workers, logger) for _ in range(args.repeats)]
+    print(f"sync_workers={num_workers}: {np.mean(rates):.0f} buffers/s (min {np.min(rates):.0f}), all checks passed")
+
+
+if __name__ == "__main__":
+  main()
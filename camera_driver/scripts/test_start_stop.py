@@ -2,7 +2,7 @@
 from dataclasses import replace
 from datetime import datetime
 import logging
-from time import sleep
+from time import perf_counter, sleep
 import traceback
 from camera_driver.scripts.util import Counter
 from omegaconf import OmegaConf
@@ -22,6 +22,7 @@ def main():
   parser.add_argument("--config", nargs='+', type=str, required=True)
   parser.add_argument("--no_sync", action="store_true")
   parser.add_argument("--reset", action="store_true")
+  parser.add_argument("--pause", action="store_true", help="Cycle with pause/resume instead of start/stop")
 
 
   args = parser.parse_args()
@@ -42,11 +43,24 @@ def main():
 
 
   try:
+    if args.pause:
+      pipeline.start()
+      pipeline.pause()
+
     while True:
         with Counter(pipeline) as counter:
-          pipeline.start()
+          start = perf_counter()
+          if args.pause:
+            pipeline.resume()
+          else:
+            pipeline.start()
+          logger.info(f"{'Resumed' if args.pause else 'Started'} in {perf_counter() - start:.3f}s")
+
           sleep(2)
-          pipeline.stop()
+          if args.pause:
+            pipeline.pause()
+          else:
+            pipeline.stop()
           
           logger.info(f"Received: {counter.recieved}")
         sleep(1)
@@ -13,8 +13,8 @@ import numpy as np
 import cv2
 
 
-from camera_driver.concurrent import WorkQueue
-from camera_driver.pipeline import CameraInfo, ImageOutputs
+from camera_driver.concurrent import WorkQueue, queue_stats
+from camera_driver.pipeline import CameraInfo, ImageOutputs, RawGroup
 
 
 
@@ -117,13 +117,18 @@ def view_images(queue:Queue, camera_info:Dict[str, CameraInfo], preview_width):
 
 
 class RateMonitor():
-  def __init__(self, pipeline:CameraPipeline, logger:Optional[logging.Logger]=None, interval:float=2.0):
+  def __init__(self, pipeline:CameraPipeline, logger:Optional[logging.Logger]=None, interval:float=2.0, 
+               show_queues:bool=False):
     self.pipeline = pipeline
+    self.show_queues = show_queues
 
     self.recieved = {k:deque(maxlen=20) for k in pipeline.camera_info.keys()}
     self.last_time = datetime.now().timestamp()
 
     self.pipeline.bind(on_image_set=self.on_group)
+    if pipeline.config.raw_passthrough:
+      self.pipeline.bind(on_raw_set=self.on_raw_group)
+
     self.interval = interval
     self.logger = logger
 
@@ -140,9 +145,16 @@ class RateMonitor():
     now = datetime.now().timestamp()
     if self.logger is not None and  now - self.last_time > self.interval:
       self.logger.info(self.format_rates())
+      if self.show_queues:
+        for stats in queue_stats().values():
+          self.logger.info(str(stats))
+
       self.last_time = now
 
 
+  def on_raw_group(self, group:RawGroup):
+    self.on_group(group.images)
+
   def format_rates(self):
     formatted = [f"{k}:{rate:.2f}" for k, rate in self.get_rates().items()]
     return  ", ".join(formatted)